@@ -0,0 +1,221 @@
+"""
+Daily activity rollups: knowledge items and ideas per (date, type, department)
+
+save_knowledge and add_idea add one to the row of their local calendar day in
+the stats table (pk "activity", sk "YYYY-MM-DD#type#department"), so the
+activity timeline reads one row per day and department instead of every item.
+Rows sort by date, so a date range is a single key-range query.
+
+Rollups of items saved before they existed are written with the backfill
+command, which also stores a marker row: until it exists the dashboard
+counts the items themselves. Reconcile recounts the tables and fixes (and reports) rows that
+drifted, e.g. after a failed increment or a manual edit. Both add the
+difference to each row rather than overwriting it, so items saved while
+they run are not lost:
+
+    python activity_rollups.py backfill
+    python activity_rollups.py reconcile [--dry-run]
+"""
+import argparse
+from collections import Counter
+from datetime import date, datetime
+
+ACTIVITY_PK = "activity"
+
+def activity_date(timestamp):
+    """Local calendar day of a timestamp as YYYY-MM-DD, the day the dashboard shows"""
+    return datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m-%d')
+
+def rollup_key(day, activity_type, department):
+    return f"{day}#{activity_type}#{department}"
+
+def record_activity(dynamodb, activity_type, department, timestamp):
+    """Count one knowledge item or idea in its day's rollup"""
+    from database import STATS_TABLE
+    
+    day = activity_date(timestamp)
+    department = department or 'Unknown'
+    try:
+        dynamodb.Table(STATS_TABLE).update_item(
+            Key={'pk': ACTIVITY_PK, 'sk': rollup_key(day, activity_type, department)},
+            UpdateExpression="SET #date = :date, #type = :type, #department = :department ADD #count :one",
+            ExpressionAttributeNames={'#date': 'date', '#type': 'type', '#department': 'department', '#count': 'count'},
+            ExpressionAttributeValues={':date': day, ':type': activity_type, ':department': department, ':one': 1}
+        )
+    except Exception as e:
+        # The reconcile command repairs a missed increment
+        print(f"Error updating activity rollup: {str(e)}")
+
+def load_rollups(dynamodb, since=None, until=None):
+    """Stored rollup rows, optionally limited to dates from `since` to `until` (YYYY-MM-DD, inclusive)"""
+    from boto3.dynamodb.conditions import Key
+    from database import STATS_TABLE
+    
+    table = dynamodb.Table(STATS_TABLE)
+    condition = Key('pk').eq(ACTIVITY_PK)
+    if since or until:
+        # '~' sorts after every "#type#department" suffix of the last day
+        condition &= Key('sk').between(since or "0000", (until or "9999") + "~")
+    
+    query_kwargs = {'KeyConditionExpression': condition}
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def activity_over_time(dynamodb, department=None, days=None):
+    """
+    Daily knowledge and idea counts in the shape of KnowledgeManager.get_activity_over_time
+    
+    Reads only the rollup rows; department limits the counts to one
+    department and days to the most recent days.
+    """
+    since = date.fromordinal(date.today().toordinal() - days + 1).isoformat() if days else None
+    
+    counts = {}
+    for row in load_rollups(dynamodb, since=since):
+        if department and row.get('department') != department:
+            continue
+        day = counts.setdefault(row['date'], {'knowledge': 0, 'idea': 0})
+        day[row['type']] = day.get(row['type'], 0) + int(row.get('count', 0))
+    
+    dates = sorted(day for day, day_counts in counts.items() if any(day_counts.values()))
+    return {
+        'dates': dates,
+        'knowledge': [counts[day]['knowledge'] for day in dates],
+        'ideas': [counts[day]['idea'] for day in dates]
+    }
+
+def count_activity(dynamodb):
+    """Rollup counts recomputed from the knowledge and ideas tables"""
+    from database import KNOWLEDGE_TABLE, IDEAS_TABLE, scan_projection
+    
+    counts = Counter()
+    for activity_type, table_name in [("knowledge", KNOWLEDGE_TABLE), ("idea", IDEAS_TABLE)]:
+        for item in scan_projection(dynamodb, table_name, ["department", "timestamp"]):
+            counts[(activity_date(item.get('timestamp', 0)), activity_type, item.get('department') or 'Unknown')] += 1
+    return counts
+
+def stored_rollup_counts(dynamodb):
+    """Stored count of every rollup row by row key"""
+    return {row['sk']: int(row.get('count', 0)) for row in load_rollups(dynamodb)}
+
+def write_rollups(dynamodb, counts, stored, stale=()):
+    """
+    Bring rows to the recounted values and delete the stale row keys; returns the keys of rows skipped
+    
+    stored must be read after the recount. Each row gets the difference added
+    on the condition that it still holds the stored value, so an increment
+    made since is neither overwritten nor corrected twice; such a row is
+    skipped and left to the next reconcile.
+    """
+    from database import STATS_TABLE
+    
+    table = dynamodb.Table(STATS_TABLE)
+    skipped = []
+    for (day, activity_type, department), count in counts.items():
+        sk = rollup_key(day, activity_type, department)
+        delta = count - stored.get(sk, 0)
+        if not delta:
+            continue
+        values = {':date': day, ':type': activity_type, ':department': department, ':delta': delta}
+        if sk in stored:
+            condition = "#count = :stored"
+            values[':stored'] = stored[sk]
+        else:
+            condition = "attribute_not_exists(#count)"
+        try:
+            table.update_item(
+                Key={'pk': ACTIVITY_PK, 'sk': sk},
+                UpdateExpression="SET #date = :date, #type = :type, #department = :department ADD #count :delta",
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#date': 'date', '#type': 'type', '#department': 'department', '#count': 'count'},
+                ExpressionAttributeValues=values
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            skipped.append(sk)
+    
+    for sk in stale:
+        try:
+            table.delete_item(
+                Key={'pk': ACTIVITY_PK, 'sk': sk},
+                ConditionExpression="#count = :stored",
+                ExpressionAttributeNames={'#count': 'count'},
+                ExpressionAttributeValues={':stored': stored[sk]}
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            skipped.append(sk)
+    
+    return skipped
+
+def is_backfilled(dynamodb):
+    """Whether the rollups cover every item, i.e. the backfill has run"""
+    from database import get_backfill_time
+    
+    return get_backfill_time(dynamodb, ACTIVITY_PK) is not None
+
+def backfill_rollups(dynamodb):
+    """Write the rollups of every saved knowledge item and idea"""
+    from database import mark_backfilled
+    
+    counts = count_activity(dynamodb)
+    skipped = write_rollups(dynamodb, counts, stored_rollup_counts(dynamodb))
+    if skipped:
+        # The marker waits until every row covers the older items
+        print(f"{len(skipped)} activity rollups changed during the backfill; run it again")
+    else:
+        mark_backfilled(dynamodb, ACTIVITY_PK)
+    print(f"Wrote {len(counts) - len(skipped)} activity rollups")
+    return len(counts) - len(skipped)
+
+def reconcile_rollups(dynamodb, dry_run=False):
+    """Compare the stored rollups with recomputed counts and fix the rows that differ"""
+    counts = count_activity(dynamodb)
+    stored = stored_rollup_counts(dynamodb)
+    
+    wrong = {}
+    for key, count in counts.items():
+        if stored.get(rollup_key(*key)) != count:
+            wrong[key] = count
+    # Rows left over count days or departments with no items
+    counted = {rollup_key(*key) for key in counts}
+    stale = [sk for sk in stored if sk not in counted]
+    
+    for (day, activity_type, department), count in sorted(wrong.items()):
+        print(f"{day} {activity_type} {department}: expected {count}")
+    for sk in sorted(stale):
+        print(f"{sk}: no items")
+    
+    skipped = []
+    if not dry_run:
+        from database import mark_backfilled
+        
+        skipped = write_rollups(dynamodb, wrong, stored, stale)
+        for sk in sorted(skipped):
+            print(f"{sk}: changed during the reconcile, left for the next one")
+        if not skipped:
+            # Every row now matches the tables
+            mark_backfilled(dynamodb, ACTIVITY_PK)
+    print(f"{len(wrong) + len(stale) - len(skipped)} of {len(counts)} activity rollups {'differ' if dry_run else 'fixed'}")
+    return len(wrong) + len(stale)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain daily activity rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("backfill", help="Write the rollups of every saved knowledge item and idea")
+    reconcile_parser = subparsers.add_parser("reconcile", help="Recount the tables and fix rollups that differ")
+    reconcile_parser.add_argument("--dry-run", action="store_true", help="Only report the differences")
+    args = parser.parse_args(argv)
+    
+    from database import initialize_db
+    
+    dynamodb = initialize_db()
+    if args.command == "backfill":
+        backfill_rollups(dynamodb)
+    elif args.command == "reconcile":
+        reconcile_rollups(dynamodb, args.dry_run)
+
+if __name__ == "__main__":
+    main()
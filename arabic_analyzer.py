@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+
+# Diacritics (tashkeel), superscript alef and tatweel are dropped; alef, yaa
+# and taa marbuta variants are folded so different spellings match
+_NORMALIZATION_TABLE = str.maketrans(
+    {
+        **{chr(code): None for code in range(0x064B, 0x0653)},  # فتحة، ضمة، كسرة، شدة، سكون...
+        "ٰ": None,  # ألف خنجرية
+        "ـ": None,  # تطويل
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ى": "ي",
+        "ة": "ه",
+    }
+)
+
+_TOKEN = re.compile(r"\w+")
+
+# Words in the original text, with their diacritics, so offsets can be kept
+_RAW_TOKEN = re.compile(r"[\w\u064B-\u0652\u0670]+")
+
+# Prefixes and suffixes removed by the light stemmer, longest first (ISRI-style)
+PREFIXES = ["وال", "بال", "كال", "فال", "لل", "ال"]
+SUFFIXES = ["ات", "ون", "ين", "ان", "يه", "ها", "هم", "هن", "كم", "نا", "ه", "ي"]
+
+# Stems shorter than this are kept unstripped so short roots are not destroyed
+MIN_STEM_LENGTH = 3
+
+STOP_WORDS = frozenset(
+    [
+        "في", "من", "الي", "علي", "عن", "مع", "هل", "ما", "ماذا", "متي", "اين", "كيف", "هو", "هي",
+        "هذا", "هذه", "ذلك", "تلك", "التي", "الذي", "الذين", "او", "ان", "انه", "كان", "قد", "ثم",
+        "لا", "لم", "لن", "كل", "بعد", "قبل", "عند", "حتي", "و", "يا",
+        "the", "a", "an", "of", "in", "on", "at", "to", "for", "and", "or", "is", "are", "with",
+    ]
+)
+
+def normalize_arabic(text):
+    """Lowercase text, strip tashkeel/tatweel and fold alef, yaa and taa marbuta variants"""
+    return text.lower().translate(_NORMALIZATION_TABLE)
+
+@lru_cache(maxsize=50000)
+def stem_word(word):
+    """Light stemming: strip one common prefix and one common suffix"""
+    for prefix in PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM_LENGTH:
+            word = word[len(prefix):]
+            break
+    else:
+        # A leading conjunction (و) is only dropped from longer words
+        if word.startswith("و") and len(word) - 1 > MIN_STEM_LENGTH:
+            word = word[1:]
+    
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    
+    return word
+
+def analyze(text):
+    """Run the full analyzer pipeline and return the list of stemmed tokens"""
+    return [
+        stem_word(token)
+        for token in _TOKEN.findall(normalize_arabic(text))
+        if token not in STOP_WORDS
+    ]
+
+def analyze_with_offsets(text):
+    """Like analyze, but return (stem, start, end) with the word's offsets in the original text"""
+    tokens = []
+    for match in _RAW_TOKEN.finditer(text):
+        for token in _TOKEN.findall(normalize_arabic(match.group())):
+            if token not in STOP_WORDS:
+                tokens.append((stem_word(token), match.start(), match.end()))
+    return tokens
+
+def analyze_to_field(text):
+    """Analyzed tokens joined with spaces, in the form stored on knowledge items"""
+    return " ".join(analyze(text))
+
+@lru_cache(maxsize=1024)
+def analyze_query(query):
+    """Analyze a search query; hot query strings are served from an LRU cache"""
+    return tuple(analyze(query))
+
+@lru_cache(maxsize=4096)
+def normalize_field(value):
+    """Normalized form of short fields such as department or employee name"""
+    return normalize_arabic(value)
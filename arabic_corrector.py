@@ -0,0 +1,103 @@
+import json
+import os
+import re
+
+# Default spelling dictionary shipped with the app; extra dictionaries can be
+# layered on top with the ARABIC_CORRECTIONS_FILES environment variable
+DEFAULT_CORRECTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "arabic_corrections.json")
+
+# Arabic letters (used to decide when a punctuation mark needs a following space)
+ARABIC_LETTER = "[ء-يٱ-ۓ]"
+
+def _is_word_char(ch):
+    return re.match(r"\w", ch) is not None
+
+def _build_trie(entries):
+    """Build a character trie (nested dicts) from literal entries"""
+    trie = {}
+    for entry in entries:
+        node = trie
+        for ch in entry:
+            node = node.setdefault(ch, {})
+        node[""] = True  # end-of-entry marker
+    return trie
+
+def _trie_branch(node, last_char):
+    """Render a trie node as a regex where shared prefixes are matched only once"""
+    branches = [re.escape(ch) + _trie_branch(child, ch) for ch, child in sorted(node.items()) if ch]
+    if "" in node:
+        # Longer entries are tried first; the end-of-entry branch is the fallback.
+        # Entries ending in a letter must end at a word boundary ("الة" not in "رسالة")
+        branches.append(r"(?!\w)" if _is_word_char(last_char) else "")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+class ArabicCorrector:
+    """Rewrite common Arabic spelling and spacing mistakes in a single pass over the text"""
+    
+    def __init__(self, words, proclitics=(), spacing_marks=()):
+        # Every match is looked up here: misspelled word -> correction, mark -> mark + space
+        self.replacements = {}
+        for wrong, correct in words.items():
+            # Entries that map a word to itself are no-ops and only slow matching down
+            if wrong == correct:
+                continue
+            self.replacements[wrong] = correct
+            # Words glued to a conjunction (والى، فانا) are corrected too
+            for proclitic in proclitics:
+                self.replacements[proclitic + wrong] = proclitic + correct
+        
+        branches = []
+        
+        # Each top-level branch starts with a literal character, which lets the
+        # regex engine skip positions that cannot start a match. The start-of-word
+        # check is placed right after that first character for the same reason.
+        for ch, child in sorted(_build_trie(self.replacements).items()):
+            branches.append(re.escape(ch) + r"(?<!\w.)" + _trie_branch(child, ch))
+        
+        # Only add a space when the mark is glued to the next Arabic word, so
+        # numbers (3.5, 10:30) and Latin text (e.g. example.com) are left alone
+        for mark in spacing_marks:
+            branches.append(re.escape(mark) + f"(?={ARABIC_LETTER})")
+            self.replacements.setdefault(mark, mark + " ")
+        
+        self.pattern = re.compile("|".join(branches), re.DOTALL) if branches else None
+    
+    @classmethod
+    def from_files(cls, paths):
+        """Build a corrector from one or more JSON dictionaries (later files win)"""
+        words = {}
+        proclitics = []
+        spacing_marks = []
+        
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            words.update(data.get("words", {}))
+            proclitics += [p for p in data.get("proclitics", []) if p not in proclitics]
+            spacing_marks += [m for m in data.get("spacing_marks", []) if m not in spacing_marks]
+        
+        return cls(words, proclitics, spacing_marks)
+    
+    def correct(self, text):
+        """Return text with every known mistake corrected"""
+        if not text or self.pattern is None:
+            return text
+        replacements = self.replacements
+        return self.pattern.sub(lambda match: replacements[match.group()], text)
+
+_default_corrector = None
+
+def get_default_corrector():
+    """Return the shared corrector, compiling the dictionaries on first use"""
+    global _default_corrector
+    
+    if _default_corrector is None:
+        paths = [DEFAULT_CORRECTIONS_PATH]
+        extra = os.getenv("ARABIC_CORRECTIONS_FILES")
+        if extra:
+            paths += [p for p in extra.split(os.pathsep) if p]
+        _default_corrector = ArabicCorrector.from_files(paths)
+    
+    return _default_corrector
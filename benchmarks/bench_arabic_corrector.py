@@ -0,0 +1,100 @@
+"""
+Benchmark the compiled Arabic corrector against the previous per-entry loop
+
+The previous implementation ran one uncompiled re.sub plus one str.replace per
+dictionary entry (about 100 passes over the text). The compiled corrector
+rewrites the text in a single pass.
+
+The gain is modest: about 1.2-2.6x on documents of 1k to 1M characters,
+highest on short texts with few mistakes and lowest on misspelled text,
+where the one regex pass does most of the work. The main point of the
+change is that only whole words are corrected.
+
+Usage:
+    python benchmarks/bench_arabic_corrector.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arabic_corrector import ArabicCorrector, DEFAULT_CORRECTIONS_PATH
+
+# Dictionary used by the previous implementation, including its punctuation entries
+LEGACY_CORRECTIONS = {
+    "خسب": "خشب", "سجرة": "شجرة", "صندوك": "صندوق", "طاولط": "طاولة", "ضابط": "ضابط",
+    "حهاز": "جهاز", "جهار": "جهاز", "الى": "إلى", "انا": "أنا", "اسم": "اسم", "احمد": "أحمد",
+    "اكثر": "أكثر", "اقل": "أقل", "مفاوضه": "مفاوضة", "شركه": "شركة", "معلومه": "معلومة",
+    "بضاعه": "بضاعة", "سياره": "سيارة", "شاحنه": "شاحنة", "فى": "في", "الذى": "الذي",
+    "على": "على", "الة": "آلة", "منتة": "منتج", "هنان": "هناك", "هناك،": "هناك", "انة": "أنه",
+    "لاكن": "لكن", "عندة": "عنده", "عنده،": "عنده", "يومياً": "يومياً", "اخر": "آخر",
+    "الاخر": "الآخر", "الان": "الآن", "حائز": "جاهز", "،و": "، و", "،ف": "، ف", "؟و": "؟ و",
+    "!و": "! و", "،": "، ", ".": ". ", "؛": "؛ ", ":": ": "
+}
+
+def legacy_correct_arabic_text(text):
+    """The per-entry implementation that openai_service used before the compiled corrector"""
+    for wrong, correct in LEGACY_CORRECTIONS.items():
+        text = re.sub(r'\\b' + wrong + r'\\b', correct, text)
+        text = text.replace(wrong, correct)
+    return text
+
+SAMPLE_WORDS = (
+    "الى المستودع شركه سياره هنان خسب منتة الان رسالة الانتاج تم توريد البضاعه من المورد "
+    "الجديد وكان هناك تأخير بسيط في التوصيل بسبب الزحام لاكن الفريق تعامل مع الموقف بسرعة"
+).split()
+
+CLEAN_WORDS = (
+    "تم توريد المواد من المورد الجديد وكان هناك تأخير بسيط في التوصيل بسبب الزحام "
+    "وقد تعامل الفريق مع الموقف بسرعة واحترافية وتم تسليم الطلب للعميل في الموعد"
+).split()
+
+def build_document(size, rng, mistake_rate):
+    """Build an Arabic document of roughly `size` characters with mixed punctuation"""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(SAMPLE_WORDS if rng.random() < mistake_rate else CLEAN_WORDS)
+        if rng.random() < 0.1:
+            word += rng.choice(["،", ".", ":", "؛"])
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def time_call(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Arabic text correction")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mistake-rates", type=float, nargs="+", default=[0.05, 0.5],
+                        help="Fraction of words drawn from the misspelled sample")
+    args = parser.parse_args(argv)
+    
+    rng = random.Random(7)
+    
+    start = time.perf_counter()
+    corrector = ArabicCorrector.from_files([DEFAULT_CORRECTIONS_PATH])
+    compile_ms = (time.perf_counter() - start) * 1000
+    print(f"Dictionary compiled once in {compile_ms:.2f} ms")
+    
+    print(f"{'chars':>10}{'mistakes':>10}{'legacy ms':>12}{'compiled ms':>14}{'speedup':>10}")
+    for size in args.sizes:
+        for mistake_rate in args.mistake_rates:
+            document = build_document(size, rng, mistake_rate)
+            legacy_ms = time_call(legacy_correct_arabic_text, document, args.repeat)
+            compiled_ms = time_call(corrector.correct, document, args.repeat)
+            print(f"{len(document):>10}{mistake_rate:>10.0%}{legacy_ms:>12.2f}{compiled_ms:>14.2f}{legacy_ms / compiled_ms:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
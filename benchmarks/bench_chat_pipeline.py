@@ -0,0 +1,196 @@
+"""
+End-to-end latency benchmark for the Knowledge Sharing chat pipeline
+
+The real components/chat and openai_service code is driven through scripted
+knowledge-submission and search sessions. OpenAI calls go over HTTP to the
+local fake LLM server (fake_llm.FakeLLMServer) and DynamoDB is served by moto
+or by DynamoDB Local when --dynamodb-endpoint is given.
+
+Usage:
+    python benchmarks/bench_chat_pipeline.py --sessions 20 --latency 0.05 --jitter 0.05
+    python benchmarks/bench_chat_pipeline.py --max-p95 search=50 --max-p95 finalize=400
+
+With --max-p95 the script exits with status 1 when a step regresses, so it
+can run in CI.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+KNOWLEDGE_SAMPLES = [
+    "مورد الخشب الجديد في الرياض يقدم اسعار منافسة ويوفر التوصيل الى المستودع خلال يومين",
+    "هناك تماس كهربائي في الطابق الثاني بجانب غرفة الاجتماعات ويجب ابلاغ الصيانة",
+    "اجراء طلب الاجازة يتم عبر النظام الجديد ويحتاج موافقة المدير المباشر",
+    "سياره النقل البيضاء تويوتا متاحة للاستخدام في توصيل البضاعه للعملاء",
+    "The new supplier for office chairs offers a two year warranty and free delivery",
+]
+
+ANSWER_SAMPLES = [
+    "رقم التواصل 0500000000 والبريد sales@example.com",
+    "تم ابلاغ فريق الصيانة صباح اليوم",
+    "الخطوات موضحة في دليل الموظف القسم الثالث",
+    "لا توجد معلومات اضافية حاليا",
+]
+
+SEARCH_QUERIES = ["مورد الخشب", "تماس كهربائي", "اجراء الاجازة", "سيارة نقل", "supplier warranty", "المستودع"]
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+class StepTimer:
+    """Collect wall-clock timings per pipeline step"""
+    def __init__(self):
+        self.timings = defaultdict(list)
+    
+    def run(self, step, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.timings[step].append((time.perf_counter() - start) * 1000)
+        return result
+    
+    def report(self):
+        return {
+            step: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99)
+            }
+            for step, values in self.timings.items()
+        }
+
+def reset_session(st):
+    """Give each scripted session a fresh chat state"""
+    st.session_state.chat_history = []
+    st.session_state.conversation_mode = "normal"
+    st.session_state.current_knowledge = {}
+
+def run_knowledge_session(timer, chat, st, openai_client, db_client, rng):
+    """Submit one knowledge item and answer its three follow-up questions"""
+    reset_session(st)
+    employee_name = f"Employee {rng.randint(1, 20)}"
+    department = rng.choice(["Sales", "Operations", "Engineering"])
+    
+    text = timer.run("correct_text", chat.correct_arabic_text, rng.choice(KNOWLEDGE_SAMPLES))
+    timer.run("start_collection", chat.start_knowledge_collection, openai_client, db_client, employee_name, department, text)
+    
+    if st.session_state.conversation_mode != "knowledge_collection":
+        return
+    
+    for step in ("answer_1", "answer_2", "finalize"):
+        answer = chat.correct_arabic_text(rng.choice(ANSWER_SAMPLES))
+        timer.run(step, chat.process_knowledge_collection, openai_client, db_client, employee_name, department, answer)
+
+def run_search_session(timer, chat, st, openai_client, db_client, rng):
+    """Run one search query in search mode"""
+    reset_session(st)
+    st.session_state.conversation_mode = "search"
+    query = chat.correct_arabic_text(rng.choice(SEARCH_QUERIES))
+    timer.run("search", chat.process_search_query, openai_client, db_client, query)
+
+def parse_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        step, _, limit = value.partition("=")
+        thresholds[step] = float(limit)
+    return thresholds
+
+def print_report(report):
+    print(f"{'step':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in report.items():
+        print(f"{step:<18}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chat pipeline against local stand-ins")
+    parser.add_argument("--sessions", type=int, default=10, help="Knowledge submission sessions to run")
+    parser.add_argument("--searches", type=int, default=30, help="Search sessions to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake LLM base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Fake LLM random extra latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of LLM calls that fail")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dynamodb-endpoint", help="Use DynamoDB Local at this URL instead of moto")
+    parser.add_argument("--max-p95", action="append", metavar="STEP=MS", help="Fail when a step's p95 exceeds MS")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args(argv)
+    
+    if not args.dynamodb_endpoint and mock_aws is None:
+        parser.error("moto is required unless --dynamodb-endpoint is given (pip install moto)")
+    
+    # Point the real clients at the local stand-ins before anything creates them
+    from fake_llm import FakeLLMServer
+    server = FakeLLMServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed).start()
+    os.environ["OPENAI_API_KEY"] = "fake-key"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+    if args.dynamodb_endpoint:
+        os.environ["AWS_ENDPOINT_URL_DYNAMODB"] = args.dynamodb_endpoint
+    
+    import streamlit as st
+    from components import chat
+    from database import initialize_db
+    from openai_service import initialize_openai_client
+    
+    # Streamlit sets the level of each of its loggers when it creates them, so the
+    # bare-mode warnings (missing ScriptRunContext, session state) are silenced after import
+    for name in [
+        "streamlit",
+        "streamlit.runtime.scriptrunner_utils.script_run_context",
+        "streamlit.runtime.state.session_state_proxy"
+    ]:
+        logging.getLogger(name).setLevel(logging.ERROR)
+    
+    rng = random.Random(args.seed)
+    timer = StepTimer()
+    
+    try:
+        with (nullcontext() if args.dynamodb_endpoint else mock_aws()):
+            db_client = initialize_db()
+            openai_client = initialize_openai_client()
+            
+            for _ in range(args.sessions):
+                run_knowledge_session(timer, chat, st, openai_client, db_client, rng)
+            for _ in range(args.searches):
+                run_search_session(timer, chat, st, openai_client, db_client, rng)
+    finally:
+        server.stop()
+    
+    report = timer.report()
+    print_report(report)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    
+    regressions = [
+        f"{step}: p95 {report[step]['p95']:.1f} ms > {limit:.1f} ms"
+        for step, limit in parse_thresholds(args.max_p95).items()
+        if step in report and report[step]["p95"] > limit
+    ]
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
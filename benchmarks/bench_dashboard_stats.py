@@ -0,0 +1,148 @@
+"""
+Benchmark the vectorized dashboard statistics against the previous Python loops
+
+Synthetic knowledge items and ideas (only the attributes the dashboard
+reads) are generated in memory, so the numbers measure computation alone,
+not DynamoDB. The legacy column reproduces the loops previously in
+database.get_knowledge_stats, database.get_ideas_stats and KnowledgeManager;
+the vectorized column builds an AnalyticsSnapshot and reads every metric
+from it. Both must produce the same results.
+
+Usage:
+    python benchmarks/bench_dashboard_stats.py [--sizes 100000 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_manager import AnalyticsSnapshot
+
+DEPARTMENTS = ["Engineering", "Marketing", "Sales", "Human Resources", "Finance", "Operations",
+               "الصيانة", "المالية", "الموارد البشرية", "تقنية المعلومات"]
+STATUSES = ["proposed", "in_progress", "completed", "rejected"]
+
+def build_items(count, now, rng, employees=500, days=3 * 365):
+    """Knowledge items spread over the last `days` days"""
+    return [
+        {
+            'id': str(i),
+            'department': rng.choice(DEPARTMENTS),
+            'employee_name': f"employee {rng.randrange(employees)}",
+            'timestamp': now - rng.randrange(days * 86400)
+        }
+        for i in range(count)
+    ]
+
+def build_ideas(count, now, rng, days=3 * 365):
+    ideas = []
+    for i in range(count):
+        supporters = [f"employee {j}" for j in range(rng.randrange(6))]
+        ideas.append({
+            'id': str(i),
+            'title': f"idea {i}",
+            'department': rng.choice(DEPARTMENTS),
+            'status': rng.choice(STATUSES),
+            'timestamp': now - rng.randrange(days * 86400),
+            # The legacy loops counted the supporters list; ideas now store the count
+            'supporters': supporters,
+            'supporter_count': len(supporters)
+        })
+    return ideas
+
+def legacy_metrics(knowledge_items, ideas, now):
+    """The dict-increment loops and list-of-dicts DataFrame used before"""
+    # get_knowledge_stats
+    departments = {}
+    for item in knowledge_items:
+        dept = item.get('department', 'Unknown')
+        departments[dept] = departments.get(dept, 0) + 1
+    now_dt = datetime.fromtimestamp(now)
+    today_count = week_count = month_count = 0
+    for item in knowledge_items:
+        item_dt = datetime.fromtimestamp(item.get('timestamp', 0))
+        if (now_dt - item_dt).days < 1:
+            today_count += 1
+        if (now_dt - item_dt).days < 7:
+            week_count += 1
+        if (now_dt - item_dt).days < 30:
+            month_count += 1
+    knowledge_stats = {'total': len(knowledge_items), 'by_department': departments,
+                       'today': today_count, 'week': week_count, 'month': month_count}
+    
+    # get_ideas_stats
+    status_counts = {status: 0 for status in STATUSES}
+    idea_departments = {}
+    total_supporters = 0
+    for idea in ideas:
+        status = idea.get('status', 'proposed')
+        if status in status_counts:
+            status_counts[status] += 1
+        dept = idea.get('department', 'Unknown')
+        idea_departments[dept] = idea_departments.get(dept, 0) + 1
+        total_supporters += len(idea.get('supporters', []))
+    ideas_stats = {'total': len(ideas), 'by_status': status_counts, 'by_department': idea_departments,
+                   'avg_supporters': total_supporters / len(ideas) if ideas else 0}
+    
+    # get_activity_over_time
+    data = [{'date': datetime.fromtimestamp(item.get('timestamp', 0)).date(), 'type': 'knowledge'} for item in knowledge_items]
+    data += [{'date': datetime.fromtimestamp(idea.get('timestamp', 0)).date(), 'type': 'idea'} for idea in ideas]
+    activity_by_date = pd.DataFrame(data).groupby(['date', 'type']).size().unstack().fillna(0)
+    activity = {
+        'dates': [d.strftime('%Y-%m-%d') for d in activity_by_date.index.tolist()],
+        'knowledge': activity_by_date['knowledge'].astype(int).tolist(),
+        'ideas': activity_by_date['idea'].astype(int).tolist()
+    }
+    
+    # get_top_contributors
+    contributors = {}
+    for item in knowledge_items:
+        employee = item.get('employee_name', 'Anonymous')
+        contributors[employee] = contributors.get(employee, 0) + 1
+    top_contributors = sorted(contributors.items(), key=lambda x: x[1], reverse=True)[:10]
+    
+    return knowledge_stats, ideas_stats, activity, top_contributors
+
+def vectorized_metrics(knowledge_items, ideas, now):
+    snapshot = AnalyticsSnapshot(knowledge_items, ideas, now=now)
+    return (snapshot.knowledge_stats(), snapshot.ideas_stats(), snapshot.activity_over_time(),
+            snapshot.top_contributors(10))
+
+def best_time(fn, repeat, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dashboard statistics")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="Knowledge items")
+    parser.add_argument("--ideas-ratio", type=float, default=0.1, help="Ideas per knowledge item")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    
+    rng = random.Random(11)
+    now = int(time.time())
+    
+    print(f"{'items':>10}{'ideas':>10}{'legacy ms':>12}{'vectorized ms':>16}{'speedup':>10}  same results")
+    for size in args.sizes:
+        knowledge_items = build_items(size, now, rng)
+        ideas = build_ideas(int(size * args.ideas_ratio), now, rng)
+        
+        legacy_ms, legacy = best_time(legacy_metrics, args.repeat, knowledge_items, ideas, now)
+        vectorized_ms, vectorized = best_time(vectorized_metrics, args.repeat, knowledge_items, ideas, now)
+        
+        # Ties among top contributors may be ordered differently
+        same = legacy[:3] == vectorized[:3] and [c for _, c in legacy[3]] == [c for _, c in vectorized[3]]
+        print(f"{size:>10}{len(ideas):>10}{legacy_ms:>12.1f}{vectorized_ms:>16.1f}{legacy_ms / vectorized_ms:>9.1f}x  {same}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark cached shingle similarity against the previous SequenceMatcher check
+
+Every question of the built-in follow-up banks (components.chat) is compared
+against every other one, which is the worst case of the fallback path in
+process_knowledge_collection. The script reports the time per comparison and
+how often both implementations reach the same decision.
+
+Usage:
+    python benchmarks/bench_question_similarity.py [--rounds 20]
+"""
+import argparse
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+from components.chat import GENERAL_FOLLOW_UP_QUESTIONS, SPECIALIZED_QUESTIONS
+from question_similarity import are_questions_similar, question_signature
+
+def legacy_are_questions_similar(question1, question2, threshold=0.7):
+    """The SequenceMatcher implementation previously in components/chat.py"""
+    def clean_question(text):
+        text = re.sub(r'[،,\.؟\?!]', ' ', text)
+        text = text.lower()
+        stop_words = ['هل', 'ما', 'من', 'في', 'على', 'عن', 'إلى', 'هو', 'هي', 'أو', 'أن', 'التي', 'الذي']
+        for word in stop_words:
+            text = text.replace(f' {word} ', ' ')
+        text = re.sub(r'\s+', ' ', text).strip()
+        return text
+    
+    clean_q1 = clean_question(question1)
+    clean_q2 = clean_question(question2)
+    
+    similarity_ratio = SequenceMatcher(None, clean_q1, clean_q2).ratio()
+    
+    important_words = ['كهرباء', 'كهربائي', 'حريق', 'إصابة', 'ضرر', 'مسؤول', 'صيانة', 'إبلاغ', 'تصليح',
+                       'مشكلة', 'تماس', 'عزل', 'تيار', 'معدة', 'آلة', 'جهاز', 'موقع', 'مكان', 'طابق', 'دور']
+    common_important_words = sum(1 for word in important_words
+                                 if word in clean_q1 and word in clean_q2)
+    if common_important_words > 0:
+        similarity_ratio += min(0.3, common_important_words * 0.1)
+    
+    return similarity_ratio >= threshold
+
+def time_pairs(fn, pairs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for question1, question2 in pairs:
+            fn(question1, question2)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(pairs)) * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark question similarity")
+    parser.add_argument("--rounds", type=int, default=20, help="Times each pair is compared")
+    args = parser.parse_args(argv)
+    
+    questions = list(dict.fromkeys(
+        GENERAL_FOLLOW_UP_QUESTIONS + [q for bank in SPECIALIZED_QUESTIONS.values() for q in bank]
+    ))
+    pairs = list(itertools.permutations(questions, 2))
+    print(f"{len(questions)} questions, {len(pairs)} ordered pairs, {args.rounds} rounds")
+    
+    legacy_us = time_pairs(legacy_are_questions_similar, pairs, args.rounds)
+    
+    question_signature.cache_clear()
+    start = time.perf_counter()
+    for question in questions:
+        question_signature(question)
+    signature_ms = (time.perf_counter() - start) * 1000
+    
+    cached_us = time_pairs(are_questions_similar, pairs, args.rounds)
+    
+    agreement = sum(
+        legacy_are_questions_similar(q1, q2) == are_questions_similar(q1, q2) for q1, q2 in pairs
+    ) / len(pairs)
+    
+    print(f"legacy SequenceMatcher:  {legacy_us:8.2f} us/comparison")
+    print(f"cached shingle sets:     {cached_us:8.2f} us/comparison ({legacy_us / cached_us:.0f}x faster)")
+    print(f"signatures computed once in {signature_ms:.2f} ms")
+    print(f"same decision on {agreement:.1%} of pairs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import re
+
+# Target passage size in characters; a single longer sentence becomes its own passage
+MAX_PASSAGE_CHARS = 600
+
+# Sentences repeated at the start of the next passage so context isn't cut at a boundary
+OVERLAP_SENTENCES = 1
+
+# Only the first passages get an embedding; the rest are indexed lexically.
+# 24 x 1536 float32 values keep an item well under DynamoDB's 400 KB limit.
+MAX_EMBEDDED_PASSAGES = 24
+
+_HEADING = re.compile(r"^#{1,6}[ \t].*$", re.MULTILINE)
+_SENTENCE = re.compile(r"[^.!?؟\n]*(?:[.!?؟]+|\n+|$)")
+
+def section_spans(text):
+    """(start, end) offsets of the sections of a markdown document, split before each heading"""
+    starts = [0] + [match.start() for match in _HEADING.finditer(text) if match.start() > 0]
+    ends = starts[1:] + [len(text)]
+    return [(start, end) for start, end in zip(starts, ends) if text[start:end].strip()]
+
+def sentence_spans(text, start, end):
+    """(start, end) offsets of the non-empty sentences (or lines) between start and end"""
+    spans = []
+    for match in _SENTENCE.finditer(text, start, end):
+        sentence = match.group()
+        if not sentence.strip():
+            continue
+        # Trim surrounding whitespace so offsets point at the sentence itself
+        left = len(sentence) - len(sentence.lstrip())
+        right = len(sentence.rstrip())
+        spans.append((match.start() + left, match.start() + right))
+    return spans
+
+def chunk_passages(text, max_chars=MAX_PASSAGE_CHARS, overlap=OVERLAP_SENTENCES):
+    """
+    Split a document into overlapping passages and return their (start, end) offsets
+    
+    Passages never cross a markdown heading. Within a section, whole sentences
+    are packed up to max_chars, and each passage starts with the last `overlap`
+    sentences of the previous one. The same text always gives the same offsets.
+    """
+    passages = []
+    for section_start, section_end in section_spans(text):
+        sentences = sentence_spans(text, section_start, section_end)
+        first = 0
+        while first < len(sentences):
+            last = first
+            while last + 1 < len(sentences) and sentences[last + 1][1] - sentences[first][0] <= max_chars:
+                last += 1
+            passages.append((sentences[first][0], sentences[last][1]))
+            
+            if last + 1 >= len(sentences):
+                break
+            # Step forward, repeating the overlap sentences but always making progress
+            first = max(last + 1 - overlap, first + 1)
+    
+    return passages or [(0, len(text))]
+
+def passage_texts(text, passages):
+    return [text[start:end] for start, end in passages]
+
+def embedded_passage_texts(text):
+    """Texts of the passages of a document that get an embedding"""
+    return passage_texts(text, chunk_passages(text)[:MAX_EMBEDDED_PASSAGES])
+
+def item_passages(item):
+    """Stored (start, end) passage offsets of a knowledge item, chunked on the fly for older items"""
+    stored = item.get('passages')
+    if stored:
+        return [(int(start), int(end)) for start, end in stored]
+    return chunk_passages(item.get('content', ''))
@@ -2,78 +2,113 @@ import streamlit as st
 import time
 import datetime
 import uuid
-import re
-from difflib import SequenceMatcher
-from database import save_knowledge, get_knowledge, search_knowledge
+from database import save_knowledge, get_knowledge, get_tag_counts, append_to_knowledge, set_knowledge_embeddings, item_id_for
 from openai_service import (
     process_knowledge, 
     generate_knowledge_tags, 
     generate_smart_questions,
     process_question_answers,
+    embed_knowledge_passages,
     correct_arabic_text  # إضافة وظيفة تصحيح النص العربي
 )
+from hybrid_search import hybrid_search
+from search_index import knowledge_snippet
+from query_parser import correct_query
+from content_classifier import detect_content_type
+from question_similarity import are_questions_similar
+from simhash_index import find_duplicate_knowledge, simhash
+from spelling_corrector import suggest_query_correction
+from expertise_index import find_experts
 from utils import get_sample_departments, format_relative_time, truncate_text
 
-def are_questions_similar(question1, question2, threshold=0.7):
-    """
-    تحقق مما إذا كان سؤالان متشابهين جوهرياً باستخدام خوارزمية مقارنة السلاسل
-    ومعالجة اللغة الطبيعية البسيطة
-    
-    Args:
-        question1: السؤال الأول
-        question2: السؤال الثاني
-        threshold: عتبة التشابه (0.0 - 1.0)، حيث 1.0 هو التطابق الكامل
-        
-    Returns:
-        Boolean: هل السؤالان متشابهان بدرجة كافية؟
-    """
-    # تنظيف الأسئلة من علامات الترقيم والكلمات غير المهمة
-    def clean_question(text):
-        # إزالة علامات الترقيم
-        text = re.sub(r'[،,\.؟\?!]', ' ', text)
-        # تحويل إلى أحرف صغيرة (للنصوص الإنجليزية)
-        text = text.lower()
-        # إزالة الكلمات غير المهمة في العربية
-        stop_words = ['هل', 'ما', 'من', 'في', 'على', 'عن', 'إلى', 'هو', 'هي', 'أو', 'أن', 'التي', 'الذي']
-        for word in stop_words:
-            text = text.replace(f' {word} ', ' ')
-        # إزالة المسافات المتعددة
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
-    
-    # تنظيف الأسئلة
-    clean_q1 = clean_question(question1)
-    clean_q2 = clean_question(question2)
+# أسئلة متابعة عامة تُستخدم عند تعذر توليد سؤال عبر OpenAI
+GENERAL_FOLLOW_UP_QUESTIONS = [
+    "هل هناك أي إجراءات أو خطوات محددة يجب اتباعها في هذه الحالة؟",
+    "ما هي الإجراءات الوقائية التي يمكن اتخاذها لتجنب تكرار هذه المشكلة؟",
+    "هل هناك آثار جانبية أو تأثيرات على أقسام أو مناطق أخرى؟",
+    "هل هناك مسؤول أو فريق محدد يجب التواصل معه في مثل هذه الحالات؟",
+    "هل هناك أي معلومات إضافية مهمة تؤثر على فهم أو التعامل مع هذا الموضوع؟"
+]
     
-    # استخدام خوارزمية مقارنة السلاسل لمعرفة درجة التشابه
-    similarity_ratio = SequenceMatcher(None, clean_q1, clean_q2).ratio()
-    
-    # إذا كان هناك كلمات مشتركة مهمة، زيادة درجة التشابه
-    # الكلمات المهمة في سياق نظام المعرفة
-    important_words = ['كهرباء', 'كهربائي', 'حريق', 'إصابة', 'ضرر', 'مسؤول', 'صيانة', 'إبلاغ', 'تصليح', 
-                     'مشكلة', 'تماس', 'عزل', 'تيار', 'معدة', 'آلة', 'جهاز', 'موقع', 'مكان', 'طابق', 'دور']
-    
-    # عدد الكلمات المهمة المشتركة
-    common_important_words = sum(1 for word in important_words 
-                               if word in clean_q1 and word in clean_q2)
-    
-    # زيادة درجة التشابه بناءً على الكلمات المهمة المشتركة
-    if common_important_words > 0:
-        # زيادة بنسبة 10% لكل كلمة مهمة مشتركة، بحد أقصى 30%
-        similarity_ratio += min(0.3, common_important_words * 0.1)
+# قاموس من الأسئلة المتخصصة حسب نوع المحتوى
+SPECIALIZED_QUESTIONS = {
+    "كهربائي": [
+        "هل تم عزل التيار الكهربائي عن المنطقة المتضررة؟",
+        "هل تم تحديد مصدر المشكلة الكهربائية؟",
+        "هل هناك أي إصابات أو أضرار نتجت عن هذه المشكلة؟",
+        "هل تم إبلاغ مسؤول الصيانة أو قسم السلامة بالمشكلة؟",
+        "ما هي الخطوات الوقائية التي ستتخذ لمنع تكرار هذه المشكلة مستقبلاً؟",
+        "هل هناك أجزاء أخرى من المبنى متأثرة بهذه المشكلة الكهربائية؟"
+    ],
+    "حريق": [
+        "هل تم تفعيل نظام إنذار الحريق؟",
+        "هل تم إخلاء المبنى وفقاً لإجراءات السلامة؟",
+        "ما هو سبب الحريق المحتمل؟",
+        "هل تم الاتصال بالدفاع المدني؟",
+        "هل هناك أي إصابات أو خسائر بشرية؟",
+        "هل تم تقييم الأضرار المادية الناتجة عن الحريق؟"
+    ],
+    "عطل": [
+        "متى بدأ هذا العطل في الظهور؟",
+        "هل تمت محاولة إصلاح العطل من قبل؟",
+        "هل العطل يؤثر على سير العمل اليومي؟",
+        "هل هناك بدائل متاحة أثناء إصلاح العطل؟",
+        "من هو المسؤول عن متابعة إصلاح هذا العطل؟",
+        "ما هي القطع أو المواد المطلوبة للإصلاح؟"
+    ],
+    "مكان": [
+        "ما هو الموقع الدقيق وكيفية الوصول إليه؟",
+        "هل هناك تصاريح خاصة أو متطلبات أمنية للوصول؟",
+        "ما هي المرافق المتوفرة في هذا المكان؟",
+        "كم عدد الأشخاص الذين يمكن أن يستوعبهم هذا المكان؟",
+        "هل هناك أوقات محددة للعمل أو الزيارة؟",
+        "من المسؤول عن هذا المكان وكيفية التواصل معه؟"
+    ],
+    "موظف": [
+        "ما هو دور هذا الموظف الرئيسي ومسؤولياته؟",
+        "ما هي قنوات التواصل المباشر مع هذا الموظف؟",
+        "ما هي ساعات عمل هذا الموظف أو مواعيد تواجده؟",
+        "هل هناك بديل لهذا الموظف في حالة عدم تواجده؟",
+        "هل يملك هذا الموظف صلاحيات خاصة أو خبرات محددة؟",
+        "ما هو القسم أو الإدارة التي يتبع لها هذا الموظف؟"
+    ]
+}
+
+def format_related_knowledge(related, exclude_ids=(), limit=3):
+    """Markdown list of precomputed related knowledge entries (empty when there are none)"""
+    entries = [entry for entry in related or [] if entry.get('id') not in exclude_ids][:limit]
+    if not entries:
+        return ""
     
-    # إذا تجاوزت درجة التشابه العتبة المحددة، نعتبر السؤالين متشابهين
-    return similarity_ratio >= threshold
+    lines = ["**معرفة ذات صلة:**"]
+    for entry in entries:
+        lines.append(f"- {entry.get('preview', '')} ({entry.get('department', '')} - {entry.get('employee_name', '')})")
+    return "\n".join(lines) + "\n"
 
-def process_search_query(openai_client, db_client, query):
-    """Process a search query from the user"""
+def process_search_query(openai_client, db_client, query, tag=None):
+    """Process a search query from the user, optionally filtered by tag"""
     # Perform search
     with st.spinner("جاري البحث..."):
         try:
-            # المسار 1: استخدام البحث الأساسي القائم على الكلمات المفتاحية
-            # البحث في قاعدة البيانات مباشرة وهذا هو الأكثر موثوقية
-            search_results = search_knowledge(db_client, query)
-            print(f"Basic search found {len(search_results)} results")
+            # بحث هجين: نتائج الكلمات المفتاحية ونتائج التشابه الدلالي (embeddings)
+            # تُدمج معاً، ثم يعيد OpenAI ترتيب أفضل النتائج فقط
+            search_results = hybrid_search(db_client, openai_client, query, tag=tag)
+            print(f"Hybrid search found {len(search_results)} results")
+            
+            # عند عدم وجود نتائج، نقترح تصحيحاً للاستعلام من مفردات قاعدة المعرفة ("هل تقصد")
+            results_intro = "إليك نتائج البحث:\n\n"
+            results_query = query
+            if not search_results:
+                suggestion = None
+                try:
+                    suggestion = suggest_query_correction(db_client, query)
+                except Exception as e:
+                    print(f"Error suggesting query correction: {str(e)}")
+                
+                if suggestion:
+                    search_results = hybrid_search(db_client, openai_client, suggestion, tag=tag)
+                    results_query = suggestion
+                    results_intro = f"لم أجد نتائج لـ \"{query}\". هل تقصد **{suggestion}**؟ إليك نتائج البحث عنها:\n\n"
             
             # Check if we have results
             if not search_results:
@@ -84,7 +119,7 @@ def process_search_query(openai_client, db_client, query):
                 })
             else:
                 # Format search results
-                results_text = "إليك نتائج البحث:\n\n"
+                results_text = results_intro
                 for i, result in enumerate(search_results[:5]):  # Limit to top 5 results
                     # التعامل مع الطوابع الزمنية بطريقة آمنة
                     timestamp = result.get("timestamp", 0)
@@ -99,12 +134,24 @@ def process_search_query(openai_client, db_client, query):
                     
                     results_text += f"**النتيجة {i+1}** - من قسم {department}\n"
                     results_text += f"تمت المشاركة بواسطة: {employee} ({created_time})\n"
-                    results_text += f"{truncate_text(result.get('content', ''), 350)}\n\n"
+                    if result.get('tags'):
+                        results_text += f"**الكلمات المفتاحية:** {', '.join(result['tags'])}\n"
+                    # مقتطف من المقطع الأكثر صلة مع إبراز الكلمات المطابقة، مبني من مواضع الكلمات في الفهرس
+                    snippet = knowledge_snippet(db_client, result, results_query)
+                    results_text += f"{snippet['text']}\n\n"
                     
                     # Add separator between results except after the last one
                     if i < len(search_results[:5]) - 1:
                         results_text += "---\n\n"
                 
+                # معرفة ذات صلة بالنتيجة الأولى، محسوبة مسبقاً ومخزنة مع العنصر
+                related_text = format_related_knowledge(
+                    search_results[0].get('related'),
+                    exclude_ids={result['id'] for result in search_results[:5]}
+                )
+                if related_text:
+                    results_text += f"\n---\n\n{related_text}"
+                
                 # Add search results to chat history
                 st.session_state.chat_history.append({
                     "role": "assistant",
@@ -121,8 +168,126 @@ def process_search_query(openai_client, db_client, query):
                 "timestamp": time.time()
             })
 
-def start_knowledge_collection(openai_client, db_client, employee_name, department, knowledge_text):
+# الردود المقبولة عند سؤال المستخدم عن دمج المعرفة المكررة
+CONFIRM_ANSWERS = {"نعم", "ايوه", "أيوه", "اي", "أجل", "موافق", "yes", "y"}
+REJECT_ANSWERS = {"لا", "كلا", "no", "n"}
+
+def process_expert_query(db_client, query):
+    """Answer "who knows about X" from the employee and department expertise profiles"""
+    with st.spinner("جاري البحث عن الخبراء..."):
+        try:
+            experts = find_experts(db_client, query, "employee", limit=5)
+            departments = find_experts(db_client, query, "department", limit=3)
+            
+            if not experts:
+                content = "لم أجد موظفين شاركوا معرفة حول هذا الموضوع بعد. جرّب كلمات أخرى."
+            else:
+                content = f"الأكثر معرفة بـ \"{query}\":\n\n"
+                for i, expert in enumerate(experts):
+                    content += f"**{i+1}. {expert['name']}** - من قسم {expert['department'] or 'غير معروف'} ({expert['items']} مساهمة)\n"
+                    if expert['top_tags']:
+                        content += f"مواضيعه: {', '.join(expert['top_tags'])}\n"
+                    content += "\n"
+                if departments:
+                    content += f"**الأقسام الأكثر خبرة:** {', '.join(department['name'] for department in departments)}\n"
+        
+        except Exception as e:
+            print(f"Error finding experts: {str(e)}")
+            content = "آسف، حدث خطأ أثناء البحث عن الخبراء. يرجى المحاولة مرة أخرى."
+    
+    st.session_state.chat_history.append({
+        "role": "assistant",
+        "content": content,
+        "timestamp": time.time()
+    })
+
+def check_duplicate_knowledge(db_client, knowledge_text):
+    """
+    Look for an existing knowledge item that is nearly identical to the submission
+    
+    This runs before any OpenAI call. When a near-duplicate is found, the user is
+    asked whether to append to the existing entry, and True is returned.
+    """
+    try:
+        fingerprint, duplicates = find_duplicate_knowledge(db_client, knowledge_text)
+    except Exception as e:
+        print(f"Error checking for duplicate knowledge: {str(e)}")
+        return False
+    
+    for duplicate_id, _ in duplicates:
+        existing = get_knowledge(db_client, duplicate_id)
+        if not existing:
+            continue
+        
+        st.session_state.pending_duplicate = {
+            "text": knowledge_text,
+            "fingerprint": fingerprint,
+            "duplicate_id": duplicate_id
+        }
+        st.session_state.conversation_mode = "duplicate_confirmation"
+        
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": (
+                "يبدو أن هذه المعلومات مشابهة جداً لمعرفة موجودة مسبقاً "
+                f"(شاركها {existing.get('employee_name', 'غير معروف')} من قسم {existing.get('department', 'غير معروف')}):\n\n"
+                f"{truncate_text(existing.get('content', ''), 350)}\n\n"
+                "هل تريد إضافة معلوماتك إلى هذه المعرفة الموجودة؟ اكتب **نعم** للإضافة أو **لا** لمشاركتها كمعرفة جديدة."
+            ),
+            "timestamp": time.time()
+        })
+        return True
+    
+    return False
+
+def process_duplicate_confirmation(openai_client, db_client, employee_name, department, answer):
+    """Handle the user's reply when a submission was detected as a near-duplicate"""
+    pending = st.session_state.get("pending_duplicate") or {}
+    reply = answer.strip().strip(".!؟?").lower()
+    
+    if reply in CONFIRM_ANSWERS:
+        fingerprints = [pending["fingerprint"]] if pending.get("fingerprint") is not None else []
+        updated = append_to_knowledge(db_client, pending.get("duplicate_id"), pending.get("text", ""), employee_name, fingerprints=fingerprints)
+        
+        st.session_state.pending_duplicate = None
+        st.session_state.conversation_mode = "normal"
+        
+        if updated:
+            # المحتوى تغيّر، لذلك تُحسب متجهات المقاطع من جديد؛ الإضافة محفوظة حتى لو فشل ذلك
+            try:
+                passage_embeddings = embed_knowledge_passages(openai_client, updated['content'])
+                set_knowledge_embeddings(db_client, updated['id'], updated['updated_at'], passage_embeddings)
+            except Exception as e:
+                print(f"Error embedding knowledge: {str(e)}")
+            
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": f"تمت إضافة معلوماتك إلى المعرفة الموجودة:\n\n{truncate_text(updated['content'], 350)}\n\n**الإضافة الجديدة:**\n{pending.get('text', '')}",
+                "timestamp": time.time(),
+                "is_knowledge_saved": True
+            })
+        else:
+            # المعرفة الأصلية لم تعد موجودة، لذلك نتعامل مع النص كمعرفة جديدة
+            start_knowledge_collection(openai_client, db_client, employee_name, department, pending.get("text", ""), check_duplicates=False)
+    
+    elif reply in REJECT_ANSWERS:
+        st.session_state.pending_duplicate = None
+        st.session_state.conversation_mode = "normal"
+        start_knowledge_collection(openai_client, db_client, employee_name, department, pending.get("text", ""), check_duplicates=False)
+    
+    else:
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": "الرجاء الرد بـ **نعم** لإضافة معلوماتك إلى المعرفة الموجودة أو **لا** لمشاركتها كمعرفة جديدة.",
+            "timestamp": time.time()
+        })
+
+def start_knowledge_collection(openai_client, db_client, employee_name, department, knowledge_text, check_duplicates=True):
     """Start the knowledge collection process with follow-up questions"""
+    # التحقق من التكرار قبل أي استدعاء لـ OpenAI لتوفير تكلفة المعالجة الكاملة
+    if check_duplicates and check_duplicate_knowledge(db_client, knowledge_text):
+        return
+    
     with st.spinner("جاري معالجة مشاركة المعرفة..."):
         try:
             # معالجة المعرفة الأولية
@@ -146,28 +311,8 @@ def start_knowledge_collection(openai_client, db_client, employee_name, departme
             if not first_question:
                 import random
                 
-                # تحليل نوع المحتوى
-                content_lower = processed_content.lower()
-                
-                # أنواع مختلفة من المحتوى والكلمات المفتاحية المرتبطة بها
-                content_types = {
-                    "كهرباء": ["كهرباء", "كهربائي", "تماس", "فولت", "أسلاك", "تيار"],
-                    "حادث": ["حادث", "إصابة", "ضرر", "خطر", "إسعاف", "طوارئ"],
-                    "منتج": ["منتج", "سلعة", "بضاعة", "مخزون", "قطعة", "صنف"],
-                    "إجراء": ["إجراء", "عملية", "خطوات", "تعليمات", "دليل", "طريقة"],
-                    "مكان": ["مكان", "موقع", "مبنى", "طابق", "مكتب", "قاعة", "دور"],
-                    "شخص": ["موظف", "شخص", "مدير", "مسؤول", "عامل", "فريق"]
-                }
-                
-                # تحديد نوع المحتوى
-                detected_type = "عام"  # النوع الافتراضي
-                max_matches = 0
-                
-                for content_type, keywords in content_types.items():
-                    matches = sum(1 for word in keywords if word in content_lower)
-                    if matches > max_matches:
-                        max_matches = matches
-                        detected_type = content_type
+                # تحديد نوع المحتوى (النوع الافتراضي "عام")
+                detected_type = detect_content_type(processed_content, "knowledge_types", default="عام")
                 
                 # قائمة من الأسئلة المخصصة حسب نوع المحتوى
                 questions_by_type = {
@@ -216,6 +361,8 @@ def start_knowledge_collection(openai_client, db_client, employee_name, departme
             st.session_state.current_knowledge = {
                 "original_text": knowledge_text,
                 "processed_text": processed_content,
+                "fingerprint": simhash(knowledge_text),  # بصمة النص الأصلي لكشف التكرار لاحقاً
+                "idempotency_key": str(uuid.uuid4()),  # مفتاح الجلسة: تُحفظ المعرفة مرة واحدة مهما تكرر الإرسال
                 "question_index": 0,
                 "questions": [first_question],  # نخزن فقط السؤال الأول
                 "answers": [""],  # مكان للإجابة على السؤال الأول
@@ -284,6 +431,20 @@ def process_knowledge_collection(openai_client, db_client, employee_name, depart
     # زيادة مؤشر السؤال
     st.session_state.current_knowledge["question_index"] += 1
     
+    # إعادة إرسال جلسة حُفظت معرفتها بالفعل: نعرض المحفوظ دون استدعاء النموذج مرة أخرى
+    idempotency_key = st.session_state.current_knowledge.get("idempotency_key")
+    saved_item = get_knowledge(db_client, item_id_for(idempotency_key)) if idempotency_key else None
+    if saved_item:
+        st.session_state.current_knowledge["complete"] = True
+        st.session_state.chat_history.append({
+            "role": "assistant",
+            "content": f"تم حفظ هذه المعرفة بالفعل:\n\n{saved_item.get('content', '')}",
+            "timestamp": time.time(),
+            "is_knowledge_saved": True
+        })
+        st.session_state.conversation_mode = "normal"
+        return
+    
     # التحقق مما إذا كنا قد طرحنا 3 أسئلة (كحد أقصى)
     if st.session_state.current_knowledge["question_index"] >= 3:
         # لقد جمعنا كل الإجابات، معالجة المعرفة النهائية
@@ -301,7 +462,21 @@ def process_knowledge_collection(openai_client, db_client, employee_name, depart
                 tags = generate_knowledge_tags(openai_client, final_knowledge)
                 
                 # حفظ في قاعدة البيانات
-                knowledge_id = save_knowledge(db_client, final_knowledge, department, employee_name)
+                # تمثيل كل مقطع من المعرفة كمتجه (embedding) للبحث الدلالي؛ الحفظ يتم حتى لو فشل ذلك
+                try:
+                    passage_embeddings = embed_knowledge_passages(openai_client, final_knowledge)
+                except Exception as e:
+                    print(f"Error embedding knowledge: {str(e)}")
+                    passage_embeddings = None
+                
+                fingerprint = st.session_state.current_knowledge.get("fingerprint")
+                knowledge_id = save_knowledge(
+                    db_client, final_knowledge, department, employee_name,
+                    tags=tags,
+                    fingerprints=[fingerprint] if fingerprint is not None else None,
+                    passage_embeddings=passage_embeddings,
+                    idempotency_key=idempotency_key
+                )
                 
                 # وضع علامة على المعرفة على أنها مكتملة
                 st.session_state.current_knowledge["complete"] = True
@@ -318,6 +493,12 @@ def process_knowledge_collection(openai_client, db_client, employee_name, depart
                 
                 assistant_message = f"{completion_message}\n\n{final_knowledge}\n\n**الكلمات المفتاحية:** {', '.join(tags)}"
                 
+                # المعرفة ذات الصلة حُسبت عند الحفظ، فتكفي قراءة العنصر المحفوظ
+                saved_item = get_knowledge(db_client, knowledge_id)
+                related_text = format_related_knowledge(saved_item.get('related') if saved_item else None)
+                if related_text:
+                    assistant_message += f"\n\n{related_text}"
+                
                 # إضافة إلى سجل المحادثة
                 st.session_state.chat_history.append({
                     "role": "assistant",
@@ -384,86 +565,21 @@ def process_knowledge_collection(openai_client, db_client, employee_name, depart
                 full_context = content_context + "\n\n" + "\n".join(previous_qa)
                 
                 # استخدام خوارزمية بسيطة لتحليل السياق وتوليد سؤال مناسب
-                general_questions = [
-                    "هل هناك أي إجراءات أو خطوات محددة يجب اتباعها في هذه الحالة؟",
-                    "ما هي الإجراءات الوقائية التي يمكن اتخاذها لتجنب تكرار هذه المشكلة؟",
-                    "هل هناك آثار جانبية أو تأثيرات على أقسام أو مناطق أخرى؟",
-                    "هل هناك مسؤول أو فريق محدد يجب التواصل معه في مثل هذه الحالات؟",
-                    "هل هناك أي معلومات إضافية مهمة تؤثر على فهم أو التعامل مع هذا الموضوع؟"
-                ]
+                general_questions = GENERAL_FOLLOW_UP_QUESTIONS
                 
                 import random
                 fallback_question = random.choice(general_questions)
                 
                 # محاولة تخصيص السؤال حسب نوع المحتوى والسؤال السابق
-                # قاموس من الأسئلة المتخصصة حسب نوع المحتوى
-                specialized_questions = {
-                    "كهربائي": [
-                        "هل تم عزل التيار الكهربائي عن المنطقة المتضررة؟",
-                        "هل تم تحديد مصدر المشكلة الكهربائية؟",
-                        "هل هناك أي إصابات أو أضرار نتجت عن هذه المشكلة؟",
-                        "هل تم إبلاغ مسؤول الصيانة أو قسم السلامة بالمشكلة؟",
-                        "ما هي الخطوات الوقائية التي ستتخذ لمنع تكرار هذه المشكلة مستقبلاً؟",
-                        "هل هناك أجزاء أخرى من المبنى متأثرة بهذه المشكلة الكهربائية؟"
-                    ],
-                    "حريق": [
-                        "هل تم تفعيل نظام إنذار الحريق؟",
-                        "هل تم إخلاء المبنى وفقاً لإجراءات السلامة؟",
-                        "ما هو سبب الحريق المحتمل؟",
-                        "هل تم الاتصال بالدفاع المدني؟",
-                        "هل هناك أي إصابات أو خسائر بشرية؟",
-                        "هل تم تقييم الأضرار المادية الناتجة عن الحريق؟"
-                    ],
-                    "عطل": [
-                        "متى بدأ هذا العطل في الظهور؟",
-                        "هل تمت محاولة إصلاح العطل من قبل؟",
-                        "هل العطل يؤثر على سير العمل اليومي؟",
-                        "هل هناك بدائل متاحة أثناء إصلاح العطل؟",
-                        "من هو المسؤول عن متابعة إصلاح هذا العطل؟",
-                        "ما هي القطع أو المواد المطلوبة للإصلاح؟"
-                    ],
-                    "مكان": [
-                        "ما هو الموقع الدقيق وكيفية الوصول إليه؟",
-                        "هل هناك تصاريح خاصة أو متطلبات أمنية للوصول؟",
-                        "ما هي المرافق المتوفرة في هذا المكان؟",
-                        "كم عدد الأشخاص الذين يمكن أن يستوعبهم هذا المكان؟",
-                        "هل هناك أوقات محددة للعمل أو الزيارة؟",
-                        "من المسؤول عن هذا المكان وكيفية التواصل معه؟"
-                    ],
-                    "موظف": [
-                        "ما هو دور هذا الموظف الرئيسي ومسؤولياته؟",
-                        "ما هي قنوات التواصل المباشر مع هذا الموظف؟",
-                        "ما هي ساعات عمل هذا الموظف أو مواعيد تواجده؟",
-                        "هل هناك بديل لهذا الموظف في حالة عدم تواجده؟",
-                        "هل يملك هذا الموظف صلاحيات خاصة أو خبرات محددة؟",
-                        "ما هو القسم أو الإدارة التي يتبع لها هذا الموظف؟"
-                    ]
-                }
                 
                 # تحديد نوع المحتوى من السياق
-                content_types = {
-                    "كهربائي": ["كهرباء", "كهربائي", "تماس", "فولت", "أسلاك", "تيار"],
-                    "حريق": ["حريق", "دخان", "حرارة", "لهب", "إطفاء", "طفاية"],
-                    "عطل": ["عطل", "خلل", "صيانة", "إصلاح", "تصليح", "معطل", "توقف"],
-                    "مكان": ["مكان", "غرفة", "مكتب", "طابق", "دور", "مبنى", "قاعة"],
-                    "موظف": ["موظف", "مدير", "عامل", "مشرف", "مهندس", "فني", "مسؤول"]
-                }
-                
-                # تحديد نوع المحتوى
-                detected_type = None
-                max_matches = 0
-                
-                for content_type, keywords in content_types.items():
-                    matches = sum(1 for word in keywords if word in full_context.lower())
-                    if matches > max_matches:
-                        max_matches = matches
-                        detected_type = content_type
+                detected_type = detect_content_type(full_context, "incident_types")
                 
                 # إذا تم اكتشاف نوع محتوى واضح، استخدم الأسئلة المتخصصة المناسبة
-                if detected_type and detected_type in specialized_questions:
+                if detected_type and detected_type in SPECIALIZED_QUESTIONS:
                     # فلترة الأسئلة لتجنب تكرار ما سبق طرحه
                     previous_questions = st.session_state.current_knowledge["previous_questions"]
-                    available_questions = [q for q in specialized_questions[detected_type] 
+                    available_questions = [q for q in SPECIALIZED_QUESTIONS[detected_type] 
                                           if not any(are_questions_similar(q, prev_q) for prev_q in previous_questions)]
                     
                     # إذا كانت هناك أسئلة متبقية، اختر واحدًا عشوائيًا
@@ -503,7 +619,7 @@ def show_chat_interface(openai_client, db_client):
         st.session_state.chat_history = []
     
     if "conversation_mode" not in st.session_state:
-        st.session_state.conversation_mode = "normal"  # normal, knowledge_collection, search
+        st.session_state.conversation_mode = "normal"  # normal, knowledge_collection, duplicate_confirmation, search
         
     if "current_knowledge" not in st.session_state:
         st.session_state.current_knowledge = {
@@ -550,6 +666,32 @@ def show_chat_interface(openai_client, db_client):
                 })
             st.rerun()
         
+        # تصفية نتائج البحث حسب الكلمة المفتاحية (من فهرس الكلمات المفتاحية)
+        if st.session_state.conversation_mode == "search":
+            # البحث في المعرفة نفسها أو عن الموظفين الأكثر خبرة بالموضوع
+            st.session_state.search_target = st.radio(
+                "البحث عن:",
+                options=["knowledge", "experts"],
+                format_func=lambda target: "المعرفة" if target == "knowledge" else "الخبراء (من يعرف عن...)",
+                key="search_target_choice"
+            )
+            
+            tag_counts = get_tag_counts(db_client, limit=50)
+            tag_options = ["الكل"] + list(tag_counts.keys())
+            selected_tag = st.selectbox(
+                "تصفية حسب الكلمة المفتاحية:",
+                options=tag_options,
+                format_func=lambda tag: tag if tag == "الكل" else f"{tag} ({tag_counts[tag]})",
+                key="search_tag_filter"
+            )
+            st.session_state.search_tag = None if selected_tag == "الكل" else selected_tag
+        
+            # صيغة البحث المتقدم (انظر query_parser.py)
+            st.caption(
+                "بحث متقدم: `قسم:الصيانة` `كاتب:سارة` `وسم:سلامة` `بعد:2024-01-01` `قبل:2024-06` "
+                "و\"عبارة بين علامتي تنصيص\" للمطابقة الحرفية"
+            )
+        
         # Clear chat history button
         if st.button("مسح المحادثة", use_container_width=True):
             st.session_state.chat_history = []
@@ -632,7 +774,11 @@ def show_chat_interface(openai_client, db_client):
             return
         
         # تصحيح الأخطاء الإملائية في رسالة المستخدم
-        corrected_input = correct_arabic_text(user_input)
+        if st.session_state.conversation_mode == "search":
+            # فلاتر البحث (قسم:، وسم:...) تبقى كما كتبها المستخدم
+            corrected_input = correct_query(user_input, correct_arabic_text)
+        else:
+            corrected_input = correct_arabic_text(user_input)
         
         # إضافة رسالة المستخدم إلى سجل المحادثة (مع التصحيح)
         st.session_state.chat_history.append({
@@ -645,12 +791,19 @@ def show_chat_interface(openai_client, db_client):
         # معالجة الرسالة بناءً على وضع المحادثة (استخدام النص المصحح)
         if st.session_state.conversation_mode == "search":
             # معالجة استعلام البحث باستخدام النص المصحح
-            process_search_query(openai_client, db_client, corrected_input)
+            if st.session_state.get("search_target") == "experts":
+                process_expert_query(db_client, corrected_input)
+            else:
+                process_search_query(openai_client, db_client, corrected_input, tag=st.session_state.get("search_tag"))
             
         elif st.session_state.conversation_mode == "knowledge_collection":
             # نحن في منتصف عملية جمع المعرفة مع أسئلة المتابعة
             process_knowledge_collection(openai_client, db_client, employee_name, department, corrected_input)
             
+        elif st.session_state.conversation_mode == "duplicate_confirmation":
+            # المستخدم يرد على سؤال دمج المعرفة المكررة
+            process_duplicate_confirmation(openai_client, db_client, employee_name, department, corrected_input)
+            
         else:  # الوضع العادي - افتراض أن هذه معرفة جديدة للمشاركة
             # بدء عملية جمع المعرفة
             start_knowledge_collection(openai_client, db_client, employee_name, department, corrected_input)
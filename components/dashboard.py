@@ -3,16 +3,16 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from database import get_knowledge_stats, get_ideas_stats
-from knowledge_manager import KnowledgeManager
+from knowledge_manager import get_dashboard_cache
 from utils import get_sample_departments
 
 def show_dashboard(db_client):
     """Display knowledge manager dashboard"""
     st.title("Knowledge Manager Dashboard 📊")
     
-    # Initialize knowledge manager
-    km = KnowledgeManager(db_client)
+    # Cached knowledge manager: figures are computed once per data version and
+    # refreshed in the background, so reruns and tab switches read nothing
+    km = get_dashboard_cache(db_client)
     
     # Dashboard sections
     tab1, tab2, tab3 = st.tabs(["Overview", "Department Analytics", "Content Analytics"])
@@ -32,8 +32,8 @@ def show_overview_dashboard(db_client, km):
     
     # Get statistics
     with st.spinner("Loading statistics..."):
-        knowledge_stats = get_knowledge_stats(db_client)
-        ideas_stats = get_ideas_stats(db_client)
+        knowledge_stats = km.get_knowledge_stats()
+        ideas_stats = km.get_ideas_stats()
         
     # Key metrics in cards
     col1, col2, col3, col4 = st.columns(4)
@@ -62,6 +62,27 @@ def show_overview_dashboard(db_client, km):
             value=ideas_stats["by_status"]["in_progress"]
         )
     
+    # Distinct employees who saved knowledge, proposed or supported ideas (estimated)
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric(
+            label="Active Contributors Today",
+            value=km.get_active_contributors(1)
+        )
+    
+    with col2:
+        st.metric(
+            label="Active This Week",
+            value=km.get_active_contributors(7)
+        )
+    
+    with col3:
+        st.metric(
+            label="Active This Month",
+            value=km.get_active_contributors(30)
+        )
+    
     # Activity over time chart
     st.subheader("Activity Over Time")
     
@@ -145,6 +166,47 @@ def show_overview_dashboard(db_client, km):
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("No contributor data available yet.")
+    
+    # Expert finder, answered from the expertise profiles instead of the documents
+    st.subheader("Expert Finder")
+    
+    topic = st.text_input("Who knows about...", key="expert_topic")
+    
+    if topic:
+        experts = km.find_experts(topic, limit=10)
+        
+        if experts:
+            expert_df = pd.DataFrame({
+                "Employee": [expert["name"] for expert in experts],
+                "Relevance": [round(expert["score"], 2) for expert in experts],
+                "Department": [expert["department"] or "Unknown" for expert in experts],
+                "Contributions": [expert["items"] for expert in experts],
+                "Topics": [", ".join(expert["top_tags"]) for expert in experts]
+            })
+            
+            fig = px.bar(
+                expert_df,
+                x="Relevance",
+                y="Employee",
+                orientation="h",
+                hover_data=["Department", "Contributions", "Topics"],
+                color="Relevance",
+                color_continuous_scale="Greens"
+            )
+            
+            fig.update_layout(
+                yaxis=dict(autorange="reversed"),
+                height=400,
+                margin=dict(l=20, r=20, t=20, b=20)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+            
+            departments = km.find_experts(topic, kind="department", limit=5)
+            if departments:
+                st.caption("Most knowledgeable departments: " + ", ".join(department["name"] for department in departments))
+        else:
+            st.info("No expertise found for this topic yet.")
 
 def show_department_analytics(db_client, km):
     """Display department analytics section"""
@@ -153,6 +215,7 @@ def show_department_analytics(db_client, km):
     # Get department activity data
     with st.spinner("Loading department data..."):
         dept_activity = km.get_department_activity()
+        active_contributors = km.get_active_contributors_by_department(30)
         
     if not dept_activity:
         st.info("No department activity data available yet.")
@@ -166,6 +229,7 @@ def show_department_analytics(db_client, km):
             "Knowledge Contributions": stats["knowledge_count"],
             "Ideas Submitted": stats["ideas_count"],
             "Total Activity": stats["knowledge_count"] + stats["ideas_count"],
+            "Active Contributors (30 days)": active_contributors.get(dept, 0),
             "Last Activity": stats["last_activity"]
         })
     
@@ -219,7 +283,7 @@ def show_department_analytics(db_client, km):
     # Department data table
     st.subheader("Department Detail")
     st.dataframe(
-        dept_df[["Department", "Knowledge Contributions", "Ideas Submitted", "Total Activity", "Last Activity"]],
+        dept_df[["Department", "Knowledge Contributions", "Ideas Submitted", "Total Activity", "Active Contributors (30 days)", "Last Activity"]],
         use_container_width=True,
         hide_index=True
     )
@@ -230,8 +294,8 @@ def show_content_analytics(db_client, km):
     
     # Get statistics
     with st.spinner("Loading statistics..."):
-        knowledge_stats = get_knowledge_stats(db_client)
-        ideas_stats = get_ideas_stats(db_client)
+        knowledge_stats = km.get_knowledge_stats()
+        ideas_stats = km.get_ideas_stats()
     
     col1, col2 = st.columns(2)
     
@@ -299,6 +363,37 @@ def show_content_analytics(db_client, km):
         
         st.plotly_chart(fig, use_container_width=True)
     
+    # Tag counts come from precomputed counters, so no knowledge content is scanned
+    st.subheader("Most Used Tags")
+    
+    tag_counts = km.get_tag_counts(15)
+    
+    if tag_counts:
+        tag_df = pd.DataFrame({
+            "Tag": list(tag_counts.keys()),
+            "Count": list(tag_counts.values())
+        })
+        
+        fig = px.bar(
+            tag_df,
+            x="Count",
+            y="Tag",
+            orientation="h",
+            title="Knowledge Items per Tag",
+            color="Count",
+            color_continuous_scale="Teal"
+        )
+        
+        fig.update_layout(
+            yaxis=dict(autorange="reversed"),
+            height=400,
+            margin=dict(l=20, r=20, t=40, b=20)
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No tag data available yet.")
+    
     # Popular ideas
     st.subheader("Most Popular Ideas")
     
@@ -315,7 +410,7 @@ def show_content_analytics(db_client, km):
                 st.write(f"From: {idea.get('department', 'Unknown')}")
             
             with col3:
-                supporter_count = len(idea.get('supporters', []))
+                supporter_count = int(idea.get('supporter_count', 0))
                 st.write(f"👍 {supporter_count} supporters")
             
             if i < len(popular_ideas) - 1:
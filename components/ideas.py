@@ -1,22 +1,33 @@
 import streamlit as st
 import time
-from database import add_idea, get_ideas, update_idea_status, support_idea
-from utils import get_sample_departments, format_relative_time
+import uuid
+from database import (
+    add_idea, get_ideas, update_idea_status, support_idea,
+    get_idea_supporters, get_supported_idea_ids, get_supported_ideas
+)
+from utils import get_sample_departments, format_relative_time, submission_key
 
 def show_ideas_interface(db_client):
     """Display ideas and initiatives interface"""
     st.title("Ideas & Initiatives 💡")
     
     # Tabs for viewing and adding ideas
-    tab1, tab2 = st.tabs(["Browse Ideas", "Submit New Idea"])
+    tab1, tab2, tab3 = st.tabs(["Browse Ideas", "Ideas I Support", "Submit New Idea"])
+    
+    # Ideas the current employee supports, read once for every card
+    employee_name = st.session_state.get("employee_name", "")
+    supported_ids = set(get_supported_idea_ids(db_client, employee_name)) if employee_name else set()
     
     with tab1:
-        show_ideas_list(db_client)
+        show_ideas_list(db_client, supported_ids)
     
     with tab2:
+        show_supported_ideas(db_client, employee_name, supported_ids)
+    
+    with tab3:
         show_add_idea(db_client)
 
-def show_ideas_list(db_client):
+def show_ideas_list(db_client, supported_ids):
     """Display list of ideas and initiatives"""
     # Get all ideas
     with st.spinner("Loading ideas..."):
@@ -58,9 +69,24 @@ def show_ideas_list(db_client):
         st.info("No ideas found matching your filters.")
     else:
         for idea in filtered_ideas:
-            show_idea_card(db_client, idea)
+            show_idea_card(db_client, idea, supported_ids)
+
+def show_supported_ideas(db_client, employee_name, supported_ids):
+    """Display the ideas the current employee supports"""
+    if not employee_name:
+        st.info("Please enter your name in the Knowledge Sharing section to see the ideas you support.")
+        return
+    
+    with st.spinner("Loading ideas..."):
+        ideas = get_supported_ideas(db_client, employee_name)
+    
+    if not ideas:
+        st.info("You haven't supported any ideas yet.")
+    else:
+        for idea in ideas:
+            show_idea_card(db_client, idea, supported_ids, key_prefix="supported_")
 
-def show_idea_card(db_client, idea):
+def show_idea_card(db_client, idea, supported_ids, key_prefix=""):
     """Display an individual idea card"""
     # Status badge color
     status = idea.get("status", "proposed")
@@ -99,33 +125,39 @@ def show_idea_card(db_client, idea):
         st.markdown(idea.get('description', 'No description provided'))
         
         # Supporters
-        supporters = idea.get('supporters', [])
-        supporter_count = len(supporters)
+        supporter_count = int(idea.get('supporter_count', 0))
         
         st.markdown(f"### Supporters ({supporter_count})")
         if supporter_count > 0:
-            # Display first 5 supporters, then "and X more" if needed
-            display_supporters = supporters[:5]
-            more_count = supporter_count - 5
-            
-            supporters_text = ", ".join(display_supporters)
-            if more_count > 0:
-                supporters_text += f" and {more_count} more"
-            
-            st.markdown(supporters_text)
+            # Expander bodies run even when collapsed, so the names are only
+            # read from the supporters table once asked for
+            show_key = f"{key_prefix}show_supporters_{idea.get('id')}"
+            if st.session_state.get(show_key):
+                # Display first 5 supporters, then "and X more" if needed
+                display_supporters = get_idea_supporters(db_client, idea.get('id'), limit=5)
+                more_count = supporter_count - len(display_supporters)
+                
+                supporters_text = ", ".join(display_supporters)
+                if more_count > 0:
+                    supporters_text += f" and {more_count} more"
+                
+                st.markdown(supporters_text)
+            elif st.button("Show supporters", key=f"{key_prefix}supporters_{idea.get('id')}"):
+                st.session_state[show_key] = True
+                st.rerun()
         else:
             st.markdown("No supporters yet. Be the first to support this idea!")
         
         # Support button
         employee_name = st.session_state.get("employee_name", "")
         
-        if employee_name and employee_name not in supporters:
-            if st.button("👍 Support this idea", key=f"support_{idea.get('id')}", use_container_width=True):
+        if employee_name and idea.get('id') not in supported_ids:
+            if st.button("👍 Support this idea", key=f"{key_prefix}support_{idea.get('id')}", use_container_width=True):
                 if not employee_name.strip():
                     st.warning("Please enter your name in the Knowledge Sharing section before supporting.")
                 else:
-                    updated_supporters = support_idea(db_client, idea.get('id'), employee_name)
-                    st.success(f"You have supported this idea! Total supporters: {len(updated_supporters)}")
+                    supporter_count = support_idea(db_client, idea.get('id'), employee_name)
+                    st.success(f"You have supported this idea! Total supporters: {supporter_count}")
                     st.rerun()
         
         # Status update (for knowledge managers only)
@@ -136,11 +168,11 @@ def show_idea_card(db_client, idea):
                 ["proposed", "in_progress", "completed", "rejected"],
                 index=["proposed", "in_progress", "completed", "rejected"].index(status),
                 format_func=lambda x: x.replace("_", " ").title(),
-                key=f"status_{idea.get('id')}"
+                key=f"{key_prefix}status_{idea.get('id')}"
             )
             
             if new_status != status:
-                if st.button("Update Status", key=f"update_{idea.get('id')}", use_container_width=True):
+                if st.button("Update Status", key=f"{key_prefix}update_{idea.get('id')}", use_container_width=True):
                     update_idea_status(db_client, idea.get('id'), new_status)
                     st.success(f"Status updated to {new_status.replace('_', ' ').title()}")
                     st.rerun()
@@ -185,10 +217,21 @@ def show_add_idea(db_client):
             st.error("Please enter your name.")
             return
         
+        # The key follows the form's content, so a rerun or retry of the same idea
+        # doesn't add it twice while a different idea always gets a new key
+        if "submission_session" not in st.session_state:
+            st.session_state.submission_session = str(uuid.uuid4())
+        idempotency_key = submission_key(
+            st.session_state.submission_session, "idea", idea_title, idea_description, employee_name, department
+        )
+        
         # Save to database
         with st.spinner("Submitting your idea..."):
             try:
-                idea_id = add_idea(db_client, idea_title, idea_description, employee_name, department)
+                idea_id = add_idea(
+                    db_client, idea_title, idea_description, employee_name, department,
+                    idempotency_key=idempotency_key
+                )
                 
                 # Support own idea automatically
                 support_idea(db_client, idea_id, employee_name)
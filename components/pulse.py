@@ -1,8 +1,9 @@
 import streamlit as st
 import time
+import uuid
 from datetime import datetime, timedelta
 from database import add_pulse_update, get_pulse_updates
-from utils import get_sample_departments, format_relative_time
+from utils import get_sample_departments, format_relative_time, submission_key
 
 def show_org_pulse(db_client):
     """Display organization pulse feature"""
@@ -94,13 +95,24 @@ def show_add_pulse_update(db_client):
             st.error("Please enter update content.")
             return
         
+        # The key follows the form's content, so a rerun or retry of the same update
+        # doesn't post it twice while a different update always gets a new key
+        if "submission_session" not in st.session_state:
+            st.session_state.submission_session = str(uuid.uuid4())
+        idempotency_key = submission_key(
+            st.session_state.submission_session, "pulse", update_title, update_content, department
+        )
+        
         # Save to database
         with st.spinner("Posting update..."):
             try:
                 # Convert "Organization-wide" to a standard format
                 dept = department if department != "Organization-wide" else "All"
                 
-                update_id = add_pulse_update(db_client, update_title, update_content, dept)
+                update_id = add_pulse_update(
+                    db_client, update_title, update_content, dept,
+                    idempotency_key=idempotency_key
+                )
                 
                 # Success message
                 st.success("Update posted successfully!")
@@ -0,0 +1,165 @@
+import hashlib
+import re
+from collections import OrderedDict
+
+# مجموعات الكلمات المفتاحية لكل تصنيف (taxonomy) مستخدم في النظام
+# ترتيب الفئات مهم: عند تساوي الدرجات تفوز الفئة الأولى
+TAXONOMIES = {
+    # fallback أسئلة المتابعة في generate_smart_questions
+    "question_topics": {
+        # الكلمات المفتاحية المتعلقة بالسيارات بالعربية والإنجليزية
+        "car": ["سيارة", "مركبة", "car", "vehicle", "سيارات", "شاحنة", "تويوتا", "مرسيدس", "هوندا",
+                "نيسان", "مازدا", "نقل", "بضائع", "ركاب", "toyota", "honda", "nissan", "mercedes",
+                "موديل", "model", "بيك اب", "pickup", "لون", "color", "white", "بيضاء", "سوداء", "black"],
+        # كلمات مفتاحية للموردين
+        "supplier": ["مورد", "مزود", "بائع", "supplier", "vendor", "موزع", "distributor", "محل", "متجر",
+                     "store", "shop", "سوق", "market", "شركة", "company", "تاجر", "تجار"],
+        # كلمات مفتاحية للمنتجات
+        "product": ["منتج", "سلعة", "product", "item", "بضاعة", "goods", "merchandise", "صنف", "أصناف",
+                    "مقاس", "size", "وزن", "weight", "نوعية", "quality", "ماركة", "brand"],
+        # كلمات مفتاحية للإجراءات
+        "process": ["إجراء", "عملية", "خطوات", "process", "procedure", "steps", "protocol", "طريقة",
+                    "method", "نظام", "system", "آلية", "mechanism"],
+        # كلمات مفتاحية للمعدات
+        "equipment": ["معدة", "آلة", "جهاز", "equipment", "machine", "device", "tool", "أداة", "أدوات",
+                      "tools", "machinery", "ماكينة"],
+        # كلمات مفتاحية للأماكن
+        "location": ["مكان", "موقع", "مقر", "location", "place", "office", "مكتب", "فرع", "branch",
+                     "مستودع", "warehouse", "مخزن", "storage", "عنوان", "address"],
+        # كلمات مفتاحية للبرامج والأنظمة
+        "software": ["برنامج", "نظام", "تطبيق", "software", "system", "app", "application", "موقع",
+                     "website", "platform", "منصة"],
+        # كلمات مفتاحية للأشخاص وجهات الاتصال
+        "person": ["شخص", "مسؤول", "موظف", "contact", "person", "employee", "مدير", "manager",
+                   "director", "مشرف", "supervisor", "مختص", "specialist"]
+    },
+    # سياق السيارة: للاستخدام التجاري أو للبيع
+    "car_context": {
+        "commercial": ["نقل", "بضائع", "تجاري", "commercial", "cargo", "delivery"],
+        "for_sale": ["بيع", "شراء", "sale", "سعر", "price", "تكلفة", "cost"]
+    },
+    # عناوين الأقسام في fallback الخاص بـ process_question_answers
+    "document_sections": {
+        "car": ["سيارة", "مركبة", "car", "vehicle", "سيارات", "شاحنة"],
+        "supplier": ["مورد", "supplier", "vendor", "بائع", "مزود"],
+        "product": ["منتج", "product", "بضاعة", "سلعة"],
+        "process": ["إجراء", "عملية", "خطوات", "process", "procedure", "steps"],
+        "software": ["برنامج", "نظام", "تطبيق", "software", "system", "app"],
+        "equipment": ["معدة", "آلة", "جهاز", "equipment", "machine"],
+        "location": ["مكان", "موقع", "مقر", "location", "place", "office"],
+        "person": ["شخص", "مسؤول", "موظف", "contact", "person", "employee"]
+    },
+    # نوع المعرفة عند اختيار السؤال الأول في المحادثة
+    "knowledge_types": {
+        "كهرباء": ["كهرباء", "كهربائي", "تماس", "فولت", "أسلاك", "تيار"],
+        "حادث": ["حادث", "إصابة", "ضرر", "خطر", "إسعاف", "طوارئ"],
+        "منتج": ["منتج", "سلعة", "بضاعة", "مخزون", "قطعة", "صنف"],
+        "إجراء": ["إجراء", "عملية", "خطوات", "تعليمات", "دليل", "طريقة"],
+        "مكان": ["مكان", "موقع", "مبنى", "طابق", "مكتب", "قاعة", "دور"],
+        "شخص": ["موظف", "شخص", "مدير", "مسؤول", "عامل", "فريق"]
+    },
+    # نوع المشكلة عند توليد أسئلة المتابعة البديلة في المحادثة
+    "incident_types": {
+        "كهربائي": ["كهرباء", "كهربائي", "تماس", "فولت", "أسلاك", "تيار"],
+        "حريق": ["حريق", "دخان", "حرارة", "لهب", "إطفاء", "طفاية"],
+        "عطل": ["عطل", "خلل", "صيانة", "إصلاح", "تصليح", "معطل", "توقف"],
+        "مكان": ["مكان", "غرفة", "مكتب", "طابق", "دور", "مبنى", "قاعة"],
+        "موظف": ["موظف", "مدير", "عامل", "مشرف", "مهندس", "فني", "مسؤول"]
+    }
+}
+
+class ContentClassifier:
+    """
+    Detect content types from keyword groups with a single scan of the text
+    
+    All keywords of all taxonomies are compiled into one pattern. One pass finds
+    every keyword occurring in the text (with the same substring semantics as
+    `keyword in text`), and the result is cached per text hash so several
+    taxonomies can score the same text without rescanning it.
+    """
+    
+    def __init__(self, taxonomies, cache_size=512):
+        self.taxonomies = taxonomies
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        
+        keywords = sorted({kw.lower() for groups in taxonomies.values() for kws in groups.values() for kw in kws},
+                          key=len, reverse=True)
+        
+        # A zero-width lookahead reports a match at every position; alternatives are
+        # longest first, so each match is the longest keyword starting there
+        self.pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))")
+        
+        # Shorter keywords that are prefixes of a longer one start at the same
+        # position, so they are credited whenever the longer keyword matches
+        self.prefix_keywords = {
+            kw: frozenset(other for other in keywords if kw.startswith(other))
+            for kw in keywords
+        }
+    
+    def keywords_in(self, text):
+        """Return the set of keywords that occur anywhere in text"""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        
+        found = self._cache.get(key)
+        if found is not None:
+            self._cache.move_to_end(key)
+            return found
+        
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            found |= self.prefix_keywords[match.group(1)]
+        found = frozenset(found)
+        
+        self._cache[key] = found
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        
+        return found
+    
+    def classify(self, text, taxonomy, long_keyword_bonus=False):
+        """
+        Score every category of a taxonomy for the given text
+        
+        Each distinct keyword found adds 1 to its categories. With
+        long_keyword_bonus, keywords longer than 4 characters add 2.
+        """
+        found = self.keywords_in(text)
+        scores = {}
+        for category, keywords in self.taxonomies[taxonomy].items():
+            score = 0
+            for keyword in keywords:
+                if keyword.lower() in found:
+                    score += 2 if long_keyword_bonus and len(keyword) > 4 else 1
+            scores[category] = score
+        return scores
+    
+    def matched_categories(self, text, taxonomy):
+        """Return the categories with at least one keyword in the text"""
+        return {category for category, score in self.classify(text, taxonomy).items() if score > 0}
+    
+    def top_category(self, text, taxonomy, default=None, long_keyword_bonus=False):
+        """Return the highest-scoring category, or default when nothing matched"""
+        return best_category(self.classify(text, taxonomy, long_keyword_bonus), default)
+
+def best_category(scores, default=None):
+    """Pick the category with the highest positive score (earliest wins ties)"""
+    top, max_score = default, 0
+    for category, score in scores.items():
+        if score > max_score:
+            top, max_score = category, score
+    return top
+
+_classifier = ContentClassifier(TAXONOMIES)
+
+def classify_content(text, taxonomy, long_keyword_bonus=False):
+    """Score text against one of the built-in taxonomies"""
+    return _classifier.classify(text, taxonomy, long_keyword_bonus)
+
+def matched_content_types(text, taxonomy):
+    """Categories of a built-in taxonomy with at least one keyword in text"""
+    return _classifier.matched_categories(text, taxonomy)
+
+def detect_content_type(text, taxonomy, default=None, long_keyword_bonus=False):
+    """Highest-scoring category of a built-in taxonomy for text"""
+    return _classifier.top_category(text, taxonomy, default, long_keyword_bonus)
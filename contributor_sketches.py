@@ -0,0 +1,184 @@
+"""
+Active-contributor counts from HyperLogLog sketches per (department, day)
+
+Every contribution (a saved knowledge item, a new idea, a supported idea)
+adds its employee to the sketch of its department and local calendar day.
+Sketches live in the stats table (pk "active_contributors", sk
+"YYYY-MM-DD#department") with one attribute per non-empty register. A
+register only ever grows, so an update is a single conditional SET that
+keeps the larger value, and concurrent writers never lose each other's
+contributions.
+
+Distinct employees over any window and set of departments are estimated by
+merging the sketches (register-wise maximum): constant memory per sketch,
+about 3% standard error, and no employee is counted twice across days.
+
+Sketches of data saved before they existed are rebuilt with the command
+below. Supports migrated from the old supporters lists carry the time of
+their idea, so a rebuild counts them on that day:
+
+    python contributor_sketches.py rebuild
+"""
+import argparse
+import hashlib
+import math
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+
+from activity_rollups import activity_date
+
+SKETCH_PK = "active_contributors"
+
+# 2^10 registers per sketch: about 3% standard error (1.04 / sqrt(m))
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over 64-bit hashes (Flajolet et al.)"""
+    
+    def __init__(self, registers=None):
+        self.registers = np.zeros(REGISTERS, dtype=np.uint8) if registers is None else registers
+    
+    @staticmethod
+    def register_of(value):
+        """(register index, rank) a value sets: the first PRECISION hash bits and the leading zeros after them, plus one"""
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - PRECISION)
+        rest = h & ((1 << (64 - PRECISION)) - 1)
+        return index, (64 - PRECISION) - rest.bit_length() + 1
+    
+    def add(self, value):
+        index, rank = self.register_of(value)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+    
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+        raw = alpha * REGISTERS * REGISTERS / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate for small cardinalities
+        if raw <= 2.5 * REGISTERS and zeros:
+            return REGISTERS * math.log(REGISTERS / zeros)
+        return raw
+    
+    def __len__(self):
+        return int(round(self.estimate()))
+
+def sketch_key(day, department):
+    return f"{day}#{department}"
+
+def row_sketch(row):
+    """HyperLogLog of a stored row, whose registers are the r<index> attributes"""
+    sketch = HyperLogLog()
+    for name, value in row.items():
+        if name[0] == 'r' and name[1:].isdigit():
+            sketch.registers[int(name[1:])] = int(value)
+    return sketch
+
+def record_contributor(dynamodb, employee_name, department, timestamp):
+    """Add an employee to the sketch of a department's day"""
+    from database import STATS_TABLE
+    
+    day = activity_date(timestamp)
+    department = department or 'Unknown'
+    index, rank = HyperLogLog.register_of(employee_name or 'Anonymous')
+    try:
+        dynamodb.Table(STATS_TABLE).update_item(
+            Key={'pk': SKETCH_PK, 'sk': sketch_key(day, department)},
+            UpdateExpression="SET #register = :rank, #date = :date, #department = :department",
+            # Registers keep their maximum: a smaller rank changes nothing
+            ConditionExpression="attribute_not_exists(#register) OR #register < :rank",
+            ExpressionAttributeNames={'#register': f"r{index}", '#date': 'date', '#department': 'department'},
+            ExpressionAttributeValues={':rank': rank, ':date': day, ':department': department}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+    except Exception as e:
+        print(f"Error updating contributor sketch: {str(e)}")
+
+def load_sketches(dynamodb, days=None):
+    """(date, department, sketch) of the stored sketches, optionally only of the last `days` days"""
+    from boto3.dynamodb.conditions import Key
+    from database import STATS_TABLE
+    
+    table = dynamodb.Table(STATS_TABLE)
+    condition = Key('pk').eq(SKETCH_PK)
+    if days:
+        condition &= Key('sk').gte(date.fromordinal(date.today().toordinal() - days + 1).isoformat())
+    
+    query_kwargs = {'KeyConditionExpression': condition}
+    while True:
+        response = table.query(**query_kwargs)
+        for row in response.get('Items', []):
+            yield row['date'], row['department'], row_sketch(row)
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def active_contributors(dynamodb, days=30, department=None):
+    """Estimated distinct employees who contributed in the last `days` days (None: ever)"""
+    merged = HyperLogLog()
+    for _, sketch_department, sketch in load_sketches(dynamodb, days):
+        if department is None or sketch_department == department:
+            merged.merge(sketch)
+    return len(merged)
+
+def active_contributors_by_department(dynamodb, days=30):
+    """{department: estimated distinct contributors} over the last `days` days"""
+    merged = defaultdict(HyperLogLog)
+    for _, department, sketch in load_sketches(dynamodb, days):
+        merged[department].merge(sketch)
+    return {department: len(sketch) for department, sketch in merged.items()}
+
+def rebuild_sketches(dynamodb):
+    """Recompute every sketch from the knowledge and ideas tables and overwrite the stored rows"""
+    from database import KNOWLEDGE_TABLE, IDEAS_TABLE, IDEA_SUPPORTERS_TABLE, STATS_TABLE, scan_projection
+    
+    sketches = defaultdict(HyperLogLog)
+    def add(employee_name, department, timestamp):
+        sketches[(activity_date(timestamp), department or 'Unknown')].add(employee_name or 'Anonymous')
+    
+    for item in scan_projection(dynamodb, KNOWLEDGE_TABLE, ["employee_name", "department", "timestamp"]):
+        add(item.get('employee_name'), item.get('department'), item.get('timestamp', 0))
+    idea_departments = {}
+    for idea in scan_projection(dynamodb, IDEAS_TABLE, ["id", "employee_name", "department", "timestamp"]):
+        idea_departments[idea['id']] = idea.get('department')
+        add(idea.get('employee_name'), idea.get('department'), idea.get('timestamp', 0))
+    for edge in scan_projection(dynamodb, IDEA_SUPPORTERS_TABLE, ["idea_id", "employee_name", "timestamp"]):
+        add(edge['employee_name'], idea_departments.get(edge['idea_id']), edge.get('timestamp', 0))
+    
+    table = dynamodb.Table(STATS_TABLE)
+    stale = {sketch_key(day, department) for day, department, _ in load_sketches(dynamodb)}
+    with table.batch_writer() as batch:
+        for (day, department), sketch in sketches.items():
+            sk = sketch_key(day, department)
+            stale.discard(sk)
+            row = {'pk': SKETCH_PK, 'sk': sk, 'date': day, 'department': department}
+            row.update({f"r{index}": int(sketch.registers[index]) for index in np.flatnonzero(sketch.registers)})
+            batch.put_item(Item=row)
+        for sk in stale:
+            batch.delete_item(Key={'pk': SKETCH_PK, 'sk': sk})
+    
+    print(f"Rebuilt {len(sketches)} contributor sketches")
+    return len(sketches)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain active-contributor sketches")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recompute every sketch from the knowledge and ideas tables")
+    args = parser.parse_args(argv)
+    
+    from database import initialize_db
+    
+    dynamodb = initialize_db()
+    if args.command == "rebuild":
+        rebuild_sketches(dynamodb)
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,79 @@ import os
 import time
 from datetime import datetime, timedelta
 import uuid
+from boto3.dynamodb.conditions import Key
+
+from arabic_analyzer import analyze_to_field, analyze_query, normalize_field
+from chunker import chunk_passages
+from query_parser import parse_query, compile_plan
+from search_index import get_knowledge_search_index, index_knowledge_item
+from spelling_corrector import learn_knowledge_vocabulary
+from vector_index import embedding_to_binary, index_knowledge_embeddings
+from related_knowledge import update_related_knowledge, refresh_related_previews
+from expertise_index import record_knowledge_expertise
+from activity_rollups import record_activity
+from leaderboards import record_contribution, record_idea_support
+from contributor_sketches import record_contributor
+from simhash_index import simhash, fingerprint_to_str, index_knowledge_fingerprints
+from query_cache import QueryCache
 
 # AWS DynamoDB tables
 KNOWLEDGE_TABLE = "KMP_Knowledge"
 PULSE_TABLE = "KMP_OrganizationPulse"
 IDEAS_TABLE = "KMP_Ideas"
 DEPARTMENTS_TABLE = "KMP_Departments"
+KNOWLEDGE_TAGS_TABLE = "KMP_KnowledgeTags"  # tag -> knowledge item adjacency list
+STATS_TABLE = "KMP_Stats"  # precomputed counters (pk = counter family, sk = member)
+IDEA_SUPPORTERS_TABLE = "KMP_IdeaSupporters"  # idea -> supporting employee edges
+SUPPORTERS_BY_EMPLOYEE_INDEX = "employee_name-index"  # employee -> supported ideas
+
+# Maximum number of tags kept per knowledge item
+MAX_TAGS_PER_ITEM = 10
+
+# Namespace of the item ids derived from idempotency keys
+IDEMPOTENCY_NAMESPACE = uuid.UUID("6f1c2b8e-4d3a-5e7f-9a10-2b3c4d5e6f70")
+
+# Bumped by every knowledge write; search results are cached per generation
+_knowledge_generation = 0
+_search_cache = QueryCache(max_size=256, ttl=300)
+
+def get_knowledge_generation():
+    """Current knowledge index generation (changes whenever knowledge is written)"""
+    return _knowledge_generation
+
+def bump_knowledge_generation():
+    """Invalidate cached search results after a knowledge write"""
+    global _knowledge_generation
+    _knowledge_generation += 1
+    bump_data_version()
+
+# Bumped by every write the dashboard reports on (knowledge and ideas);
+# dashboard figures are cached per version
+_data_version = 0
+
+def get_data_version():
+    """Current dashboard data version (changes whenever knowledge or ideas are written)"""
+    return _data_version
+
+def bump_data_version():
+    """Mark cached dashboard figures as stale after a write"""
+    global _data_version
+    _data_version += 1
+
+def item_id_for(idempotency_key=None):
+    """New item id; the same idempotency key always gives the same id"""
+    if idempotency_key:
+        return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, idempotency_key))
+    return str(uuid.uuid4())
+
+def put_new_item(table, item):
+    """Write an item unless one with its id exists; returns whether it was written"""
+    # A repeated submission (rerun, double click, retry) finds its own earlier write
+    try:
+        table.put_item(Item=item, ConditionExpression="attribute_not_exists(id)")
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
 
 def initialize_db():
     """Initialize AWS DynamoDB connection"""
@@ -74,8 +141,66 @@ def create_tables_if_not_exist(dynamodb):
                 ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
             )
         
+        # Create Knowledge Tags table if it doesn't exist
+        if KNOWLEDGE_TAGS_TABLE not in existing_tables:
+            dynamodb.create_table(
+                TableName=KNOWLEDGE_TAGS_TABLE,
+                KeySchema=[
+                    {'AttributeName': 'tag', 'KeyType': 'HASH'},  # Partition key
+                    {'AttributeName': 'item_id', 'KeyType': 'RANGE'},  # Sort key
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'tag', 'AttributeType': 'S'},
+                    {'AttributeName': 'item_id', 'AttributeType': 'S'},
+                ],
+                ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+            )
+        
+        # Create Stats table if it doesn't exist
+        if STATS_TABLE not in existing_tables:
+            dynamodb.create_table(
+                TableName=STATS_TABLE,
+                KeySchema=[
+                    {'AttributeName': 'pk', 'KeyType': 'HASH'},  # Partition key
+                    {'AttributeName': 'sk', 'KeyType': 'RANGE'},  # Sort key
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'pk', 'AttributeType': 'S'},
+                    {'AttributeName': 'sk', 'AttributeType': 'S'},
+                ],
+                ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+            )
+        
+        # Create Idea Supporters table if it doesn't exist
+        if IDEA_SUPPORTERS_TABLE not in existing_tables:
+            dynamodb.create_table(
+                TableName=IDEA_SUPPORTERS_TABLE,
+                KeySchema=[
+                    {'AttributeName': 'idea_id', 'KeyType': 'HASH'},  # Partition key
+                    {'AttributeName': 'employee_name', 'KeyType': 'RANGE'},  # Sort key
+                ],
+                AttributeDefinitions=[
+                    {'AttributeName': 'idea_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'employee_name', 'AttributeType': 'S'},
+                    {'AttributeName': 'timestamp', 'AttributeType': 'N'},
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        # "Ideas I support", newest support first
+                        'IndexName': SUPPORTERS_BY_EMPLOYEE_INDEX,
+                        'KeySchema': [
+                            {'AttributeName': 'employee_name', 'KeyType': 'HASH'},
+                            {'AttributeName': 'timestamp', 'KeyType': 'RANGE'},
+                        ],
+                        'Projection': {'ProjectionType': 'KEYS_ONLY'},
+                        'ProvisionedThroughput': {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+                    }
+                ],
+                ProvisionedThroughput={'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+            )
+        
         # Wait for tables to be created
-        for table_name in [KNOWLEDGE_TABLE, PULSE_TABLE, IDEAS_TABLE]:
+        for table_name in [KNOWLEDGE_TABLE, PULSE_TABLE, IDEAS_TABLE, KNOWLEDGE_TAGS_TABLE, STATS_TABLE, IDEA_SUPPORTERS_TABLE]:
             if table_name not in existing_tables:
                 table = dynamodb.Table(table_name)
                 table.wait_until_exists()
@@ -85,12 +210,26 @@ def create_tables_if_not_exist(dynamodb):
         # If tables can't be created, we'll continue and handle errors at runtime
 
 # Knowledge Management Functions
-def save_knowledge(dynamodb, content, department, employee_name):
-    """Save knowledge item to DynamoDB"""
+def save_knowledge(dynamodb, content, department, employee_name, tags=None, fingerprints=None, passage_embeddings=None,
+                   idempotency_key=None):
+    """
+    Save knowledge item to DynamoDB
+    
+    Calls with the same idempotency_key save the item once; later calls
+    return the id of the saved item without writing anything.
+    """
     table = dynamodb.Table(KNOWLEDGE_TABLE)
     
-    item_id = str(uuid.uuid4())
+    item_id = item_id_for(idempotency_key)
     timestamp = int(time.time())
+    tags = clean_tags(tags)
+    
+    # SimHash fingerprints of the original submission (passed in) and of the saved
+    # content, so a re-submission is caught whichever form it resembles
+    fingerprints = list(fingerprints or [])
+    content_fingerprint = simhash(content)
+    if content_fingerprint is not None and content_fingerprint not in fingerprints:
+        fingerprints.append(content_fingerprint)
     
     item = {
         'id': item_id,
@@ -98,12 +237,109 @@ def save_knowledge(dynamodb, content, department, employee_name):
         'department': department,
         'employee_name': employee_name,
         'timestamp': timestamp,
-        'created_at': datetime.utcnow().isoformat()
+        'created_at': datetime.utcnow().isoformat(),
+        # Normalized and stemmed tokens, computed once here instead of on every search
+        'search_tokens': analyze_to_field(content),
+        # (start, end) offsets of the passages that are indexed and shown as snippets
+        'passages': [list(span) for span in chunk_passages(content)]
     }
-    
-    table.put_item(Item=item)
+    if tags:
+        item['tags'] = tags
+    if fingerprints:
+        item['fingerprints'] = [fingerprint_to_str(fp) for fp in fingerprints]
+    if passage_embeddings:
+        # One packed float32 value per passage, about a quarter of the size of a list of numbers
+        item['passage_embeddings'] = [embedding_to_binary(embedding) for embedding in passage_embeddings]
+    
+    if not put_new_item(table, item):
+        return item_id
+    update_knowledge_tags(dynamodb, item_id, [], tags)
+    index_knowledge_fingerprints(item_id, fingerprints)
+    index_knowledge_item(item)
+    learn_knowledge_vocabulary(content)
+    index_knowledge_embeddings(item)
+    update_related_knowledge(dynamodb, item)
+    record_knowledge_expertise(dynamodb, item)
+    record_activity(dynamodb, "knowledge", department, timestamp)
+    record_contribution(dynamodb, employee_name)
+    record_contributor(dynamodb, employee_name, department, timestamp)
+    bump_knowledge_generation()
     return item_id
 
+def append_to_knowledge(dynamodb, item_id, addition, employee_name, fingerprints=None):
+    """Append new information to an existing knowledge item instead of saving a duplicate"""
+    table = dynamodb.Table(KNOWLEDGE_TABLE)
+    
+    item = table.get_item(Key={'id': item_id}).get('Item')
+    if not item:
+        return None
+    
+    content = f"{item.get('content', '')}\n\n---\n**إضافة من {employee_name}:**\n{addition}"
+    search_tokens = analyze_to_field(content)
+    passages = [list(span) for span in chunk_passages(content)]
+    # The addition (unless the caller already fingerprinted it) and the merged
+    # text are fingerprinted, so either is found as a duplicate later
+    fingerprints = list(fingerprints) if fingerprints is not None else [simhash(addition)]
+    fingerprints = [fp for fp in dict.fromkeys(fingerprints + [simhash(content)]) if fp is not None]
+    updated_at = datetime.utcnow().isoformat()
+    
+    table.update_item(
+        Key={'id': item_id},
+        UpdateExpression=(
+            "SET content = :content, search_tokens = :tokens, passages = :passages, updated_at = :updated_at, "
+            "contributors = list_append(if_not_exists(contributors, :empty), :contributor), "
+            "fingerprints = list_append(if_not_exists(fingerprints, :empty), :fingerprints) "
+            # The old embeddings belong to the old passages; set_knowledge_embeddings adds new ones
+            "REMOVE passage_embeddings, embedding"
+        ),
+        ExpressionAttributeValues={
+            ':content': content,
+            ':tokens': search_tokens,
+            ':passages': passages,
+            ':updated_at': updated_at,
+            ':empty': [],
+            ':contributor': [employee_name],
+            ':fingerprints': [fingerprint_to_str(fp) for fp in fingerprints]
+        }
+    )
+    item['content'] = content
+    item['search_tokens'] = search_tokens
+    item['passages'] = passages
+    item['updated_at'] = updated_at
+    item.pop('passage_embeddings', None)
+    item.pop('embedding', None)
+    
+    index_knowledge_fingerprints(item_id, fingerprints)
+    # Leaves the vector index until the new passages are embedded
+    index_knowledge_embeddings(item)
+    index_knowledge_item(item)
+    learn_knowledge_vocabulary(addition)
+    update_related_knowledge(dynamodb, item)
+    refresh_related_previews(dynamodb, item)
+    # The addition counts towards the profile of the employee who wrote it
+    record_knowledge_expertise(dynamodb, dict(item, employee_name=employee_name), added_text=addition)
+    bump_knowledge_generation()
+    
+    return item
+
+def set_knowledge_embeddings(dynamodb, item_id, updated_at, passage_embeddings):
+    """Store passage embeddings computed after an append, unless the item was changed again since"""
+    packed = [embedding_to_binary(embedding) for embedding in passage_embeddings]
+    try:
+        dynamodb.Table(KNOWLEDGE_TABLE).update_item(
+            Key={'id': item_id},
+            UpdateExpression="SET passage_embeddings = :embeddings REMOVE embedding",
+            ConditionExpression="updated_at = :updated_at",
+            ExpressionAttributeValues={':embeddings': packed, ':updated_at': updated_at}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # A later append changed the passages; these embeddings no longer match them
+        return False
+    
+    index_knowledge_embeddings({'id': item_id, 'passage_embeddings': packed})
+    bump_knowledge_generation()
+    return True
+
 def get_knowledge(dynamodb, item_id=None):
     """Get knowledge items from DynamoDB"""
     table = dynamodb.Table(KNOWLEDGE_TABLE)
@@ -115,76 +351,291 @@ def get_knowledge(dynamodb, item_id=None):
         response = table.scan()
         return response.get('Items', [])
 
-def search_knowledge(dynamodb, query):
-    """Search knowledge items based on query"""
-    # In a production app, you'd use AWS ElasticSearch or other search services
-    # For simplicity, we'll perform a more enhanced filtered scan here
+def get_items_by_id(dynamodb, table_name, item_ids):
+    """Fetch several items of a table by id using batched reads, preserving the requested order"""
+    ids = list(dict.fromkeys(item_ids))
+    found = {}
+    
+    # BatchGetItem accepts at most 100 keys per request
+    for start in range(0, len(ids), 100):
+        request = {table_name: {'Keys': [{'id': item_id} for item_id in ids[start:start + 100]]}}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(table_name, []):
+                found[item['id']] = item
+            request = response.get('UnprocessedKeys') or None
+    
+    return [found[item_id] for item_id in ids if item_id in found]
+
+def get_knowledge_items(dynamodb, item_ids):
+    """Fetch several knowledge items by id using batched reads, preserving the requested order"""
+    return get_items_by_id(dynamodb, KNOWLEDGE_TABLE, item_ids)
+
+def scan_knowledge_pages(dynamodb, start_key=None, page_size=100):
+    """Yield pages of knowledge items together with the key to resume after each page"""
     table = dynamodb.Table(KNOWLEDGE_TABLE)
     
-    try:
-        response = table.scan()
-        items = response.get('Items', [])
+    scan_kwargs = {'Limit': page_size}
+    if start_key:
+        scan_kwargs['ExclusiveStartKey'] = start_key
+    
+    while True:
+        response = table.scan(**scan_kwargs)
+        last_key = response.get('LastEvaluatedKey')
         
-        if not items:
-            print("No items found in knowledge table.")
-            return []
-            
-        # Break query into terms for more flexible matching
-        query_terms = query.lower().split()
+        yield response.get('Items', []), last_key
+        
+        # DynamoDB omits LastEvaluatedKey on the final page
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+def update_enriched_knowledge(dynamodb, item, changes):
+    """
+    Write re-enrichment results to a knowledge item unless it changed since it was read
+    
+    Only the attributes in changes are written (None removes one), on the
+    condition that updated_at is still the value read with item, so an append
+    made in the meantime is never overwritten. Returns the updated item, or
+    None when the item changed or was deleted.
+    """
+    table = dynamodb.Table(KNOWLEDGE_TABLE)
+    changes = dict(changes)
+    if 'tags' in changes:
+        changes['tags'] = clean_tags(changes['tags'])
+    
+    # Rewritten content needs new analyzed tokens, passages and a fingerprint
+    content_changed = 'content' in changes and changes['content'] != item.get('content')
+    fingerprints = []
+    if content_changed:
+        changes['search_tokens'] = analyze_to_field(changes['content'])
+        changes['passages'] = [list(span) for span in chunk_passages(changes['content'])]
+        fingerprints = [fp for fp in [simhash(changes['content'])] if fp is not None]
+    
+    names = {}
+    values = {':updated_at': datetime.utcnow().isoformat()}
+    sets = ["updated_at = :updated_at"]
+    removes = []
+    for i, (attribute, value) in enumerate(changes.items()):
+        names[f'#a{i}'] = attribute
+        if value is None:
+            removes.append(f'#a{i}')
+        else:
+            values[f':v{i}'] = value
+            sets.append(f'#a{i} = :v{i}')
+    if fingerprints:
+        values[':empty'] = []
+        values[':fingerprints'] = [fingerprint_to_str(fp) for fp in fingerprints]
+        sets.append("fingerprints = list_append(if_not_exists(fingerprints, :empty), :fingerprints)")
+    
+    # Items never appended to or re-enriched have no updated_at, and must still have none
+    if item.get('updated_at'):
+        condition = "attribute_exists(id) AND updated_at = :read_updated_at"
+        values[':read_updated_at'] = item['updated_at']
+    else:
+        condition = "attribute_exists(id) AND attribute_not_exists(updated_at)"
+    
+    update_expression = "SET " + ", ".join(sets)
+    if removes:
+        update_expression += " REMOVE " + ", ".join(removes)
+    
+    try:
+        response = table.update_item(
+            Key={'id': item['id']},
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW"
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+    updated = response['Attributes']
+    
+    # The same derived data save_knowledge maintains, for the parts that changed
+    added_tags = []
+    if 'tags' in changes:
+        update_knowledge_tags(dynamodb, item['id'], item.get('tags', []), changes['tags'])
+        added_tags = [tag for tag in changes['tags'] if tag not in item.get('tags', [])]
+    index_knowledge_item(updated)
+    index_knowledge_embeddings(updated)
+    if content_changed:
+        index_knowledge_fingerprints(item['id'], fingerprints)
+        learn_knowledge_vocabulary(updated['content'])
+        update_related_knowledge(dynamodb, updated)
+        refresh_related_previews(dynamodb, updated)
+    if content_changed or added_tags:
+        record_knowledge_expertise(
+            dynamodb, updated, added_text=updated['content'] if content_changed else None, added_tags=added_tags
+        )
+    bump_knowledge_generation()
+    
+    return updated
+
+# Knowledge Tag Functions
+def tag_key(tag):
+    """Normalized form of a tag used as the index key"""
+    return normalize_field(tag.strip())
+
+def clean_tags(tags):
+    """Strip, de-duplicate (by normalized form) and cap a list of tags"""
+    cleaned = {}
+    for tag in tags or []:
+        if not isinstance(tag, str) or not tag.strip():
+            continue
+        cleaned.setdefault(tag_key(tag), tag.strip())
+    return list(cleaned.values())[:MAX_TAGS_PER_ITEM]
+
+def update_knowledge_tags(dynamodb, item_id, old_tags, new_tags):
+    """Sync the tag index and tag counts after an item's tags changed"""
+    old = {tag_key(tag): tag for tag in old_tags or []}
+    new = {tag_key(tag): tag for tag in new_tags or []}
+    added = [key for key in new if key not in old]
+    removed = [key for key in old if key not in new]
+    
+    if not added and not removed:
+        return
+    
+    tags_table = dynamodb.Table(KNOWLEDGE_TAGS_TABLE)
+    with tags_table.batch_writer() as batch:
+        for key in added:
+            batch.put_item(Item={'tag': key, 'item_id': item_id, 'label': new[key]})
+        for key in removed:
+            batch.delete_item(Key={'tag': key, 'item_id': item_id})
+    
+    # Counters are kept with atomic ADD updates so concurrent saves don't lose increments
+    stats_table = dynamodb.Table(STATS_TABLE)
+    for key, delta in [(key, 1) for key in added] + [(key, -1) for key in removed]:
+        stats_table.update_item(
+            Key={'pk': 'tag_count', 'sk': key},
+            UpdateExpression="ADD #count :delta SET #label = if_not_exists(#label, :label)",
+            ExpressionAttributeNames={'#count': 'count', '#label': 'label'},
+            ExpressionAttributeValues={':delta': delta, ':label': new.get(key) or old[key]}
+        )
+
+def get_knowledge_ids_by_tag(dynamodb, tag):
+    """Get the ids of knowledge items with the given tag from the tag index"""
+    table = dynamodb.Table(KNOWLEDGE_TAGS_TABLE)
+    
+    query_kwargs = {'KeyConditionExpression': Key('tag').eq(tag_key(tag))}
+    item_ids = []
+    while True:
+        response = table.query(**query_kwargs)
+        item_ids += [edge['item_id'] for edge in response.get('Items', [])]
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return item_ids
+
+def get_knowledge_by_tag(dynamodb, tag):
+    """Get knowledge items with the given tag using the tag index (newest first)"""
+    items = get_knowledge_items(dynamodb, get_knowledge_ids_by_tag(dynamodb, tag))
+    items.sort(key=lambda x: x.get('timestamp', 0), reverse=True)
+    return items
+
+def get_tag_counts(dynamodb, limit=None):
+    """Get the number of knowledge items per tag, most used first"""
+    table = dynamodb.Table(STATS_TABLE)
+    
+    query_kwargs = {'KeyConditionExpression': Key('pk').eq('tag_count')}
+    counts = {}
+    while True:
+        response = table.query(**query_kwargs)
+        for row in response.get('Items', []):
+            if row.get('count', 0) > 0:
+                counts[row.get('label', row['sk'])] = int(row['count'])
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    ordered = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+    return dict(ordered[:limit] if limit else ordered)
+
+def mark_backfilled(dynamodb, family):
+    """Record that a counter family was (re)built from the tables; returns the marker's timestamp"""
+    timestamp = int(time.time())
+    dynamodb.Table(STATS_TABLE).put_item(Item={'pk': 'backfilled', 'sk': family, 'timestamp': timestamp})
+    return timestamp
+
+def get_backfill_time(dynamodb, family):
+    """When a counter family was last (re)built from the tables, or None if it never was"""
+    try:
+        response = dynamodb.Table(STATS_TABLE).get_item(Key={'pk': 'backfilled', 'sk': family})
+        marker = response.get('Item')
+        return int(marker['timestamp']) if marker else None
+    except Exception as e:
+        print(f"Error reading backfill marker: {str(e)}")
+        return None
+
+def search_knowledge(dynamodb, query, tag=None):
+    """
+    Search knowledge items based on query, optionally restricted to one tag
+    
+    The query may use field filters and quoted phrases, for example
+    department:الصيانة author:"سارة أحمد" tag:سلامة after:2024-01 "ضغط المضخة"
+    (see query_parser).
+    """
+    parsed = parse_query(query, tag)
+    
+    # Repeated queries (also with different spellings of the same words) are
+    # served from the cache until the next knowledge write
+    cache_key = (parsed.cache_key(), get_knowledge_generation())
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    
+    results = _search_knowledge_uncached(dynamodb, parsed)
+    if results is not None:
+        _search_cache.put(cache_key, tuple(results))
+        return results
+    return []
+
+def with_best_passage(item, span):
+    """Copy of a search hit carrying the passage that matched best, for use as a snippet"""
+    start, end = span
+    return {**item, 'best_passage': {'start': start, 'end': end, 'text': item.get('content', '')[start:end]}}
+
+def knowledge_filter_ids(dynamodb, parsed):
+    """Ids of knowledge items passing the field filters of a parsed query (None when it has none)"""
+    index = get_knowledge_search_index(dynamodb)
+    plan = compile_plan(parsed, index, lambda tag: get_knowledge_ids_by_tag(dynamodb, tag))
+    return plan.candidate_ids()
+
+def _search_knowledge_uncached(dynamodb, parsed):
+    """Score knowledge items found through the search index; returns None when the search failed"""
+    try:
+        # Analyze the query the same way content was analyzed at write time
+        query_terms = analyze_query(parsed.text)
         
-        if not query_terms:
+        if not query_terms and not parsed.has_filters:
             return []
-            
-        # Score each item based on matching terms
-        scored_items = []
         
-        for item in items:
-            content = item.get('content', '').lower()
-            department = item.get('department', '').lower()
-            employee = item.get('employee_name', '').lower()
-            
-            # Calculate a match score
-            score = 0
-            
-            # Check for term matches in content
-            for term in query_terms:
-                if term in content:
-                    # Count occurrences for content weighting
-                    occurences = content.count(term)
-                    score += min(occurences * 2, 10)  # Cap to avoid overwhelming results
-                    
-                # Check exact match in department or employee name (higher weight)
-                if term in department:
-                    score += 5
-                    
-                if term in employee:
-                    score += 5
+        # The trigram index narrows the candidates, so the table is not scanned per query
+        index = get_knowledge_search_index(dynamodb)
             
-            # Exact phrase match is a strong signal
-            if query.lower() in content:
-                score += 15
-                
-            # Items with any match are added to results
-            if score > 0:
-                scored_items.append((item, score))
+        if not len(index):
+            print("No items found in knowledge table.")
+            return []
         
-        # Sort by score (descending)
-        scored_items.sort(key=lambda x: x[1], reverse=True)
+        # Field filters narrow the candidates through index lookups before any scoring
+        allowed_ids = knowledge_filter_ids(dynamodb, parsed)
+        phrases = [analyze_query(phrase) for phrase in parsed.phrases]
         
-        # Return the items without scores
-        return [item for item, _ in scored_items]
+        # Return the items without scores, each with its best-matching passage
+        return [with_best_passage(item, span) for item, _, span in index.search(query_terms, allowed_ids, phrases)]
         
     except Exception as e:
         print(f"Error searching knowledge: {str(e)}")
-        # In case of error, return an empty list
-        return []
+        # In case of error, return nothing so the failure is not cached
+        return None
 
 # Organization Pulse Functions
-def add_pulse_update(dynamodb, title, content, department):
-    """Add organization pulse update to DynamoDB"""
+def add_pulse_update(dynamodb, title, content, department, idempotency_key=None):
+    """Add organization pulse update to DynamoDB (once per idempotency_key)"""
     table = dynamodb.Table(PULSE_TABLE)
     
-    item_id = str(uuid.uuid4())
+    item_id = item_id_for(idempotency_key)
     timestamp = int(time.time())
     
     item = {
@@ -196,7 +647,7 @@ def add_pulse_update(dynamodb, title, content, department):
         'created_at': datetime.utcnow().isoformat()
     }
     
-    table.put_item(Item=item)
+    put_new_item(table, item)
     return item_id
 
 def get_pulse_updates(dynamodb, days=5):
@@ -224,11 +675,11 @@ def get_pulse_updates(dynamodb, days=5):
     return items
 
 # Ideas & Initiatives Functions
-def add_idea(dynamodb, title, description, employee_name, department):
-    """Add new idea/initiative to DynamoDB"""
+def add_idea(dynamodb, title, description, employee_name, department, idempotency_key=None):
+    """Add new idea/initiative to DynamoDB (once per idempotency_key)"""
     table = dynamodb.Table(IDEAS_TABLE)
     
-    item_id = str(uuid.uuid4())
+    item_id = item_id_for(idempotency_key)
     timestamp = int(time.time())
     
     item = {
@@ -239,11 +690,16 @@ def add_idea(dynamodb, title, description, employee_name, department):
         'department': department,
         'timestamp': timestamp,
         'created_at': datetime.utcnow().isoformat(),
-        'supporters': [],
+        # Supporters are edges in the idea supporters table; only their number is kept here
+        'supporter_count': 0,
         'status': 'proposed'  # proposed, in_progress, completed, rejected
     }
     
-    table.put_item(Item=item)
+    if not put_new_item(table, item):
+        return item_id
+    record_activity(dynamodb, "idea", department, timestamp)
+    record_contributor(dynamodb, employee_name, department, timestamp)
+    bump_data_version()
     return item_id
 
 def get_ideas(dynamodb):
@@ -258,6 +714,10 @@ def get_ideas(dynamodb):
     
     return items
 
+def get_ideas_items(dynamodb, idea_ids):
+    """Fetch several ideas by id using batched reads, preserving the requested order"""
+    return get_items_by_id(dynamodb, IDEAS_TABLE, idea_ids)
+
 def update_idea_status(dynamodb, idea_id, new_status):
     """Update idea/initiative status"""
     table = dynamodb.Table(IDEAS_TABLE)
@@ -268,115 +728,111 @@ def update_idea_status(dynamodb, idea_id, new_status):
         ExpressionAttributeNames={'#status': 'status'},
         ExpressionAttributeValues={':s': new_status}
     )
+    bump_data_version()
+
+def add_idea_supporter(dynamodb, idea_id, employee_name, timestamp):
+    """Write a supporter edge and count it; returns False if it already existed (or there is no such idea)"""
+    # The edge and the count are written in one transaction: the edge only if
+    # this employee doesn't support the idea yet, the count only if the idea
+    # exists, so repeated or concurrent clicks never count twice
+    try:
+        dynamodb.meta.client.transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': IDEA_SUPPORTERS_TABLE,
+                    'Item': {'idea_id': idea_id, 'employee_name': employee_name, 'timestamp': timestamp},
+                    'ConditionExpression': "attribute_not_exists(idea_id)"
+                }
+            },
+            {
+                'Update': {
+                    'TableName': IDEAS_TABLE,
+                    'Key': {'id': idea_id},
+                    'UpdateExpression': "ADD supporter_count :one",
+                    'ConditionExpression': "attribute_exists(id)",
+                    'ExpressionAttributeValues': {':one': 1}
+                }
+            }
+        ])
+        return True
+    except dynamodb.meta.client.exceptions.TransactionCanceledException:
+        return False
 
 def support_idea(dynamodb, idea_id, employee_name):
-    """Add support for an idea/initiative"""
-    table = dynamodb.Table(IDEAS_TABLE)
-    
-    # Get current idea details
-    response = table.get_item(Key={'id': idea_id})
-    current_idea = response.get('Item', {})
+    """Add support for an idea/initiative and return its supporter count"""
+    timestamp = int(time.time())
+    supported = add_idea_supporter(dynamodb, idea_id, employee_name, timestamp)
     
-    # Get current supporters list
-    current_supporters = current_idea.get('supporters', [])
+    idea = dynamodb.Table(IDEAS_TABLE).get_item(
+        Key={'id': idea_id},
+        ProjectionExpression="department, supporter_count"
+    ).get('Item', {})
     
-    # Add employee if not already supporting
-    if employee_name not in current_supporters:
-        current_supporters.append(employee_name)
-        
-        # Update supporters list
-        table.update_item(
-            Key={'id': idea_id},
-            UpdateExpression="set supporters = :s",
-            ExpressionAttributeValues={':s': current_supporters}
-        )
+    if supported:
+        record_idea_support(dynamodb, idea_id)
+        record_contributor(dynamodb, employee_name, idea.get('department'), timestamp)
+        bump_data_version()
     
-    return current_supporters
+    return int(idea.get('supporter_count', 0))
 
-# Dashboard Analytics Functions
-def get_knowledge_stats(dynamodb):
-    """Get knowledge sharing statistics for dashboard"""
-    knowledge_items = get_knowledge(dynamodb)
-    
-    # Calculate stats
-    total_items = len(knowledge_items)
-    
-    # Count by department
-    departments = {}
-    for item in knowledge_items:
-        dept = item.get('department', 'Unknown')
-        if dept in departments:
-            departments[dept] += 1
-        else:
-            departments[dept] = 1
-    
-    # Count by time period
-    now = datetime.utcnow()
-    today_count = 0
-    week_count = 0
-    month_count = 0
-    
-    for item in knowledge_items:
-        timestamp = item.get('timestamp', 0)
-        item_dt = datetime.fromtimestamp(timestamp)
-        
-        if (now - item_dt).days < 1:
-            today_count += 1
-        
-        if (now - item_dt).days < 7:
-            week_count += 1
-            
-        if (now - item_dt).days < 30:
-            month_count += 1
-    
-    return {
-        'total': total_items,
-        'by_department': departments,
-        'today': today_count,
-        'week': week_count,
-        'month': month_count
+def get_idea_supporters(dynamodb, idea_id, limit=None):
+    """Names of the employees supporting an idea, optionally only the first `limit`"""
+    table = dynamodb.Table(IDEA_SUPPORTERS_TABLE)
+    
+    query_kwargs = {'KeyConditionExpression': Key('idea_id').eq(idea_id)}
+    if limit:
+        query_kwargs['Limit'] = limit
+    names = []
+    while True:
+        response = table.query(**query_kwargs)
+        names += [edge['employee_name'] for edge in response.get('Items', [])]
+        if not response.get('LastEvaluatedKey') or (limit and len(names) >= limit):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return names[:limit] if limit else names
+
+def get_supported_idea_ids(dynamodb, employee_name):
+    """Ids of the ideas an employee supports, most recently supported first"""
+    table = dynamodb.Table(IDEA_SUPPORTERS_TABLE)
+    
+    query_kwargs = {
+        'IndexName': SUPPORTERS_BY_EMPLOYEE_INDEX,
+        'KeyConditionExpression': Key('employee_name').eq(employee_name),
+        'ScanIndexForward': False
     }
+    idea_ids = []
+    while True:
+        response = table.query(**query_kwargs)
+        idea_ids += [edge['idea_id'] for edge in response.get('Items', [])]
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    return idea_ids
 
-def get_ideas_stats(dynamodb):
-    """Get ideas/initiatives statistics for dashboard"""
-    ideas = get_ideas(dynamodb)
-    
-    # Calculate stats
-    total_ideas = len(ideas)
-    
-    # Count by status
-    status_counts = {
-        'proposed': 0,
-        'in_progress': 0,
-        'completed': 0,
-        'rejected': 0
+def get_supported_ideas(dynamodb, employee_name):
+    """The ideas an employee supports, most recently supported first"""
+    return get_ideas_items(dynamodb, get_supported_idea_ids(dynamodb, employee_name))
+
+# Dashboard Analytics Functions
+def scan_projection(dynamodb, table_name, attributes):
+    """Scan a whole table reading only the given attributes"""
+    table = dynamodb.Table(table_name)
+    
+    # Names are aliased since several (timestamp, status...) are reserved words
+    names = {f"#a{i}": attribute for i, attribute in enumerate(attributes)}
+    scan_kwargs = {
+        'ProjectionExpression': ", ".join(names),
+        'ExpressionAttributeNames': names
     }
     
-    # Count by department
-    departments = {}
-    
-    # Calculate average supporters
-    total_supporters = 0
+    items = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        items += response.get('Items', [])
+        if not response.get('LastEvaluatedKey'):
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
     
-    for idea in ideas:
-        status = idea.get('status', 'proposed')
-        if status in status_counts:
-            status_counts[status] += 1
-        
-        dept = idea.get('department', 'Unknown')
-        if dept in departments:
-            departments[dept] += 1
-        else:
-            departments[dept] = 1
-        
-        supporters = idea.get('supporters', [])
-        total_supporters += len(supporters)
-    
-    avg_supporters = total_supporters / total_ideas if total_ideas > 0 else 0
-    
-    return {
-        'total': total_ideas,
-        'by_status': status_counts,
-        'by_department': departments,
-        'avg_supporters': avg_supporters
-    }
+    return items
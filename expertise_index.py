@@ -0,0 +1,330 @@
+"""
+Expertise profiles: which employees and departments know about what
+
+Each saved knowledge item adds its key terms (highest TF-IDF stems) and tags
+to the profile of its employee and of its department. Profiles live in the
+stats table (pk "expertise", one row per profile) and are updated with
+atomic ADD expressions, so "who knows about X" is a top-k over a few hundred
+profiles instead of a scan over every document.
+
+Profiles of knowledge saved before this index existed are built with:
+
+    python expertise_index.py rebuild
+"""
+import argparse
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+
+from arabic_analyzer import analyze, analyze_query
+from shared_index import SharedIndex
+
+EXPERTISE_PK = "expertise"
+
+# Key terms of an item added to its profiles
+TERMS_PER_ITEM = 20
+
+# A profile keeps only this many terms and tags, keeping rows far below
+# DynamoDB's 400 KB item limit
+MAX_PROFILE_TERMS = 5000
+MAX_PROFILE_TAGS = 1000
+
+# A write that takes a profile over a cap removes its least used entries down
+# to this share of the cap, so pruning runs once per many items, not per write
+PRUNE_RATIO = 0.9
+
+# Map entries removed per update, keeping the expression far below DynamoDB's 4 KB limit
+REMOVE_BATCH = 100
+
+# The in-memory profiles are reloaded in the background after this many seconds
+# so items saved by other app processes are eventually picked up
+INDEX_MAX_AGE = 600
+
+def profile_key(kind, name):
+    return f"{kind}#{name}"
+
+class ExpertiseIndex:
+    """In-memory copy of the expertise profiles with a term -> profiles lookup"""
+    
+    def __init__(self):
+        self.profiles = {}  # (kind, name) -> {'items', 'terms', 'tags', 'department'}
+        self.postings = defaultdict(set)  # (kind, term) -> profile names
+        self._lock = threading.Lock()
+    
+    def add(self, kind, name, terms, tags=(), items=1, department=None):
+        """Add one item's terms and tags (or a whole stored profile) to a profile"""
+        with self._lock:
+            profile = self.profiles.setdefault((kind, name), {
+                'items': 0, 'terms': Counter(), 'tags': Counter(), 'department': None
+            })
+            profile['items'] += items
+            profile['terms'].update(terms)
+            profile['tags'].update(tags)
+            if department:
+                profile['department'] = department
+            for term in terms:
+                self.postings[(kind, term)].add(name)
+    
+    def remove(self, kind, name, terms, tags=()):
+        """Drop terms and tags pruned from a stored profile"""
+        with self._lock:
+            profile = self.profiles.get((kind, name))
+            if profile is None:
+                return
+            for term in terms:
+                profile['terms'].pop(term, None)
+                names = self.postings.get((kind, term))
+                if names is not None:
+                    names.discard(name)
+                    if not names:
+                        del self.postings[(kind, term)]
+            for tag in tags:
+                profile['tags'].pop(tag, None)
+
+    def top_k(self, query_terms, kind="employee", k=5):
+        """
+        Best profiles of one kind for the analyzed query terms
+        
+        Each matching term contributes log(1 + count) * idf, where idf is
+        computed over profiles, so a term every employee uses counts little.
+        """
+        with self._lock:
+            total = sum(1 for profile_kind, _ in self.profiles if profile_kind == kind)
+            scores = Counter()
+            for term in set(query_terms):
+                names = self.postings.get((kind, term), ())
+                if not names:
+                    continue
+                idf = math.log(1 + total / len(names))
+                for name in names:
+                    scores[name] += math.log(1 + self.profiles[(kind, name)]['terms'][term]) * idf
+            
+            best = heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+            return [
+                {
+                    'name': name,
+                    'score': score,
+                    'items': self.profiles[(kind, name)]['items'],
+                    'department': self.profiles[(kind, name)]['department'],
+                    'top_tags': [tag for tag, _ in self.profiles[(kind, name)]['tags'].most_common(5)]
+                }
+                for name, score in best
+            ]
+    
+    def __len__(self):
+        return len(self.profiles)
+
+def item_expertise_terms(dynamodb, item):
+    """Key terms and tags an item adds to its author's and department's profiles"""
+    from search_index import get_knowledge_search_index
+    
+    terms = get_knowledge_search_index(dynamodb).key_terms(item['id'], TERMS_PER_ITEM)
+    tags = item.get('tags') or []
+    if not terms:
+        return text_expertise_terms(item.get('content', ''), tags), tags
+    
+    # Tag words are matched like content terms
+    terms = list(dict.fromkeys(terms + [term for tag in tags for term in analyze(tag)]))
+    return terms, tags
+
+def text_expertise_terms(text, tags=()):
+    """Most frequent terms of a text, plus the words of its tags"""
+    terms = [term for term, _ in Counter(analyze(text)).most_common(TERMS_PER_ITEM)] if text else []
+    return list(dict.fromkeys(terms + [term for tag in tags for term in analyze(tag)]))
+
+def item_profiles(item):
+    """(kind, name) of the profiles an item counts towards"""
+    return [
+        ("employee", item.get('employee_name') or 'Anonymous'),
+        ("department", item.get('department') or 'Unknown')
+    ]
+
+def prune_profile(table, key, row):
+    """Remove the least used terms and tags of a stored profile over its caps; returns the removed (terms, tags)"""
+    removed = []
+    for attribute, cap in [('terms', MAX_PROFILE_TERMS), ('tags', MAX_PROFILE_TAGS)]:
+        counts = row.get(attribute) or {}
+        if len(counts) <= cap:
+            removed.append([])
+            continue
+        drop = heapq.nsmallest(len(counts) - int(cap * PRUNE_RATIO), counts, key=counts.get)
+        for start in range(0, len(drop), REMOVE_BATCH):
+            batch = drop[start:start + REMOVE_BATCH]
+            names = {'#map': attribute}
+            names.update({f'#r{i}': entry for i, entry in enumerate(batch)})
+            table.update_item(
+                Key=key,
+                UpdateExpression="REMOVE " + ", ".join(f"#map.#r{i}" for i in range(len(batch))),
+                ExpressionAttributeNames=names
+            )
+        removed.append(drop)
+    return removed[0], removed[1]
+
+def record_knowledge_expertise(dynamodb, item, added_text=None, added_tags=None):
+    """
+    Add a saved item to the stored profiles of its employee and department
+    
+    For an item that is already counted, added_text (appended to it) and
+    added_tags (gained on re-enrichment) are added instead of the whole item.
+    """
+    from database import STATS_TABLE
+    
+    try:
+        if added_text is None and added_tags is None:
+            terms, tags = item_expertise_terms(dynamodb, item)
+            items = 1
+        else:
+            tags = list(added_tags or [])
+            terms = text_expertise_terms(added_text or '', tags)
+            items = 0
+        table = dynamodb.Table(STATS_TABLE)
+        pruned = []
+        
+        for kind, name in item_profiles(item):
+            key = {'pk': EXPERTISE_PK, 'sk': profile_key(kind, name)}
+            
+            # Nested ADDs need the maps to exist, so they are created first
+            table.update_item(
+                Key=key,
+                UpdateExpression=(
+                    "SET #terms = if_not_exists(#terms, :empty), #tags = if_not_exists(#tags, :empty), "
+                    "#kind = :kind, #name = :name, #department = :department ADD #items :items"
+                ),
+                ExpressionAttributeNames={
+                    '#terms': 'terms', '#tags': 'tags', '#kind': 'kind', '#name': 'name',
+                    '#department': 'department', '#items': 'items'
+                },
+                ExpressionAttributeValues={
+                    ':empty': {}, ':kind': kind, ':name': name,
+                    ':department': item.get('department') or 'Unknown', ':items': items
+                }
+            )
+            
+            # DynamoDB rejects unused names, so each map is named only when it is added to
+            names = {}
+            additions = []
+            for i, term in enumerate(terms):
+                names['#terms'] = 'terms'
+                names[f'#t{i}'] = term
+                additions.append(f"#terms.#t{i} :one")
+            for i, tag in enumerate(tags):
+                names['#tags'] = 'tags'
+                names[f'#g{i}'] = tag
+                additions.append(f"#tags.#g{i} :one")
+            if additions:
+                # The whole profile is returned so its size can be checked without another read
+                response = table.update_item(
+                    Key=key,
+                    UpdateExpression="ADD " + ", ".join(additions),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues={':one': 1},
+                    ReturnValues="ALL_NEW"
+                )
+                removed_terms, removed_tags = prune_profile(table, key, response.get('Attributes', {}))
+                if removed_terms or removed_tags:
+                    pruned.append((kind, name, removed_terms, removed_tags))
+        
+        index_knowledge_expertise(item, terms, tags, items)
+        for kind, name, removed_terms, removed_tags in pruned:
+            _expertise_index.apply(lambda index, kind=kind, name=name, terms=removed_terms, tags=removed_tags:
+                                   index.remove(kind, name, terms, tags))
+    
+    except Exception as e:
+        print(f"Error updating expertise profiles: {str(e)}")
+
+def load_profiles(dynamodb):
+    """Stored expertise profiles, read page by page"""
+    from boto3.dynamodb.conditions import Key
+    from database import STATS_TABLE
+    
+    table = dynamodb.Table(STATS_TABLE)
+    query_kwargs = {'KeyConditionExpression': Key('pk').eq(EXPERTISE_PK)}
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def load_expertise_index(dynamodb):
+    """Load the stored profiles into a new in-memory index"""
+    index = ExpertiseIndex()
+    for row in load_profiles(dynamodb):
+        index.add(
+            row['kind'], row['name'],
+            {term: int(count) for term, count in (row.get('terms') or {}).items()},
+            {tag: int(count) for tag, count in (row.get('tags') or {}).items()},
+            items=int(row.get('items', 0)),
+            department=row.get('department')
+        )
+    return index
+
+_expertise_index = SharedIndex(load_expertise_index, INDEX_MAX_AGE)
+
+def get_expertise_index(dynamodb):
+    """Return the shared expertise index, loading the stored profiles on first use and reloading them when too old"""
+    return _expertise_index.get(dynamodb)
+
+def index_knowledge_expertise(item, terms, tags, items=1):
+    """Add a saved item to the shared index if it has been loaded"""
+    def add(index):
+        for kind, name in item_profiles(item):
+            index.add(kind, name, terms, tags, items=items, department=item.get('department'))
+    
+    # Not replayed on a reload: the stored profiles were updated first, so the
+    # reload almost always reads them and replaying would count the item twice
+    _expertise_index.apply(add, replay=False)
+
+def find_experts(dynamodb, query, kind="employee", limit=5):
+    """Employees (or departments) whose knowledge best covers the query"""
+    return get_expertise_index(dynamodb).top_k(analyze_query(query), kind, limit)
+
+def rebuild_expertise_profiles(dynamodb):
+    """Recompute every profile from the saved knowledge and overwrite the stored rows"""
+    from database import STATS_TABLE
+    from search_index import get_knowledge_search_index
+    
+    index = ExpertiseIndex()
+    for item in list(get_knowledge_search_index(dynamodb).items.values()):
+        terms, tags = item_expertise_terms(dynamodb, item)
+        for kind, name in item_profiles(item):
+            index.add(kind, name, terms, tags, department=item.get('department'))
+    
+    table = dynamodb.Table(STATS_TABLE)
+    stale = {row['sk'] for row in load_profiles(dynamodb)}
+    with table.batch_writer() as batch:
+        for (kind, name), profile in index.profiles.items():
+            sk = profile_key(kind, name)
+            stale.discard(sk)
+            batch.put_item(Item={
+                'pk': EXPERTISE_PK,
+                'sk': sk,
+                'kind': kind,
+                'name': name,
+                'department': profile['department'] or 'Unknown',
+                'items': profile['items'],
+                'terms': dict(profile['terms'].most_common(MAX_PROFILE_TERMS)),
+                'tags': dict(profile['tags'].most_common(MAX_PROFILE_TAGS))
+            })
+        for sk in stale:
+            batch.delete_item(Key={'pk': EXPERTISE_PK, 'sk': sk})
+    
+    _expertise_index.replace(index)
+    print(f"Rebuilt {len(index)} expertise profiles")
+    return len(index)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain employee and department expertise profiles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recompute every profile from the saved knowledge")
+    args = parser.parse_args(argv)
+    
+    from database import initialize_db
+    
+    dynamodb = initialize_db()
+    if args.command == "rebuild":
+        rebuild_expertise_profiles(dynamodb)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# Size of the fake embedding vectors (real models use 1536 or more)
+FAKE_EMBEDDING_DIMENSIONS = 256
+
+class FakeLLMError(Exception):
+    """Raised by the fake client to simulate an API failure"""
+
+def fake_embedding(text, dimensions=FAKE_EMBEDDING_DIMENSIONS):
+    """
+    Deterministic embedding built by hashing words and character trigrams
+    
+    Texts sharing words or word fragments get a high cosine similarity, which is
+    enough to exercise vector retrieval without a real model.
+    """
+    vector = [0.0] * dimensions
+    words = re.findall(r"\w+", text.lower())
+    features = words + [word[i:i + 3] for word in words for i in range(len(word) - 2)]
+    
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest(), "big")
+        vector[h % dimensions] += 1.0 if h & 0x80000000 else -1.0
+    
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+def fake_completion_content(messages, response_format=None):
+    """Produce a deterministic response body for a chat completion request"""
+    system_prompt = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user_messages = [m["content"] for m in messages if m["role"] == "user"]
+    user_prompt = user_messages[-1] if user_messages else ""
+    
+    if response_format and response_format.get("type") == "json_object":
+        # Semantic search / rerank prompts list items as "ID: <id>"
+        if "IDs" in system_prompt or "ids" in system_prompt:
+            ids = re.findall(r"ID: (\S+)", user_prompt)
+            return json.dumps({"ids": ids[:5]})
+        
+        # Everything else that asks for JSON is tag extraction
+        words = [w for w in re.findall(r"\w+", user_prompt.lower()) if len(w) > 3]
+        tags = [word for word, _ in Counter(words).most_common(4)] or ["معلومات عامة"]
+        return json.dumps({"tags": tags})
+    
+    if "follow-up" in user_prompt or "Original contribution" in user_prompt:
+        # Question/answer integration: keep every answer in the final document
+        return f"# معرفة مدمجة\n\n{user_prompt.split(':', 1)[-1].strip()}"
+    
+    if user_prompt.startswith("Please process and enhance"):
+        text = user_prompt.split("\n\n", 1)[-1].strip()
+        title = text.split("\n")[0].split(".")[0][:50]
+        return f"## {title}\n\n{text}"
+    
+    # Smart question generation
+    return "هل يمكنك مشاركة المزيد من التفاصيل حول هذا الموضوع؟"
+
+class FakeOpenAIClient:
+    """
+    Drop-in replacement for the OpenAI client that never touches the network
+    
+    Only the parts of the API used by openai_service are implemented. Latency,
+    jitter and failure rate are configurable so the rest of the pipeline can be
+    exercised under realistic conditions.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self._create_chat_completion)
+        )
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+    
+    def _simulate_network(self):
+        """Sleep for the configured latency and randomly fail"""
+        self.calls += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            raise FakeLLMError("Simulated OpenAI API failure")
+    
+    def _create_chat_completion(self, model=None, messages=None, response_format=None, **kwargs):
+        self._simulate_network()
+        
+        content = fake_completion_content(messages or [], response_format)
+        message = SimpleNamespace(role="assistant", content=content)
+        
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")]
+        )
+
+    def _create_embedding(self, model=None, input=None, **kwargs):
+        self._simulate_network()
+        
+        texts = [input] if isinstance(input, str) else list(input or [])
+        return SimpleNamespace(
+            model=model,
+            data=[SimpleNamespace(index=i, embedding=fake_embedding(text)) for i, text in enumerate(texts)]
+        )
+
+class _ChatCompletionHandler(BaseHTTPRequestHandler):
+    """Serve POST /v1/chat/completions and /v1/embeddings with OpenAI-compatible JSON"""
+    
+    def do_POST(self):
+        server = self.server
+        path = self.path.rstrip("/")
+        if not path.endswith("/chat/completions") and not path.endswith("/embeddings"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        
+        if server.random.random() < server.failure_rate:
+            self._send_json(500, {"error": {"message": "Simulated OpenAI API failure", "type": "server_error"}})
+            return
+        
+        if path.endswith("/embeddings"):
+            texts = request.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            self._send_json(200, {
+                "object": "list",
+                "model": request.get("model", "fake"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                    for i, text in enumerate(texts)
+                ],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            })
+            return
+        
+        content = fake_completion_content(request.get("messages", []), request.get("response_format"))
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+    
+    def _send_json(self, status, body):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Local OpenAI-compatible HTTP stub
+    
+    Point the real OpenAI client at it with base_url (or the OPENAI_BASE_URL
+    environment variable) to exercise the full HTTP path without the network.
+    """
+    daemon_threads = True
+    
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        super().__init__((host, port), _ChatCompletionHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible fake LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Base seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random seconds (uniform 0..jitter)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    args = parser.parse_args(argv)
+    
+    server = FakeLLMServer(args.host, args.port, args.latency, args.jitter, args.failure_rate)
+    print(f"Fake LLM listening on {server.base_url} (set OPENAI_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
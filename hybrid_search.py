@@ -0,0 +1,171 @@
+import os
+import time
+
+from database import (
+    search_knowledge,
+    with_best_passage,
+    get_knowledge_items,
+    knowledge_filter_ids,
+    get_knowledge_generation
+)
+from arabic_analyzer import analyze_query
+from chunker import item_passages
+from query_parser import parse_query
+from openai_service import embed_texts, rerank_knowledge
+from query_cache import QueryCache
+from search_index import get_knowledge_search_index
+from vector_index import get_knowledge_vector_index
+
+# Candidates taken from each retriever before fusion
+LEXICAL_TOP_K = 20
+VECTOR_TOP_K = 20
+
+# Vector hits below this cosine similarity are treated as unrelated
+MIN_VECTOR_SIMILARITY = 0.35
+
+# Reciprocal rank fusion constant (the usual value from the RRF paper)
+RRF_K = 60
+
+# Number of fused candidates sent to the LLM for reranking
+RERANK_TOP_K = 15
+
+# LLM reranking costs a gpt-4o call per uncached search, so it is opt-in:
+# set HYBRID_SEARCH_RERANK=true (or pass rerank=True) to enable it
+
+# Per-stage latency budgets in seconds. "embed" and "rerank" are request
+# timeouts; rerank is skipped when less than its budget is left of "total".
+# Override with HYBRID_SEARCH_BUDGETS="embed=1.5,rerank=3,total=5".
+DEFAULT_BUDGETS = {"embed": 2.0, "rerank": 4.0, "total": 8.0}
+
+_query_embedding_cache = QueryCache(max_size=512, ttl=3600)
+_hybrid_cache = QueryCache(max_size=256, ttl=300)
+
+def configured_budgets():
+    """Stage budgets from the environment, falling back to DEFAULT_BUDGETS"""
+    budgets = dict(DEFAULT_BUDGETS)
+    for entry in os.getenv("HYBRID_SEARCH_BUDGETS", "").split(","):
+        stage, _, value = entry.partition("=")
+        if stage.strip() and value.strip():
+            budgets[stage.strip()] = float(value)
+    return budgets
+
+def rerank_enabled():
+    return os.getenv("HYBRID_SEARCH_RERANK", "false").lower() in ("1", "true", "yes")
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several ranked id lists; ids ranked high by any list come first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def query_embedding(client, query, timeout):
+    """Embedding of a search query, cached since the same queries repeat often"""
+    key = " ".join(analyze_query(query))
+    embedding = _query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = embed_texts(client, [query], timeout=timeout)[0]
+        _query_embedding_cache.put(key, embedding)
+    return embedding
+
+def hybrid_search(dynamodb, client, query, tag=None, rerank=None, budgets=None, timings=None):
+    """
+    Search knowledge with lexical and vector retrieval, fused and optionally reranked
+    
+    Lexical top-k (the trigram search index) and vector top-k (stored embeddings)
+    are fused with reciprocal rank fusion, and only the best few candidates are
+    sent to the LLM for reranking (when enabled), so prompt size and latency no
+    longer grow with the corpus.
+    
+    Each stage degrades gracefully: without embeddings or when the embedding call
+    fails the lexical ranking is used alone, and a failed or skipped rerank keeps
+    the fused order. Such degraded results are not cached, so the next identical
+    query tries the full pipeline again. Pass a dict as timings to receive
+    per-stage milliseconds.
+    
+    Field filters of the query apply to both retrievers. Queries with quoted
+    phrases or with filters only are answered by the lexical stage alone.
+    """
+    budgets = {**configured_budgets(), **(budgets or {})}
+    rerank = rerank_enabled() if rerank is None else rerank
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    degraded = False
+    
+    def mark(stage, stage_start):
+        timings[stage] = (time.perf_counter() - stage_start) * 1000
+    
+    parsed = parse_query(query, tag)
+    cache_key = (parsed.cache_key(), rerank, get_knowledge_generation())
+    cached = _hybrid_cache.get(cache_key)
+    if cached is not None:
+        mark("cache", start)
+        return list(cached)
+    
+    # Stage 1: lexical top-k from the trigram index
+    stage_start = time.perf_counter()
+    lexical = search_knowledge(dynamodb, query, tag=tag)[:LEXICAL_TOP_K]
+    mark("lexical", stage_start)
+    
+    # Stage 2: vector top-k against stored embeddings
+    stage_start = time.perf_counter()
+    vector_passages = {}  # item id -> best passage number, in similarity order
+    vector_index = get_knowledge_vector_index(dynamodb)
+    if len(vector_index) and parsed.words and not parsed.phrases:
+        try:
+            embedding = query_embedding(client, parsed.text, budgets.get("embed"))
+            allowed_ids = knowledge_filter_ids(dynamodb, parsed) if parsed.has_filters else None
+            # Several passages of one item may match; the first is its best
+            for (item_id, number), _ in vector_index.top_k(embedding, VECTOR_TOP_K, MIN_VECTOR_SIMILARITY, allowed_ids):
+                vector_passages.setdefault(item_id, number)
+        except Exception as e:
+            print(f"Vector retrieval skipped: {str(e)}")
+            degraded = True
+    mark("vector", stage_start)
+    
+    # Stage 3: reciprocal rank fusion
+    stage_start = time.perf_counter()
+    items = {item['id']: item for item in lexical}
+    fused_ids = reciprocal_rank_fusion([[item['id'] for item in lexical], list(vector_passages)])
+    
+    # Vector-only hits are taken from the in-memory search index when possible
+    missing = [item_id for item_id in fused_ids if item_id not in items]
+    if missing:
+        indexed = get_knowledge_search_index(dynamodb).items
+        for item_id in missing:
+            if item_id in indexed:
+                items[item_id] = indexed[item_id]
+        still_missing = [item_id for item_id in missing if item_id not in items]
+        if still_missing:
+            items.update((item['id'], item) for item in get_knowledge_items(dynamodb, still_missing))
+        
+        # Vector-only hits show the passage whose embedding matched
+        for item_id in missing:
+            if item_id in items:
+                passages = item_passages(items[item_id])
+                number = min(vector_passages[item_id], len(passages) - 1)
+                items[item_id] = with_best_passage(items[item_id], passages[number])
+    
+    results = [items[item_id] for item_id in fused_ids if item_id in items]
+    mark("fusion", stage_start)
+    
+    # Stage 4: optional LLM rerank of the top candidates only
+    if rerank and parsed.text and len(results) > 1:
+        remaining = budgets.get("total", float("inf")) - (time.perf_counter() - start)
+        if remaining >= budgets.get("rerank", 0):
+            stage_start = time.perf_counter()
+            try:
+                head = rerank_knowledge(client, parsed.text, results[:RERANK_TOP_K], timeout=budgets.get("rerank"))
+                results = head + results[RERANK_TOP_K:]
+            except Exception as e:
+                print(f"Rerank skipped: {str(e)}")
+                degraded = True
+            mark("rerank", stage_start)
+        else:
+            degraded = True
+    
+    mark("total", start)
+    if not degraded:
+        _hybrid_cache.put(cache_key, tuple(results))
+    return results
@@ -1,160 +1,353 @@
-from datetime import datetime
+from datetime import date, datetime
+import threading
+import time
+
+import numpy as np
 import pandas as pd
 
+# Attributes the dashboard needs; content, embeddings and the like are not read
+KNOWLEDGE_FIELDS = ["id", "department", "employee_name", "timestamp"]
+IDEA_FIELDS = ["id", "title", "department", "status", "timestamp", "supporter_count"]
+
+IDEA_STATUSES = ["proposed", "in_progress", "completed", "rejected"]
+
+# Cached dashboard figures are refreshed after this many seconds even without a
+# local write, since other processes may write to the same tables
+DASHBOARD_MAX_AGE = 300
+
+# UTC offsets are whole multiples of 15 minutes, so every timestamp in a
+# 15-minute bucket falls on the same local date
+LOCAL_DATE_BUCKET = 900
+
+def timestamp_array(items):
+    """The items' timestamps as an int64 array"""
+    return np.fromiter((int(item.get('timestamp', 0)) for item in items), dtype=np.int64, count=len(items))
+
+def local_day_numbers(timestamps):
+    """Local calendar day (proleptic ordinal) of each timestamp, like datetime.fromtimestamp(ts).date()"""
+    if not len(timestamps):
+        return np.zeros(0, dtype=np.int64)
+    buckets, inverse = np.unique(timestamps // LOCAL_DATE_BUCKET, return_inverse=True)
+    # One datetime conversion per distinct bucket instead of per item
+    ordinals = np.fromiter(
+        (datetime.fromtimestamp(int(bucket) * LOCAL_DATE_BUCKET).toordinal() for bucket in buckets),
+        dtype=np.int64, count=len(buckets)
+    )
+    return ordinals[inverse.reshape(-1)]
+
+class AnalyticsSnapshot:
+    """
+    Knowledge items and ideas loaded once, with every dashboard metric computed from them
+    
+    Each table is scanned once with only the attributes above. The columns are
+    kept as arrays (timestamps as int64, departments and employees as
+    categorical codes) and every count is a vectorized np.bincount or
+    searchsorted, with no per-item Python work after the columns are built.
+    """
+    
+    def __init__(self, knowledge_items, ideas, now=None):
+        self.ideas = ideas
+        self.now = int(time.time() if now is None else now)
+        self.total_knowledge = len(knowledge_items)
+        
+        self.knowledge_timestamps = timestamp_array(knowledge_items)
+        self.idea_timestamps = timestamp_array(ideas)
+        
+        # Departments of both tables share one set of codes
+        departments = [item.get('department', 'Unknown') for item in knowledge_items]
+        departments += [idea.get('department', 'Unknown') for idea in ideas]
+        department_codes, self.departments = pd.factorize(pd.Series(departments, dtype=object))
+        self.knowledge_departments = department_codes[:self.total_knowledge]
+        self.idea_departments = department_codes[self.total_knowledge:]
+            
+        employees = [item.get('employee_name', 'Anonymous') for item in knowledge_items]
+        self.employee_codes, self.employees = pd.factorize(pd.Series(employees, dtype=object))
+            
+        statuses = [idea.get('status', 'proposed') for idea in ideas]
+        self.status_codes, self.statuses = pd.factorize(pd.Series(statuses, dtype=object))
+        self.supporter_counts = np.fromiter((int(idea.get('supporter_count', 0)) for idea in ideas), dtype=np.int64, count=len(ideas))
+    
+    @classmethod
+    def load(cls, dynamodb):
+        """Scan the knowledge and ideas tables once each, reading only the needed attributes"""
+        from database import KNOWLEDGE_TABLE, IDEAS_TABLE, scan_projection
+        
+        return cls(
+            scan_projection(dynamodb, KNOWLEDGE_TABLE, KNOWLEDGE_FIELDS),
+            scan_projection(dynamodb, IDEAS_TABLE, IDEA_FIELDS)
+        )
+    
+    def _counts(self, codes, labels):
+        """{label: count} for categorical codes, in label order"""
+        counts = np.bincount(codes, minlength=len(labels))
+        return {label: int(count) for label, count in zip(labels, counts) if count}
+    
+    def knowledge_stats(self):
+        """Total knowledge items, items per department and items of the last day, week and month"""
+        # Items younger than each window are counted with one binary search each
+        timestamps = np.sort(self.knowledge_timestamps)
+        def younger_than(seconds):
+            return int(len(timestamps) - np.searchsorted(timestamps, self.now - seconds, side='right'))
+        
+        return {
+            'total': self.total_knowledge,
+            'by_department': self._counts(self.knowledge_departments, self.departments),
+            'today': younger_than(86400),
+            'week': younger_than(7 * 86400),
+            'month': younger_than(30 * 86400)
+        }
+    
+    def ideas_stats(self):
+        """Total ideas, ideas per status and department, and average supporters per idea"""
+        total_ideas = len(self.ideas)
+        by_status = self._counts(self.status_codes, self.statuses)
+        return {
+            'total': total_ideas,
+            'by_status': {status: by_status.get(status, 0) for status in IDEA_STATUSES},
+            'by_department': self._counts(self.idea_departments, self.departments),
+            'avg_supporters': float(self.supporter_counts.sum()) / total_ideas if total_ideas > 0 else 0
+        }
+    
+    def department_activity(self):
+        size = len(self.departments)
+        knowledge_counts = np.bincount(self.knowledge_departments, minlength=size)
+        idea_counts = np.bincount(self.idea_departments, minlength=size)
+        
+        # Latest timestamp per department over both tables
+        last_activity = np.zeros(size, dtype=np.int64)
+        np.maximum.at(last_activity, self.knowledge_departments, self.knowledge_timestamps)
+        np.maximum.at(last_activity, self.idea_departments, self.idea_timestamps)
+        
+        departments = {}
+        for code, dept in enumerate(self.departments):
+            departments[dept] = {
+                'knowledge_count': int(knowledge_counts[code]),
+                'ideas_count': int(idea_counts[code]),
+                # Convert timestamps to datetime for display
+                'last_activity': datetime.fromtimestamp(int(last_activity[code])).strftime('%Y-%m-%d %H:%M:%S') if last_activity[code] else None
+            }
+        return departments
+    
+    def activity_over_time(self, department=None, days=None):
+        knowledge_days = local_day_numbers(self.knowledge_timestamps)
+        idea_days = local_day_numbers(self.idea_timestamps)
+        if department:
+            # -1 matches no item when the department has none
+            code = self.departments.get_loc(department) if department in self.departments else -1
+            knowledge_days = knowledge_days[self.knowledge_departments == code]
+            idea_days = idea_days[self.idea_departments == code]
+        if days:
+            since = date.fromtimestamp(self.now).toordinal() - days + 1
+            knowledge_days = knowledge_days[knowledge_days >= since]
+            idea_days = idea_days[idea_days >= since]
+        all_days = np.concatenate([knowledge_days, idea_days])
+        if not len(all_days):
+            return {'dates': [], 'knowledge': [], 'ideas': []}
+        
+        # Daily counts over the whole range, then only the days with activity
+        first = all_days.min()
+        size = int(all_days.max() - first + 1)
+        knowledge_counts = np.bincount(knowledge_days - first, minlength=size)
+        idea_counts = np.bincount(idea_days - first, minlength=size)
+        active = np.flatnonzero(knowledge_counts + idea_counts)
+        
+        return {
+            'dates': [date.fromordinal(int(first + day)).strftime('%Y-%m-%d') for day in active],
+            'knowledge': knowledge_counts[active].tolist(),
+            'ideas': idea_counts[active].tolist()
+        }
+    
+    def top_contributors(self, limit=10):
+        counts = np.bincount(self.employee_codes, minlength=len(self.employees))
+        # Stable sort keeps first-seen order among equal counts
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return [(self.employees[code], int(counts[code])) for code in order]
+    
+    def popular_ideas(self, limit=5):
+        order = np.argsort(-self.supporter_counts, kind='stable')[:limit]
+        return [self.ideas[i] for i in order]
+
 class KnowledgeManager:
     """Class to manage knowledge operations and analytics"""
     
     def __init__(self, dynamodb):
         """Initialize with database connection"""
         self.db = dynamodb
+        self._snapshot = None
+    
+    def snapshot(self):
+        """Analytics data shared by every report of this manager, loaded on first use"""
+        # The dashboard creates one manager per render, so each render loads the tables once
+        if self._snapshot is None:
+            self._snapshot = AnalyticsSnapshot.load(self.db)
+        return self._snapshot
+    
+    def get_knowledge_stats(self):
+        """Knowledge totals by department and time period"""
+        return self.snapshot().knowledge_stats()
+    
+    def get_ideas_stats(self):
+        """Idea totals by status and department"""
+        return self.snapshot().ideas_stats()
     
     def get_department_activity(self):
         """Generate department activity report"""
-        from database import get_knowledge, get_ideas
-        
-        # Get all knowledge items
-        knowledge_items = get_knowledge(self.db)
-        
-        # Get all ideas
-        ideas = get_ideas(self.db)
-        
-        # Aggregate by department
-        departments = {}
-        
-        # Process knowledge contributions
-        for item in knowledge_items:
-            dept = item.get('department', 'Unknown')
-            if dept not in departments:
-                departments[dept] = {
-                    'knowledge_count': 0,
-                    'ideas_count': 0,
-                    'last_activity': None
-                }
-            
-            departments[dept]['knowledge_count'] += 1
-            
-            # Track last activity
-            timestamp = item.get('timestamp', 0)
-            if not departments[dept]['last_activity'] or timestamp > departments[dept]['last_activity']:
-                departments[dept]['last_activity'] = timestamp
-        
-        # Process ideas
-        for idea in ideas:
-            dept = idea.get('department', 'Unknown')
-            if dept not in departments:
-                departments[dept] = {
-                    'knowledge_count': 0,
-                    'ideas_count': 0,
-                    'last_activity': None
-                }
-            
-            departments[dept]['ideas_count'] += 1
-            
-            # Track last activity
-            timestamp = idea.get('timestamp', 0)
-            if not departments[dept]['last_activity'] or timestamp > departments[dept]['last_activity']:
-                departments[dept]['last_activity'] = timestamp
-        
-        # Convert timestamps to datetime for display
-        for dept in departments:
-            if departments[dept]['last_activity']:
-                departments[dept]['last_activity'] = datetime.fromtimestamp(
-                    departments[dept]['last_activity']
-                ).strftime('%Y-%m-%d %H:%M:%S')
-        
-        return departments
+        return self.snapshot().department_activity()
     
-    def get_activity_over_time(self):
+    def get_activity_over_time(self, department=None, days=None):
         """Generate activity timeline data for charts"""
-        from database import get_knowledge, get_ideas
-        
-        # Get all items
-        knowledge_items = get_knowledge(self.db)
-        ideas = get_ideas(self.db)
-        
-        # Prepare dataframes
-        k_data = []
-        for item in knowledge_items:
-            timestamp = item.get('timestamp', 0)
-            k_data.append({
-                'date': datetime.fromtimestamp(timestamp).date(),
-                'type': 'knowledge',
-                'department': item.get('department', 'Unknown')
-            })
-        
-        i_data = []
-        for item in ideas:
-            timestamp = item.get('timestamp', 0)
-            i_data.append({
-                'date': datetime.fromtimestamp(timestamp).date(),
-                'type': 'idea',
-                'department': item.get('department', 'Unknown')
-            })
-        
-        # Combine data
-        combined_data = pd.DataFrame(k_data + i_data)
-        
-        # Get activity by date
-        if not combined_data.empty:
-            activity_by_date = combined_data.groupby(['date', 'type']).size().unstack().fillna(0)
-            
-            # Convert to list format for Streamlit charts
-            dates = activity_by_date.index.tolist()
-            knowledge_counts = activity_by_date.get('knowledge', [0] * len(dates)).tolist()
-            idea_counts = activity_by_date.get('idea', [0] * len(dates)).tolist()
-            
-            return {
-                'dates': [d.strftime('%Y-%m-%d') for d in dates],
-                'knowledge': knowledge_counts,
-                'ideas': idea_counts
-            }
-        else:
-            # Return empty data structure
-            return {
-                'dates': [],
-                'knowledge': [],
-                'ideas': []
-            }
+        from activity_rollups import activity_over_time, is_backfilled
+        
+        # Rollups only cover older items once backfilled; until then the
+        # timeline is counted from the items themselves
+        if not is_backfilled(self.db):
+            return self.snapshot().activity_over_time(department, days)
+        # Read from the daily rollups, one row per day and department
+        return activity_over_time(self.db, department, days)
     
     def get_top_contributors(self, limit=10):
         """Get top knowledge contributors"""
-        from database import get_knowledge
-        
-        # Get all knowledge items
-        knowledge_items = get_knowledge(self.db)
-        
-        # Count contributions by employee
-        contributors = {}
-        for item in knowledge_items:
-            employee = item.get('employee_name', 'Anonymous')
-            if employee in contributors:
-                contributors[employee] += 1
-            else:
-                contributors[employee] = 1
-        
-        # Sort by count (descending)
-        sorted_contributors = sorted(
-            contributors.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )
+        from leaderboards import CONTRIBUTORS_PK, is_rebuilt, top_contributors
+        
+        # Counters only cover older items once rebuilt; until then count the items themselves
+        if not is_rebuilt(self.db, CONTRIBUTORS_PK):
+            return self.snapshot().top_contributors(limit)
+        # Maintained on write, so no table is scanned
+        return top_contributors(self.db, limit)
+    
+    def get_active_contributors(self, days=30, department=None):
+        """Estimated distinct employees who contributed in the last `days` days"""
+        from contributor_sketches import active_contributors
+        
+        # Merged from the per-day sketches, one small row per department and day
+        return active_contributors(self.db, days, department)
+    
+    def get_active_contributors_by_department(self, days=30):
+        """Estimated distinct contributors of each department in the last `days` days"""
+        from contributor_sketches import active_contributors_by_department
+        
+        return active_contributors_by_department(self.db, days)
+    
+    def find_experts(self, topic, kind="employee", limit=10):
+        """Find the employees (or departments) who know most about a topic"""
+        from expertise_index import find_experts
         
-        # Return top N
-        return sorted_contributors[:limit]
+        # Answered from the expertise profiles, not by reading documents
+        return find_experts(self.db, topic, kind, limit)
     
     def get_popular_ideas(self, limit=5):
         """Get most popular ideas based on supporter count"""
-        from database import get_ideas
+        from leaderboards import IDEA_SUPPORT_PK, is_rebuilt, popular_ideas
         
-        # Get all ideas
-        ideas = get_ideas(self.db)
+        if not is_rebuilt(self.db, IDEA_SUPPORT_PK):
+            return self.snapshot().popular_ideas(limit)
+        return popular_ideas(self.db, limit)
+    
+    def get_tag_counts(self, limit=None):
+        """Most used tags, from the precomputed counters"""
+        from database import get_tag_counts
         
-        # Sort by number of supporters
-        sorted_ideas = sorted(
-            ideas, 
-            key=lambda x: len(x.get('supporters', [])), 
-            reverse=True
-        )
+        return get_tag_counts(self.db, limit)
+
+class DashboardCache:
+    """
+    KnowledgeManager reports cached per data version, with stale-while-revalidate
+    
+    Every report (method and arguments) is computed once and then served from
+    memory, so Streamlit reruns, tab switches and chart interactions read
+    nothing from the database. When a write bumps database.get_data_version,
+    or the figures are older than max_age, the cached figures are still
+    returned at once while a background thread recomputes every report from
+    one fresh manager and swaps the new figures in together.
+    """
+    
+    CACHED_REPORTS = {
+        "get_knowledge_stats", "get_ideas_stats", "get_department_activity",
+        "get_activity_over_time", "get_top_contributors", "get_popular_ideas", "get_tag_counts",
+        "get_active_contributors", "get_active_contributors_by_department"
+    }
+    
+    def __init__(self, dynamodb, max_age=DASHBOARD_MAX_AGE):
+        from database import get_data_version
         
-        # Return top N
-        return sorted_ideas[:limit]
+        self.db = dynamodb
+        self.max_age = max_age
+        self._manager = KnowledgeManager(dynamodb)
+        self._version = get_data_version()
+        self._loaded_at = time.monotonic()
+        self._results = {}  # (report, args) -> figures
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self.refreshes = 0
+    
+    def is_stale(self):
+        from database import get_data_version
+        
+        return self._version != get_data_version() or time.monotonic() - self._loaded_at > self.max_age
+    
+    def report(self, name, *args, **kwargs):
+        """Figures of one KnowledgeManager report, cached until the data changes"""
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key in self._results:
+                if self.is_stale() and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh, daemon=True).start()
+                return self._results[key]
+            manager = self._manager
+        
+        # First request for this report: computed from the same manager (and
+        # snapshot) as the other cached figures, so one page stays consistent
+        value = getattr(manager, name)(*args, **kwargs)
+        with self._lock:
+            if manager is self._manager:
+                self._results[key] = value
+        return value
+    
+    def _refresh(self):
+        """Recompute every cached report from a fresh manager"""
+        from database import get_data_version
+        
+        try:
+            # Read before loading, so a write during the refresh leaves it stale
+            version = get_data_version()
+            loaded_at = time.monotonic()
+            manager = KnowledgeManager(self.db)
+            with self._lock:
+                keys = list(self._results)
+            results = {(name, args, kwargs): getattr(manager, name)(*args, **dict(kwargs)) for name, args, kwargs in keys}
+            
+            with self._lock:
+                self._manager = manager
+                self._results = results
+                self._version = version
+                self._loaded_at = loaded_at
+                self.refreshes += 1
+        except Exception as e:
+            # The old figures stay in place and the next request retries
+            print(f"Error refreshing dashboard cache: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self.CACHED_REPORTS:
+            return lambda *args, **kwargs: self.report(name, *args, **kwargs)
+        # Other methods (find_experts) already answer from in-memory indexes
+        return getattr(self._manager, name)
+
+_dashboard_cache = None
+_dashboard_cache_lock = threading.Lock()
+
+def get_dashboard_cache(dynamodb):
+    """Return the shared dashboard cache, which lives across Streamlit reruns"""
+    global _dashboard_cache
+    
+    if _dashboard_cache is None:
+        with _dashboard_cache_lock:
+            if _dashboard_cache is None:
+                _dashboard_cache = DashboardCache(dynamodb)
+    
+    return _dashboard_cache
@@ -0,0 +1,214 @@
+"""
+Leaderboards maintained on write: top contributors and most supported ideas
+
+Exact counts live in the stats table (pk "contributor_count" and
+"idea_support_count", one row per employee or idea) and are updated with
+atomic ADDs by save_knowledge and support_idea. Each process keeps a
+Space-Saving sketch of every board, loaded from those rows and updated by
+the same writes, so a leaderboard is read from memory without scanning any
+table. Writes of other processes only reach the counters, so the sketch is
+reloaded, with the rebuild marker, after DASHBOARD_MAX_AGE seconds (at once
+after a rebuild in the same process). The sketch tracks at most LEADERBOARD_CAPACITY members; below that
+its counts are exact, above it only members that could be in the top are
+kept, with bounded overestimates.
+
+Counters of data written before they existed are rebuilt with the command
+below, which also stores a marker row: until it exists the dashboard counts
+the items themselves.
+
+    python leaderboards.py rebuild
+"""
+import argparse
+import heapq
+import threading
+import time
+from collections import Counter
+
+CONTRIBUTORS_PK = "contributor_count"
+IDEA_SUPPORT_PK = "idea_support_count"
+
+# Members tracked per in-memory leaderboard
+LEADERBOARD_CAPACITY = 1000
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch (Metwally et al.) over at most `capacity` keys
+    
+    A new key arriving when the sketch is full replaces the key with the
+    smallest count and inherits that count as its possible overestimate. Any
+    key whose true count exceeds total / capacity is guaranteed to be kept.
+    """
+    
+    def __init__(self, capacity=LEADERBOARD_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # (count, key) with stale entries skipped lazily
+        self._ranking = None  # keys by count, rebuilt on the first read after a write
+        self._lock = threading.Lock()
+    
+    def add(self, key, count=1):
+        with self._lock:
+            if key in self.counts:
+                self.counts[key] += count
+            elif len(self.counts) < self.capacity:
+                self.counts[key] = count
+                self.errors[key] = 0
+            else:
+                evicted, floor = self._pop_min()
+                del self.counts[evicted]
+                del self.errors[evicted]
+                self.counts[key] = floor + count
+                self.errors[key] = floor
+            
+            heapq.heappush(self._heap, (self.counts[key], key))
+            if len(self._heap) > 4 * self.capacity:
+                self._heap = [(c, k) for k, c in self.counts.items()]
+                heapq.heapify(self._heap)
+            self._ranking = None
+    
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return key, count
+    
+    def top(self, k):
+        """The k keys with the highest counts as (key, count), best first"""
+        with self._lock:
+            if self._ranking is None:
+                # Stable sort keeps first-seen order among equal counts
+                self._ranking = sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+            return self._ranking[:k]
+    
+    def __len__(self):
+        return len(self.counts)
+
+def load_counters(dynamodb, pk):
+    """(member, count) rows of one counter family, read page by page"""
+    from boto3.dynamodb.conditions import Key
+    from database import STATS_TABLE
+    
+    table = dynamodb.Table(STATS_TABLE)
+    query_kwargs = {'KeyConditionExpression': Key('pk').eq(pk)}
+    while True:
+        response = table.query(**query_kwargs)
+        for row in response.get('Items', []):
+            yield row['sk'], int(row.get('count', 0))
+        if not response.get('LastEvaluatedKey'):
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+_leaderboards = {}  # pk -> (sketch, rebuild marker time, monotonic load time)
+_leaderboards_lock = threading.Lock()
+
+def load_leaderboard(dynamodb, pk):
+    """(sketch, rebuild marker time) of one counter family, reloading both when older than DASHBOARD_MAX_AGE"""
+    from database import get_backfill_time
+    from knowledge_manager import DASHBOARD_MAX_AGE
+    
+    def is_current(entry):
+        return entry is not None and time.monotonic() - entry[2] <= DASHBOARD_MAX_AGE
+    
+    if not is_current(_leaderboards.get(pk)):
+        with _leaderboards_lock:
+            if not is_current(_leaderboards.get(pk)):
+                loaded_at = time.monotonic()
+                # The marker is read with the counters, not on every dashboard render
+                rebuilt_at = get_backfill_time(dynamodb, pk)
+                board = SpaceSaving()
+                for member, count in load_counters(dynamodb, pk):
+                    if count > 0:
+                        board.add(member, count)
+                _leaderboards[pk] = (board, rebuilt_at, loaded_at)
+    
+    return _leaderboards[pk][:2]
+
+def is_rebuilt(dynamodb, pk):
+    """Whether the counters of a family cover every item, i.e. a rebuild has run"""
+    return load_leaderboard(dynamodb, pk)[1] is not None
+
+def get_leaderboard(dynamodb, pk):
+    """Return the shared sketch of one counter family"""
+    return load_leaderboard(dynamodb, pk)[0]
+
+def increment_counter(dynamodb, pk, member):
+    """Add one to a stored counter and to its leaderboard if it has been loaded"""
+    from database import STATS_TABLE
+    
+    try:
+        dynamodb.Table(STATS_TABLE).update_item(
+            Key={'pk': pk, 'sk': member},
+            UpdateExpression="ADD #count :one",
+            ExpressionAttributeNames={'#count': 'count'},
+            ExpressionAttributeValues={':one': 1}
+        )
+        # A leaderboard that has not been loaded yet reads the updated counter
+        entry = _leaderboards.get(pk)
+        if entry is not None:
+            entry[0].add(member)
+    except Exception as e:
+        print(f"Error updating leaderboard: {str(e)}")
+
+def record_contribution(dynamodb, employee_name):
+    increment_counter(dynamodb, CONTRIBUTORS_PK, employee_name or 'Anonymous')
+
+def record_idea_support(dynamodb, idea_id):
+    increment_counter(dynamodb, IDEA_SUPPORT_PK, idea_id)
+
+def top_contributors(dynamodb, limit=10):
+    """(employee, knowledge items) of the most active contributors"""
+    return get_leaderboard(dynamodb, CONTRIBUTORS_PK).top(limit)
+
+def popular_ideas(dynamodb, limit=5):
+    """The most supported ideas, fetched by id"""
+    from database import get_ideas_items
+    
+    return get_ideas_items(dynamodb, [idea_id for idea_id, _ in get_leaderboard(dynamodb, IDEA_SUPPORT_PK).top(limit)])
+
+def rebuild_leaderboards(dynamodb):
+    """Recount contributors and idea supporters from the tables and overwrite the stored counters"""
+    from database import KNOWLEDGE_TABLE, IDEAS_TABLE, STATS_TABLE, scan_projection, mark_backfilled
+    
+    counters = {
+        CONTRIBUTORS_PK: Counter(
+            item.get('employee_name') or 'Anonymous'
+            for item in scan_projection(dynamodb, KNOWLEDGE_TABLE, ["employee_name"])
+        ),
+        IDEA_SUPPORT_PK: Counter({
+            idea['id']: int(idea['supporter_count'])
+            for idea in scan_projection(dynamodb, IDEAS_TABLE, ["id", "supporter_count"])
+            if idea.get('supporter_count')
+        })
+    }
+    
+    table = dynamodb.Table(STATS_TABLE)
+    for pk, counts in counters.items():
+        stale = {member for member, _ in load_counters(dynamodb, pk)} - set(counts)
+        with table.batch_writer() as batch:
+            for member, count in counts.items():
+                batch.put_item(Item={'pk': pk, 'sk': member, 'count': count})
+            for member in stale:
+                batch.delete_item(Key={'pk': pk, 'sk': member})
+        # Other processes see the new marker when they next reload their sketches
+        mark_backfilled(dynamodb, pk)
+    
+    # Reloaded from the new counters on next use
+    with _leaderboards_lock:
+        _leaderboards.clear()
+    print(f"Rebuilt {len(counters[CONTRIBUTORS_PK])} contributor and {len(counters[IDEA_SUPPORT_PK])} idea counters")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain contributor and idea leaderboards")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recount every counter from the knowledge and ideas tables")
+    args = parser.parse_args(argv)
+    
+    from database import initialize_db
+    
+    dynamodb = initialize_db()
+    if args.command == "rebuild":
+        rebuild_leaderboards(dynamodb)
+
+if __name__ == "__main__":
+    main()
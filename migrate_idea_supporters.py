@@ -0,0 +1,73 @@
+"""
+One-off migration of idea supporters from the `supporters` list to the edge table
+
+Ideas saved before the idea supporters table existed keep their supporters
+as a list inside the idea item. This script writes one edge per supporter,
+counts it in the idea's supporter_count and removes the list. Each edge is
+written with the same transaction as a live support: only if it does not
+exist yet, together with an atomic ADD to the count. Edges written by live
+supports keep their times, concurrent supports are never lost, and an
+interrupted run can simply be started again.
+
+Usage:
+    python migrate_idea_supporters.py [--dry-run]
+
+Afterwards rebuild the counters and sketches that were computed from the lists:
+    python leaderboards.py rebuild
+    python contributor_sketches.py rebuild
+"""
+import argparse
+
+from database import initialize_db, add_idea_supporter, IDEAS_TABLE
+
+def migrate_idea(dynamodb, idea, dry_run=False):
+    """Move one idea's supporters list to edges; returns the number of edges added"""
+    supporters = list(dict.fromkeys(idea.get('supporters') or []))
+    if dry_run:
+        return len(supporters)
+    
+    # The list kept no support times, so new edges carry the idea's
+    added = sum(
+        add_idea_supporter(dynamodb, idea['id'], employee_name, int(idea.get('timestamp', 0)))
+        for employee_name in supporters
+    )
+    
+    # Ideas without supporters get a count of zero; an existing count is kept
+    dynamodb.Table(IDEAS_TABLE).update_item(
+        Key={'id': idea['id']},
+        UpdateExpression="SET supporter_count = if_not_exists(supporter_count, :zero) REMOVE supporters",
+        ExpressionAttributeValues={':zero': 0}
+    )
+    return added
+
+def migrate(dynamodb, dry_run=False):
+    table = dynamodb.Table(IDEAS_TABLE)
+    
+    # Only ideas still holding a list (or never given a count) need migrating
+    scan_kwargs = {
+        'FilterExpression': "attribute_exists(supporters) OR attribute_not_exists(supporter_count)",
+        'ProjectionExpression': "id, supporters, #timestamp",
+        'ExpressionAttributeNames': {'#timestamp': 'timestamp'}
+    }
+    ideas = edges = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for idea in response.get('Items', []):
+            edges += migrate_idea(dynamodb, idea, dry_run)
+            ideas += 1
+        if not response.get('LastEvaluatedKey'):
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {ideas} ideas, {edges} supporter edges {'at most' if dry_run else 'added'}")
+    return ideas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move idea supporters to the idea supporters table")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the ideas and supporters to migrate")
+    args = parser.parse_args(argv)
+    
+    migrate(initialize_db(), args.dry_run)
+
+if __name__ == "__main__":
+    main()
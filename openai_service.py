@@ -1,7 +1,9 @@
 import os
 import json
-import re
 from openai import OpenAI
+from arabic_corrector import get_default_corrector
+from content_classifier import classify_content, matched_content_types, best_category
+from chunker import embedded_passage_texts
 
 class DummyClient:
     """A dummy client class for when the OpenAI API is not available"""
@@ -44,8 +46,8 @@ def initialize_openai_client():
         # Use a dummy client that will trigger fallbacks
         return DummyClient(f"Error with OpenAI API: {str(e)}. Using fallback mode.")
 
-def process_knowledge(client, text, format_type="markdown"):
-    """Process and enhance knowledge text using OpenAI API"""
+def build_process_knowledge_request(text):
+    """Build the chat completion request used to enhance a knowledge contribution"""
     system_prompt = (
         "You are an AI assistant helping a knowledge management platform. "
         "Your task is to process knowledge contributions from employees, "
@@ -59,16 +61,20 @@ def process_knowledge(client, text, format_type="markdown"):
     
     user_prompt = f"Please process and enhance the following knowledge contribution:\n\n{text}"
     
+    return {
+        "model": "gpt-4o",  # The newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "temperature": 0.3,  # Lower temperature for more consistent output
+        "max_tokens": 2000
+    }
+
+def process_knowledge(client, text, format_type="markdown"):
+    """Process and enhance knowledge text using OpenAI API"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # The newest OpenAI model is "gpt-4o" which was released May 13, 2024
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,  # Lower temperature for more consistent output
-            max_tokens=2000
-        )
+        response = client.chat.completions.create(**build_process_knowledge_request(text))
         
         enhanced_text = response.choices[0].message.content
         return enhanced_text
@@ -103,33 +109,41 @@ def process_knowledge(client, text, format_type="markdown"):
         # Return the lightly processed text
         return processed_text
 
-def generate_knowledge_tags(client, text):
-    """Generate relevant tags for knowledge content"""
+def build_knowledge_tags_request(text):
+    """Build the chat completion request used to extract tags from knowledge content"""
     system_prompt = (
         "You are a knowledge management AI that helps categorize information. "
         "Extract 3-5 relevant tags from the text provided. "
         "Return only the tags as a JSON array of strings."
     )
     
+    return {
+        "model": "gpt-4o",  # The newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.3
+    }
+
+def parse_knowledge_tags_response(content):
+    """Extract the list of tags from a tag generation response body"""
+    result = json.loads(content)
+    if isinstance(result, dict):
+        result = result.get("tags", [])
+    
+    # A bare string would otherwise be split into single characters later
+    if not isinstance(result, list) or not all(isinstance(tag, str) for tag in result):
+        raise ValueError(f"Expected a list of tag strings, got: {content[:200]}")
+    return result
+
+def generate_knowledge_tags(client, text):
+    """Generate relevant tags for knowledge content"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # The newest OpenAI model is "gpt-4o" which was released May 13, 2024
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.3
-        )
+        response = client.chat.completions.create(**build_knowledge_tags_request(text))
         
-        result = json.loads(response.choices[0].message.content)
-        if isinstance(result, dict) and "tags" in result:
-            return result["tags"]
-        elif isinstance(result, list):
-            return result
-        else:
-            # Try to find tags in the response
-            return result.get("tags", [])
+        return parse_knowledge_tags_response(response.choices[0].message.content)
             
     except Exception as e:
         print(f"Error generating tags: {str(e)}")
@@ -240,80 +254,21 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
         print(f"Error generating smart questions: {str(e)}")
         
         # Intelligent fallback - analyze text to create better questions even when API fails
-        knowledge_text_lower = knowledge_text.lower()
-        
-        # بالكلمات المفتاحية المتعلقة بالسيارات بالعربية والإنجليزية
-        car_keywords = ["سيارة", "مركبة", "car", "vehicle", "سيارات", "شاحنة", "تويوتا", "مرسيدس", "هوندا", 
-                     "نيسان", "مازدا", "نقل", "بضائع", "ركاب", "toyota", "honda", "nissan", "mercedes", 
-                     "موديل", "model", "بيك اب", "pickup", "لون", "color", "white", "بيضاء", "سوداء", "black"]
-        
-        # كلمات مفتاحية للموردين
-        supplier_keywords = ["مورد", "مزود", "بائع", "supplier", "vendor", "موزع", "distributor", "محل", "متجر",
-                         "store", "shop", "سوق", "market", "شركة", "company", "تاجر", "تجار"]
-        
-        # كلمات مفتاحية للمنتجات
-        product_keywords = ["منتج", "سلعة", "product", "item", "بضاعة", "goods", "merchandise", "صنف", "أصناف",
-                        "مقاس", "size", "وزن", "weight", "نوعية", "quality", "ماركة", "brand"]
-        
-        # كلمات مفتاحية للإجراءات
-        process_keywords = ["إجراء", "عملية", "خطوات", "process", "procedure", "steps", "protocol", "طريقة", 
-                        "method", "نظام", "system", "آلية", "mechanism"]
-        
-        # كلمات مفتاحية للمعدات
-        equipment_keywords = ["معدة", "آلة", "جهاز", "equipment", "machine", "device", "tool", "أداة", "أدوات",
-                          "tools", "machinery", "ماكينة"]
-                          
-        # كلمات مفتاحية للأماكن
-        location_keywords = ["مكان", "موقع", "مقر", "location", "place", "office", "مكتب", "فرع", "branch", 
-                         "مستودع", "warehouse", "مخزن", "storage", "عنوان", "address"]
-                         
-        # كلمات مفتاحية للبرامج والأنظمة
-        software_keywords = ["برنامج", "نظام", "تطبيق", "software", "system", "app", "application", "موقع", 
-                         "website", "platform", "منصة"]
-                         
-        # كلمات مفتاحية للأشخاص وجهات الاتصال
-        person_keywords = ["شخص", "مسؤول", "موظف", "contact", "person", "employee", "مدير", "manager", 
-                       "director", "مشرف", "supervisor", "مختص", "specialist"]
-                       
-        # التحقق من نوع المحتوى عن طريق الكلمات المفتاحية الأكثر تكراراً
-        keyword_groups = [
-            (car_keywords, "car"),
-            (supplier_keywords, "supplier"),
-            (product_keywords, "product"),
-            (process_keywords, "process"),
-            (equipment_keywords, "equipment"),
-            (location_keywords, "location"),
-            (software_keywords, "software"),
-            (person_keywords, "person")
-        ]
-        
-        # حساب عدد الكلمات المفتاحية لكل فئة
-        category_scores = {}
-        for keywords, category in keyword_groups:
-            score = 0
-            for keyword in keywords:
-                if keyword in knowledge_text_lower:
-                    score += 1
-                    # أهمية أكبر للكلمات المفتاحية الدقيقة الطويلة
-                    if len(keyword) > 4:
-                        score += 1
-            category_scores[category] = score
+        # التحقق من نوع المحتوى عن طريق الكلمات المفتاحية الأكثر تكراراً (انظر content_classifier.py)
+        category_scores = classify_content(knowledge_text, "question_topics", long_keyword_bonus=True)
+        matched = {category for category, score in category_scores.items() if score > 0}
             
         # تحديد الفئة ذات الدرجة الأعلى
-        max_score = 0
-        top_category = "default"
-        for category, score in category_scores.items():
-            if score > max_score:
-                max_score = score
-                top_category = category
+        top_category = best_category(category_scores, default="default")
         
         # Check category and return appropriate questions
         
         # السيارات والمركبات
-        if top_category == "car" or any(word in knowledge_text_lower for word in car_keywords):
+        if top_category == "car" or "car" in matched:
             # تحديد إذا كانت هناك معلومات عن سيارة للبيع أو للاستخدام التجاري
-            is_commercial = any(word in knowledge_text_lower for word in ["نقل", "بضائع", "تجاري", "commercial", "cargo", "delivery"])
-            is_for_sale = any(word in knowledge_text_lower for word in ["بيع", "شراء", "sale", "سعر", "price", "تكلفة", "cost"])
+            car_context = matched_content_types(knowledge_text, "car_context")
+            is_commercial = "commercial" in car_context
+            is_for_sale = "for_sale" in car_context
             
             if is_commercial:
                 return [
@@ -335,7 +290,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
                 ]
         
         # الموردين والموزعين 
-        elif top_category == "supplier" or any(word in knowledge_text_lower for word in supplier_keywords):
+        elif top_category == "supplier" or "supplier" in matched:
             return [
                 "ما هي معلومات الاتصال بهذا المورد؟ (رقم الهاتف، البريد الإلكتروني، العنوان)",
                 "ما هي أوقات العمل وهل يقدم خدمة التوصيل؟",
@@ -343,7 +298,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
         
         # الإجراءات والعمليات
-        elif top_category == "process" or any(word in knowledge_text_lower for word in process_keywords):
+        elif top_category == "process" or "process" in matched:
             return [
                 "ما هي الخطوات التفصيلية لهذا الإجراء بترتيب التنفيذ؟",
                 "هل هناك متطلبات أو شروط مسبقة يجب توفرها قبل تنفيذ هذا الإجراء؟",
@@ -351,7 +306,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
         
         # المنتجات
-        elif top_category == "product" or any(word in knowledge_text_lower for word in product_keywords):
+        elif top_category == "product" or "product" in matched:
             return [
                 "ما هي المواصفات الكاملة لهذا المنتج (الأبعاد، الوزن، المميزات)؟",
                 "ما هي استخدامات هذا المنتج الرئيسية والفرعية؟",
@@ -359,7 +314,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
             
         # المعدات والآلات
-        elif top_category == "equipment" or any(word in knowledge_text_lower for word in equipment_keywords):
+        elif top_category == "equipment" or "equipment" in matched:
             return [
                 "ما هي المواصفات الفنية التفصيلية لهذه المعدة ومتطلبات تشغيلها؟",
                 "كيف يمكن صيانة هذه المعدة وما هي قطع الغيار الأكثر استهلاكاً؟",
@@ -367,7 +322,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
             
         # الأماكن والمواقع
-        elif top_category == "location" or any(word in knowledge_text_lower for word in location_keywords):
+        elif top_category == "location" or "location" in matched:
             return [
                 "ما هو العنوان الدقيق لهذا المكان وأقرب معلم بارز له؟",
                 "ما هي ساعات العمل الرسمية وهل يوجد مواقف سيارات قريبة؟",
@@ -375,7 +330,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
             
         # البرامج والأنظمة
-        elif top_category == "software" or any(word in knowledge_text_lower for word in software_keywords):
+        elif top_category == "software" or "software" in matched:
             return [
                 "ما هي متطلبات النظام اللازمة لتشغيل هذا البرنامج وإجراءات التثبيت؟",
                 "هل هناك دليل استخدام أو فيديوهات تدريبية متاحة للموظفين الجدد؟",
@@ -383,7 +338,7 @@ def generate_smart_questions(client, knowledge_text, previous_questions=None, pr
             ]
             
         # الأشخاص وجهات الاتصال
-        elif top_category == "person" or any(word in knowledge_text_lower for word in person_keywords):
+        elif top_category == "person" or "person" in matched:
             return [
                 "ما هي معلومات الاتصال المباشرة بهذا الشخص (هاتف، بريد إلكتروني، واتساب)؟",
                 "ما هو دور ومسؤوليات هذا الشخص تحديداً وفي أي قسم يعمل؟",
@@ -445,17 +400,17 @@ def process_question_answers(client, knowledge_text, questions, answers):
             title = f"{title}\n\n"
         
         # Identify content type based on keywords
-        knowledge_text_lower = knowledge_text.lower()
+        content_types = matched_content_types(knowledge_text, "document_sections")
         
         # Check for different content types
-        is_car = any(word in knowledge_text_lower for word in ["سيارة", "مركبة", "car", "vehicle", "سيارات", "شاحنة"])
-        is_supplier = any(word in knowledge_text_lower for word in ["مورد", "supplier", "vendor", "بائع", "مزود"])
-        is_product = any(word in knowledge_text_lower for word in ["منتج", "product", "بضاعة", "سلعة"])
-        is_process = any(word in knowledge_text_lower for word in ["إجراء", "عملية", "خطوات", "process", "procedure", "steps"])
-        is_software = any(word in knowledge_text_lower for word in ["برنامج", "نظام", "تطبيق", "software", "system", "app"])
-        is_equipment = any(word in knowledge_text_lower for word in ["معدة", "آلة", "جهاز", "equipment", "machine"])
-        is_location = any(word in knowledge_text_lower for word in ["مكان", "موقع", "مقر", "location", "place", "office"])
-        is_person = any(word in knowledge_text_lower for word in ["شخص", "مسؤول", "موظف", "contact", "person", "employee"])
+        is_car = "car" in content_types
+        is_supplier = "supplier" in content_types
+        is_product = "product" in content_types
+        is_process = "process" in content_types
+        is_software = "software" in content_types
+        is_equipment = "equipment" in content_types
+        is_location = "location" in content_types
+        is_person = "person" in content_types
         
         structured_content = title
         
@@ -560,74 +515,88 @@ def correct_arabic_text(text):
     - الى -> إلى 
     - مفاوضه -> مفاوضة
     - وغيرها من الأخطاء الشائعة
+    
+    القاموس موجود في data/arabic_corrections.json ويُترجم مرة واحدة إلى نمط
+    واحد يمر على النص مرة واحدة فقط (انظر arabic_corrector.py)
     """
-    # قائمة التصحيحات الإملائية الشائعة
-    corrections = {
-        # أخطاء الحروف المتشابهة
-        "خسب": "خشب",
-        "سجرة": "شجرة",
-        "صندوك": "صندوق",
-        "طاولط": "طاولة",
-        "ضابط": "ضابط",
-        "حهاز": "جهاز",
-        "جهار": "جهاز",
-        
-        # أخطاء الهمزات
-        "الى": "إلى",
-        "انا": "أنا",
-        "اسم": "اسم",
-        "احمد": "أحمد",
-        "اكثر": "أكثر",
-        "اقل": "أقل",
-        
-        # أخطاء التاء المربوطة
-        "مفاوضه": "مفاوضة",
-        "شركه": "شركة",
-        "معلومه": "معلومة",
-        "بضاعه": "بضاعة",
-        "سياره": "سيارة",
-        "شاحنه": "شاحنة",
-        
-        # أخطاء حروف العلة
-        "فى": "في",
-        "الذى": "الذي",
-        "على": "على",
-        "الة": "آلة",
-        
-        # أخطاء شائعة أخرى
-        "منتة": "منتج",
-        "هنان": "هناك",
-        "هناك،": "هناك",
-        "انة": "أنه",
-        "لاكن": "لكن",
-        "عندة": "عنده",
-        "عنده،": "عنده",
-        "يومياً": "يومياً",
-        "اخر": "آخر",
-        "الاخر": "الآخر",
-        "الان": "الآن",
-        "حائز": "جاهز",
-        
-        # أخطاء ترقيم شائعة
-        "،و": "، و",
-        "،ف": "، ف",
-        "؟و": "؟ و",
-        "!و": "! و",
-        
-        # إضافة مسافة بعد علامات الترقيم
-        "،": "، ",
-        ".": ". ",
-        "؛": "؛ ",
-        ":": ": "
+    return get_default_corrector().correct(text)
+
+# Embedding model used for vector retrieval (1536 dimensions)
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+def build_embedding_request(texts):
+    """Build the embeddings request for one or more texts"""
+    return {
+        "model": EMBEDDING_MODEL,
+        # Long knowledge items are cut to stay within the model's input limit
+        "input": [text[:8000] for text in texts]
+    }
+
+def embed_texts(client, texts, timeout=None):
+    """Embed texts with the OpenAI embeddings API (raises on failure, there is no fallback)"""
+    request = build_embedding_request(texts)
+    if timeout:
+        request["timeout"] = timeout
+    
+    response = client.embeddings.create(**request)
+    return [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+
+def embed_knowledge_passages(client, content, timeout=None):
+    """Embed the passages of a knowledge item in one request (raises on failure)"""
+    return embed_texts(client, embedded_passage_texts(content), timeout=timeout)
+
+def build_rerank_request(query, candidates):
+    """Build the chat completion request that reorders a short list of search candidates"""
+    system_prompt = (
+        "You are a knowledge management assistant helping with semantic search. "
+        "Given a user query and a short list of candidate knowledge items, return the IDs of the "
+        "relevant items ordered from most to least relevant. Leave out irrelevant items. "
+        "Return response as a JSON object of the form {\"ids\": [...]}."
+    )
+    
+    # The best passage is sent when search found one, otherwise the start of the item
+    formatted_items = [
+        f"ID: {item['id']}\nContent: {item.get('best_passage', {}).get('text') or item.get('content', '')[:500]}"
+        for item in candidates
+    ]
+    user_prompt = f"Query: {query}\n\nKnowledge Items:\n" + "\n\n".join(formatted_items)
+    
+    return {
+        "model": "gpt-4o",  # The newest OpenAI model is "gpt-4o" which was released May 13, 2024
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.1,
+        "max_tokens": 500
     }
+
+def parse_rerank_response(content):
+    """Extract the ordered list of ids from a rerank response body"""
+    result = json.loads(content)
+    if isinstance(result, list):
+        return result
+    return result.get("ids", [])
+
+def rerank_knowledge(client, query, candidates, timeout=None):
+    """
+    Reorder search candidates with the LLM (raises on failure)
+    
+    Candidates the model ranks come first in its order; the rest keep their
+    original order after them, so nothing is lost when the model is terse.
+    """
+    request = build_rerank_request(query, candidates)
+    if timeout:
+        request["timeout"] = timeout
     
-    # تطبيق التصحيحات
-    for wrong, correct in corrections.items():
-        text = re.sub(r'\\b' + wrong + r'\\b', correct, text)
-        text = text.replace(wrong, correct)  # استخدام الاستبدال المباشر كاحتياط إضافي
+    response = client.chat.completions.create(**request)
+    ranked_ids = [str(item_id) for item_id in parse_rerank_response(response.choices[0].message.content)]
     
-    # إرجاع النص المصحح
-    return text
+    by_id = {item["id"]: item for item in candidates}
+    reranked = [by_id[item_id] for item_id in dict.fromkeys(ranked_ids) if item_id in by_id]
+    ranked = {item["id"] for item in reranked}
+    return reranked + [item for item in candidates if item["id"] not in ranked]
 
 def search_knowledge_semantically(client, query, knowledge_items):
     """Perform semantic search on knowledge items using OpenAI embeddings"""
@@ -0,0 +1,190 @@
+import re
+from datetime import datetime
+
+from arabic_analyzer import analyze_query, normalize_field
+
+# Field names accepted before a colon, in English and Arabic
+FIELD_ALIASES = {
+    "department": "department",
+    "dept": "department",
+    "قسم": "department",
+    "القسم": "department",
+    "author": "author",
+    "employee": "author",
+    "by": "author",
+    "كاتب": "author",
+    "موظف": "author",
+    "tag": "tag",
+    "وسم": "tag",
+    "كلمة": "tag",
+    "after": "after",
+    "بعد": "after",
+    "before": "before",
+    "قبل": "before",
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%Y/%m/%d", "%Y-%m", "%Y"]
+
+# field:value, field:"quoted value", "quoted phrase" or a plain word
+_CLAUSE = re.compile(r'(?:([^\s:"]+):)?(?:"([^"]*)"?|(\S+))')
+
+# Curly and angle quotes are read as plain double quotes
+_QUOTES = str.maketrans({"“": '"', "”": '"', "«": '"', "»": '"'})
+
+def parse_date(value):
+    """Start of the day, month or year written as YYYY-MM-DD, YYYY-MM or YYYY (epoch seconds)"""
+    for date_format in DATE_FORMATS:
+        try:
+            return int(datetime.strptime(value, date_format).timestamp())
+        except ValueError:
+            continue
+    return None
+
+class SearchQuery:
+    """
+    A parsed search query
+    
+    Free words are ranked (any of them may match), quoted phrases must all
+    appear, and field filters restrict which items are considered at all.
+    after: includes the given date, before: excludes it.
+    """
+    
+    def __init__(self):
+        self.words = []
+        self.phrases = []
+        self.department = None
+        self.author = None
+        self.tags = []
+        self.after = None
+        self.before = None
+    
+    @property
+    def text(self):
+        """Free words and phrases as plain text, for ranking, embeddings and snippets"""
+        return " ".join(self.words + self.phrases)
+    
+    @property
+    def has_filters(self):
+        return bool(self.department or self.author or self.tags or self.after is not None or self.before is not None)
+    
+    def cache_key(self):
+        """Hashable key that is equal for queries returning the same results"""
+        return (
+            analyze_query(" ".join(self.words)),
+            tuple(analyze_query(phrase) for phrase in self.phrases),
+            normalize_field(self.department) if self.department else None,
+            normalize_field(self.author) if self.author else None,
+            tuple(sorted(normalize_field(tag) for tag in self.tags)),
+            self.after,
+            self.before
+        )
+
+def parse_query(query, tag=None):
+    """Parse a search query with field filters and quoted phrases; tag adds a tag filter"""
+    parsed = SearchQuery()
+    for match in _CLAUSE.finditer(query.translate(_QUOTES)):
+        field, quoted, bare = match.groups()
+        value = (quoted if quoted is not None else bare or "").strip()
+        name = FIELD_ALIASES.get(field.lower()) if field else None
+        
+        if name in ("after", "before"):
+            timestamp = parse_date(value)
+            if timestamp is None:
+                # Not a date: keep the clause as ordinary text
+                parsed.words.append(match.group())
+            else:
+                setattr(parsed, name, timestamp)
+        elif name == "tag":
+            if value:
+                parsed.tags.append(value)
+        elif name:
+            if value:
+                setattr(parsed, name, value)
+        elif field:
+            # Unknown field (a URL, a time like 10:30...) is just text
+            parsed.words.append(match.group())
+        elif quoted is not None:
+            if analyze_query(value):
+                parsed.phrases.append(value)
+        elif bare:
+            parsed.words.append(bare)
+    
+    if tag:
+        parsed.tags.append(tag)
+    return parsed
+
+def correct_query(query, correct):
+    """Apply a text correction to a query's free text, leaving its field filters as typed"""
+    corrected = []
+    start = 0
+    for match in _CLAUSE.finditer(query.translate(_QUOTES)):
+        field = match.group(1)
+        if field and FIELD_ALIASES.get(field.lower()):
+            # Text between filters is corrected as a whole, so word context is kept
+            corrected.append(correct(query[start:match.start()]) + match.group())
+            start = match.end()
+    corrected.append(correct(query[start:]))
+    return "".join(corrected)
+
+class QueryPlan:
+    """
+    Filter lookups ordered from the most to the least selective
+    
+    Each step is (name, estimated item count, lookup). A lookup receives the
+    candidate ids left by the previous steps (None before the first one) and
+    returns the narrowed set, so an expensive lookup can filter the few
+    remaining candidates instead of fetching its whole id list. Execution stops
+    as soon as nothing is left.
+    """
+    
+    def __init__(self, steps):
+        self.steps = sorted(steps, key=lambda step: step[1])
+    
+    def candidate_ids(self):
+        """Ids allowed by every filter, or None when the query has no filters"""
+        candidates = None
+        for _, _, lookup in self.steps:
+            candidates = lookup(candidates)
+            if not candidates:
+                return set()
+        return candidates
+    
+    def describe(self):
+        return [f"{name} (~{estimate} items)" for name, estimate, _ in self.steps]
+
+def compile_plan(parsed, index, tag_lookup):
+    """
+    Compile the filters of a parsed query to a plan over the search index
+    
+    Department, author and date filters are answered by the index's in-memory
+    lookups, which know their exact sizes. A tag filter queries the tag table
+    through tag_lookup, unless the candidates left by cheaper filters are few
+    enough to check the tags stored on the indexed items directly.
+    """
+    steps = []
+    
+    def narrow(ids):
+        return lambda candidates: set(ids) if candidates is None else candidates & ids
+    
+    if parsed.department:
+        ids = index.ids_by_department(parsed.department)
+        steps.append(("department", len(ids), narrow(ids)))
+    
+    if parsed.author:
+        ids = index.ids_by_author(parsed.author)
+        steps.append(("author", len(ids), narrow(ids)))
+    
+    if parsed.after is not None or parsed.before is not None:
+        count = index.count_in_time_range(parsed.after, parsed.before)
+        steps.append(("date", count, lambda candidates: index.ids_in_time_range(parsed.after, parsed.before, candidates)))
+    
+    for tag in parsed.tags:
+        def lookup(candidates, tag=tag):
+            if candidates is not None and len(candidates) <= index.LOCAL_FILTER_LIMIT:
+                return index.filter_by_tag(candidates, tag)
+            ids = set(tag_lookup(tag))
+            return ids if candidates is None else candidates & ids
+        # The tag table is remote, so it runs after every in-memory filter
+        steps.append((f"tag:{tag}", len(index) + 1, lookup))
+    
+    return QueryPlan(steps)
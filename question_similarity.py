@@ -0,0 +1,78 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# الكلمات غير المهمة التي تُحذف قبل المقارنة
+STOP_WORDS = ['هل', 'ما', 'من', 'في', 'على', 'عن', 'إلى', 'هو', 'هي', 'أو', 'أن', 'التي', 'الذي']
+
+# الكلمات المهمة في سياق نظام المعرفة؛ وجودها في السؤالين يرفع درجة التشابه
+IMPORTANT_WORDS = ['كهرباء', 'كهربائي', 'حريق', 'إصابة', 'ضرر', 'مسؤول', 'صيانة', 'إبلاغ', 'تصليح',
+                   'مشكلة', 'تماس', 'عزل', 'تيار', 'معدة', 'آلة', 'جهاز', 'موقع', 'مكان', 'طابق', 'دور']
+
+# Character n-gram size used for shingling
+SHINGLE_SIZE = 3
+
+_PUNCTUATION = re.compile(r'[،,\.؟\?!]')
+_STOP_WORDS = re.compile(r'(?<!\S)(?:' + '|'.join(STOP_WORDS) + r')(?!\S)')
+_SPACES = re.compile(r'\s+')
+
+QuestionSignature = namedtuple("QuestionSignature", ["text", "shingles", "important_words"])
+
+def normalize_question(text):
+    """إزالة علامات الترقيم والكلمات غير المهمة وتوحيد المسافات"""
+    text = _PUNCTUATION.sub(' ', text).lower()
+    text = _STOP_WORDS.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+@lru_cache(maxsize=4096)
+def question_signature(question):
+    """
+    Precompute everything needed to compare a question, once per question text
+    
+    The signature holds the set of character shingles of the normalized text
+    and the important domain words it contains.
+    """
+    text = normalize_question(question)
+    
+    # Pad with spaces so word starts and ends form their own shingles
+    padded = f" {text} "
+    shingles = frozenset(padded[i:i + SHINGLE_SIZE] for i in range(max(len(padded) - SHINGLE_SIZE + 1, 1)))
+    
+    important_words = frozenset(word for word in IMPORTANT_WORDS if word in text)
+    
+    return QuestionSignature(text, shingles, important_words)
+
+def question_similarity(question1, question2):
+    """
+    Similarity score between two questions (1.0 means identical)
+    
+    The score is the Dice coefficient of the two shingle sets, which is on the
+    same scale as difflib's SequenceMatcher ratio. Shared important words add
+    0.1 each, up to 0.3.
+    """
+    sig1 = question_signature(question1)
+    sig2 = question_signature(question2)
+    
+    total = len(sig1.shingles) + len(sig2.shingles)
+    score = 2 * len(sig1.shingles & sig2.shingles) / total if total else 1.0
+    
+    common_important_words = len(sig1.important_words & sig2.important_words)
+    if common_important_words > 0:
+        # زيادة بنسبة 10% لكل كلمة مهمة مشتركة، بحد أقصى 30%
+        score += min(0.3, common_important_words * 0.1)
+    
+    return score
+
+def are_questions_similar(question1, question2, threshold=0.7):
+    """
+    تحقق مما إذا كان سؤالان متشابهين جوهرياً
+    
+    Args:
+        question1: السؤال الأول
+        question2: السؤال الثاني
+        threshold: عتبة التشابه (0.0 - 1.0)، حيث 1.0 هو التطابق الكامل
+    
+    Returns:
+        Boolean: هل السؤالان متشابهان بدرجة كافية؟
+    """
+    return question_similarity(question1, question2) >= threshold
@@ -0,0 +1,312 @@
+"""
+Offline re-enrichment job for knowledge items that are already saved
+
+Knowledge saved before an improvement to process_knowledge or
+generate_knowledge_tags never benefits from it, so this job streams the
+knowledge table page by page and re-runs enrichment on every item whose
+enrichment_version is older than ENRICHMENT_VERSION. Items that fail keep
+their old version, so a later run with --restart picks them up again. So do
+items changed (e.g. appended to) between being read and written back, which
+are skipped rather than overwritten.
+
+Usage:
+    python reenrich_knowledge.py run [--concurrency 8] [--reprocess-content]
+    python reenrich_knowledge.py prepare-batch --output batch_requests.jsonl
+    python reenrich_knowledge.py apply-batch --results batch_results.jsonl
+
+Use --backend fake to run against the offline fake LLM instead of OpenAI.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import initialize_db, scan_knowledge_pages, get_knowledge_items, update_enriched_knowledge
+from openai_service import (
+    initialize_openai_client,
+    build_process_knowledge_request,
+    build_knowledge_tags_request,
+    parse_knowledge_tags_response,
+    build_embedding_request
+)
+from chunker import embedded_passage_texts
+from vector_index import embedding_to_binary
+
+# Bump this whenever the enrichment prompts change so older items get picked up again
+# (version 2 adds the embedding used by hybrid search, version 3 embeds each passage)
+ENRICHMENT_VERSION = 3
+
+# run and apply-batch track different progress, so each has its own file
+DEFAULT_CHECKPOINTS = {
+    "run": "reenrich_run_checkpoint.json",
+    "apply-batch": "reenrich_apply_checkpoint.json"
+}
+
+def load_checkpoint(path):
+    """Load job progress from a checkpoint file"""
+    if not path or not os.path.exists(path):
+        return {}
+    
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(path, state):
+    """Atomically persist job progress so an interrupted run can resume"""
+    if not path:
+        return
+    
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def needs_enrichment(item, force=False):
+    """Check whether an item was enriched by an older version of the pipeline"""
+    return force or int(item.get("enrichment_version", 0)) < ENRICHMENT_VERSION
+
+def source_text(item):
+    """Return the text enrichment should start from (the employee's own wording when known)"""
+    return item.get("original_content") or item.get("content", "")
+
+def mark_enriched(changes):
+    """Stamp an item's changes with the current enrichment version"""
+    changes["enrichment_version"] = ENRICHMENT_VERSION
+    changes["enriched_at"] = datetime.utcnow().isoformat()
+    return changes
+
+def set_passage_embeddings(changes, embeddings):
+    """Store one embedding per passage, removing the older whole-document embedding"""
+    changes["passage_embeddings"] = [embedding_to_binary(embedding) for embedding in embeddings]
+    changes["embedding"] = None
+    return changes
+
+def enrich_item(client, item, reprocess_content=False):
+    """Run the enrichment prompts for a single item and return the attributes to update"""
+    changes = {}
+    
+    # The LLM calls are made directly (not through the openai_service helpers) so
+    # failures surface here instead of being replaced by heuristic fallbacks
+    if reprocess_content:
+        source = source_text(item)
+        response = client.chat.completions.create(**build_process_knowledge_request(source))
+        changes["original_content"] = source
+        changes["content"] = response.choices[0].message.content
+    content = changes.get("content", item.get("content", ""))
+    
+    response = client.chat.completions.create(**build_knowledge_tags_request(content))
+    changes["tags"] = parse_knowledge_tags_response(response.choices[0].message.content)
+    
+    response = client.embeddings.create(**build_embedding_request(embedded_passage_texts(content)))
+    set_passage_embeddings(changes, [entry.embedding for entry in sorted(response.data, key=lambda entry: entry.index)])
+    
+    return mark_enriched(changes)
+
+def run_enrichment(dynamodb, client, concurrency=8, page_size=50, checkpoint_path=DEFAULT_CHECKPOINTS["run"],
+                   reprocess_content=False, force=False, limit=None):
+    """Stream knowledge items and enrich them in bounded-concurrency batches"""
+    state = load_checkpoint(checkpoint_path)
+    if state.get("completed"):
+        print("Checkpoint reports the job already completed. Use --restart to run again.")
+        return state
+    
+    state.setdefault("enriched", 0)
+    state.setdefault("skipped", 0)
+    state.setdefault("changed", 0)
+    state.setdefault("failed_ids", [])
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for items, last_key in scan_knowledge_pages(dynamodb, state.get("last_key"), page_size):
+            pending = [item for item in items if needs_enrichment(item, force)]
+            state["skipped"] += len(items) - len(pending)
+            
+            futures = [(item, executor.submit(enrich_item, client, item, reprocess_content)) for item in pending]
+            
+            for item, future in futures:
+                try:
+                    changes = future.result()
+                except Exception as e:
+                    print(f"Error enriching {item.get('id')}: {str(e)}")
+                    state["failed_ids"].append(item.get("id"))
+                    continue
+                
+                if update_enriched_knowledge(dynamodb, item, changes):
+                    state["enriched"] += 1
+                else:
+                    state["changed"] += 1
+            
+            # Only advance the checkpoint once the page has been written back
+            state["last_key"] = last_key
+            state["completed"] = last_key is None
+            save_checkpoint(checkpoint_path, state)
+            
+            print(
+                f"Enriched {state['enriched']} items ({state['skipped']} up to date, "
+                f"{state['changed']} changed meanwhile, {len(state['failed_ids'])} failed)"
+            )
+            
+            if limit and state["enriched"] >= limit:
+                break
+    
+    return state
+
+def write_batch_file(dynamodb, output_path, reprocess_content=False, force=False):
+    """
+    Write enrichment requests as a JSONL file for a Batch-style API
+    
+    Each line follows the OpenAI Batch input format. Tags and embeddings are
+    requested for the current content, since reprocessed content only exists once
+    the batch returns; with --reprocess-content the embedding is left to a later
+    run, and the item keeps its old version so that run picks it up.
+    """
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for items, _ in scan_knowledge_pages(dynamodb):
+            for item in items:
+                if not needs_enrichment(item, force):
+                    continue
+                
+                requests = [("tags", "/v1/chat/completions", build_knowledge_tags_request(item.get("content", "")))]
+                if reprocess_content:
+                    requests.append(("content", "/v1/chat/completions", build_process_knowledge_request(source_text(item))))
+                else:
+                    passages = embedded_passage_texts(item.get("content", ""))
+                    requests.append(("embedding", "/v1/embeddings", build_embedding_request(passages)))
+                
+                for kind, url, body in requests:
+                    line = {
+                        "custom_id": f"{item['id']}:{kind}",
+                        "method": "POST",
+                        "url": url,
+                        "body": body
+                    }
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    count += 1
+    
+    print(f"Wrote {count} requests to {output_path}")
+    return count
+
+def parse_batch_result(line):
+    """Parse one Batch API output line into (item_id, kind, content), or None on failure"""
+    result = json.loads(line)
+    item_id, kind = result["custom_id"].rsplit(":", 1)
+    
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        print(f"Batch request {result['custom_id']} failed: {result.get('error')}")
+        return None
+    
+    body = response["body"]
+    if kind == "embedding":
+        # One embedding per passage, in passage order
+        return item_id, kind, [entry["embedding"] for entry in sorted(body["data"], key=lambda entry: entry["index"])]
+    
+    content = body["choices"][0]["message"]["content"]
+    return item_id, kind, content
+
+def apply_batch_results(dynamodb, results_path, checkpoint_path=DEFAULT_CHECKPOINTS["apply-batch"], chunk_size=100):
+    """Write Batch API results back to the knowledge table in chunks"""
+    state = load_checkpoint(checkpoint_path)
+    state.setdefault("changed", 0)
+    applied_lines = state.get("applied_lines", 0)
+    
+    with open(results_path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    
+    for start in range(applied_lines, len(lines), chunk_size):
+        results = {}
+        for line in lines[start:start + chunk_size]:
+            parsed = parse_batch_result(line)
+            if parsed:
+                item_id, kind, content = parsed
+                results.setdefault(item_id, {})[kind] = content
+        
+        for item in get_knowledge_items(dynamodb, results.keys()):
+            outputs = results[item["id"]]
+            changes = {}
+            if "content" in outputs:
+                changes["original_content"] = source_text(item)
+                changes["content"] = outputs["content"]
+            if "tags" in outputs:
+                try:
+                    changes["tags"] = parse_knowledge_tags_response(outputs["tags"])
+                except ValueError as e:
+                    print(f"Invalid tags for {item['id']}: {str(e)}")
+            if "embedding" in outputs:
+                set_passage_embeddings(changes, outputs["embedding"])
+            
+            # Items whose content changed still need embeddings from a later run
+            if "content" in outputs and "embedding" not in outputs:
+                changes["embedding"] = None
+                changes["passage_embeddings"] = None
+            else:
+                mark_enriched(changes)
+            
+            if not update_enriched_knowledge(dynamodb, item, changes):
+                state["changed"] += 1
+        
+        state["applied_lines"] = min(start + chunk_size, len(lines))
+        save_checkpoint(checkpoint_path, state)
+        print(f"Applied {state['applied_lines']}/{len(lines)} result lines ({state['changed']} items changed meanwhile)")
+    
+    return state
+
+def build_client(args):
+    """Create the LLM client selected on the command line"""
+    if args.backend == "fake":
+        from fake_llm import FakeOpenAIClient
+        return FakeOpenAIClient(latency=args.fake_latency, failure_rate=args.fake_failure_rate)
+    return initialize_openai_client()
+
+def main(argv=None):
+    # Options shared by every sub-command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--checkpoint", help="Progress file used to resume (default: one file per sub-command)")
+    common.add_argument("--restart", action="store_true", help="Ignore and overwrite an existing checkpoint")
+    common.add_argument("--force", action="store_true", help="Re-enrich items that are already up to date")
+    common.add_argument("--reprocess-content", action="store_true",
+                        help="Also rewrite content with process_knowledge (the original text is kept)")
+    
+    parser = argparse.ArgumentParser(description="Re-enrich existing knowledge items")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    run_parser = subparsers.add_parser("run", parents=[common], help="Enrich items directly against the LLM API")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Maximum concurrent LLM requests")
+    run_parser.add_argument("--page-size", type=int, default=50, help="Items scanned and written per batch")
+    run_parser.add_argument("--limit", type=int, help="Stop after enriching roughly this many items")
+    run_parser.add_argument("--backend", choices=["openai", "fake"], default="openai")
+    run_parser.add_argument("--fake-latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    run_parser.add_argument("--fake-failure-rate", type=float, default=0.0)
+    
+    prepare_parser = subparsers.add_parser("prepare-batch", parents=[common], help="Write a Batch API request file")
+    prepare_parser.add_argument("--output", required=True)
+    
+    apply_parser = subparsers.add_parser("apply-batch", parents=[common], help="Apply a Batch API results file")
+    apply_parser.add_argument("--results", required=True)
+    
+    args = parser.parse_args(argv)
+    args.checkpoint = args.checkpoint or DEFAULT_CHECKPOINTS.get(args.command)
+    
+    if args.restart and args.checkpoint and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    
+    dynamodb = initialize_db()
+    
+    if args.command == "run":
+        run_enrichment(
+            dynamodb,
+            build_client(args),
+            concurrency=args.concurrency,
+            page_size=args.page_size,
+            checkpoint_path=args.checkpoint,
+            reprocess_content=args.reprocess_content,
+            force=args.force,
+            limit=args.limit
+        )
+    elif args.command == "prepare-batch":
+        write_batch_file(dynamodb, args.output, args.reprocess_content, args.force)
+    elif args.command == "apply-batch":
+        apply_batch_results(dynamodb, args.results, args.checkpoint)
+
+if __name__ == "__main__":
+    main()
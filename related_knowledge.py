@@ -0,0 +1,238 @@
+"""
+Related-knowledge recommendations precomputed per knowledge item
+
+Every item stores its top RELATED_TOP_N neighbours in a `related` attribute,
+each with the neighbour's id, similarity and enough of the neighbour (preview,
+department, employee) to be shown without another read. Neighbours come from
+the passage embeddings when the item has them, otherwise from its highest
+TF-IDF terms run through the lexical search index.
+
+save_knowledge and append_to_knowledge keep the lists up to date: the written
+item gets its own list, and it is inserted into the lists of its embedding
+neighbours when it beats their weakest entry. When an item's content changes,
+the lists already holding it get its new preview. The rebuild command recomputes
+every list, e.g. after a bulk import or re-enrichment:
+
+    python related_knowledge.py rebuild [--top-n 5]
+"""
+import argparse
+from decimal import Decimal
+
+from search_index import get_knowledge_search_index
+from utils import truncate_text
+from vector_index import get_knowledge_vector_index, item_centroid
+
+# Neighbours kept per item
+RELATED_TOP_N = 5
+
+# Embedding neighbours below this cosine similarity are not related
+MIN_RELATED_SIMILARITY = 0.5
+
+# Lexical neighbours must score at least this fraction of the item's own score
+MIN_LEXICAL_SCORE = 0.3
+
+# Terms of an item used to look for lexical neighbours
+KEY_TERMS = 10
+
+# Passages fetched per wanted neighbour, since one item can hold several top passages
+PASSAGES_PER_NEIGHBOUR = 4
+
+# Attempts at changing a neighbour's list that other saves keep changing first
+NEIGHBOUR_WRITE_ATTEMPTS = 3
+
+def related_entry(item, score):
+    """What is stored about one neighbour"""
+    preview = item.get('content', '').lstrip('#').strip().split('\n')[0]
+    return {
+        'id': item['id'],
+        'score': Decimal(str(round(score, 4))),
+        'preview': truncate_text(preview, 150),
+        'department': item.get('department', ''),
+        'employee_name': item.get('employee_name', '')
+    }
+
+def best_per_item(passage_hits, item_id, top_n):
+    """(neighbour id, similarity) from (key, similarity) passage hits, best passage per item"""
+    neighbours = {}
+    for (neighbour_id, _), similarity in passage_hits:
+        if neighbour_id != item_id and neighbour_id not in neighbours:
+            neighbours[neighbour_id] = similarity
+    return list(neighbours.items())[:top_n]
+
+def lexical_neighbours(index, item_id, top_n=RELATED_TOP_N):
+    """(neighbour id, relative score) from searching the item's key terms"""
+    terms = index.key_terms(item_id, KEY_TERMS)
+    if not terms:
+        return []
+    results = index.search(terms)
+    own_score = next((score for item, score, _ in results if item['id'] == item_id), None)
+    if not own_score:
+        return []
+    return [
+        (item['id'], min(score / own_score, 1.0))
+        for item, score, _ in results
+        if item['id'] != item_id and score / own_score >= MIN_LEXICAL_SCORE
+    ][:top_n]
+
+def find_related(dynamodb, item, top_n=RELATED_TOP_N):
+    """Return ((neighbour id, score) list, whether it came from embeddings) for one item"""
+    centroid = item_centroid(item)
+    if centroid is not None:
+        vector_index = get_knowledge_vector_index(dynamodb)
+        hits = vector_index.top_k(centroid, (top_n + 1) * PASSAGES_PER_NEIGHBOUR, MIN_RELATED_SIMILARITY)
+        return best_per_item(hits, item['id'], top_n), True
+    return lexical_neighbours(get_knowledge_search_index(dynamodb), item['id'], top_n), False
+
+def store_related(dynamodb, item, related, if_unchanged=False):
+    """
+    Write an item's related list and refresh the copy held by the search index
+    
+    With if_unchanged the list is only written while the stored one is still
+    item['related'], the list it was computed from. Returns whether it was written.
+    """
+    from database import KNOWLEDGE_TABLE
+    
+    # A neighbour deleted in the meantime must not come back as an item holding only this list
+    condition = "attribute_exists(id)"
+    values = {':related': related}
+    if if_unchanged and item.get('related') is None:
+        condition += " AND attribute_not_exists(related)"
+    elif if_unchanged:
+        condition += " AND related = :previous"
+        values[':previous'] = item['related']
+    
+    try:
+        dynamodb.Table(KNOWLEDGE_TABLE).update_item(
+            Key={'id': item['id']},
+            UpdateExpression="SET related = :related",
+            ConditionExpression=condition,
+            ExpressionAttributeValues=values
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    item['related'] = related
+    indexed = get_knowledge_search_index(dynamodb).items.get(item['id'])
+    if indexed is not None and indexed is not item:
+        indexed['related'] = related
+    return True
+
+def insert_related(entries, entry, top_n=RELATED_TOP_N):
+    """entries with entry added (or refreshed), best first, or None when it doesn't make the cut"""
+    others = [existing for existing in entries or [] if existing['id'] != entry['id']]
+    merged = sorted(others + [entry], key=lambda existing: existing['score'], reverse=True)[:top_n]
+    return merged if entry in merged else None
+
+def refresh_related(entries, item):
+    """entries with the preview of item refreshed (its score kept), or None when they don't hold it"""
+    for i, existing in enumerate(entries or []):
+        if existing['id'] == item['id']:
+            refreshed = related_entry(item, float(existing['score']))
+            return entries[:i] + [refreshed] + entries[i + 1:] if refreshed != existing else None
+    return None
+
+def update_neighbour_related(dynamodb, neighbour, change):
+    """
+    Apply change (stored list -> new list, or None to leave it) to a neighbour's list
+    
+    Several saves can change the same neighbour's list at once, so each write
+    is conditional on the list it was computed from and retried on a fresh
+    read when another save got there first.
+    """
+    from database import KNOWLEDGE_TABLE
+    
+    for _ in range(NEIGHBOUR_WRITE_ATTEMPTS):
+        related = change(neighbour.get('related'))
+        if related is None or store_related(dynamodb, neighbour, related, if_unchanged=True):
+            return
+        neighbour = dynamodb.Table(KNOWLEDGE_TABLE).get_item(Key={'id': neighbour['id']}).get('Item')
+        if neighbour is None:
+            return
+    print(f"Gave up updating the related list of {neighbour['id']}")
+
+def update_related_knowledge(dynamodb, item, top_n=RELATED_TOP_N):
+    """Compute the related list of a written item and add it to its neighbours' lists"""
+    from database import get_knowledge_items
+    
+    try:
+        neighbours, from_embeddings = find_related(dynamodb, item, top_n)
+        found = {neighbour['id']: neighbour for neighbour in get_knowledge_items(dynamodb, [neighbour_id for neighbour_id, _ in neighbours])}
+        related = [related_entry(found[neighbour_id], score) for neighbour_id, score in neighbours if neighbour_id in found]
+        store_related(dynamodb, item, related)
+        
+        # Similarity is symmetric, so the new item may belong in its neighbours' lists.
+        # Lexical scores are relative to one item and are not compared across lists.
+        if from_embeddings:
+            for neighbour_id, score in neighbours:
+                if neighbour_id not in found:
+                    continue
+                entry = related_entry(item, score)
+                update_neighbour_related(
+                    dynamodb, found[neighbour_id], lambda entries, entry=entry: insert_related(entries, entry, top_n)
+                )
+        return related
+    
+    except Exception as e:
+        print(f"Error updating related knowledge: {str(e)}")
+        return []
+
+def refresh_related_previews(dynamodb, item):
+    """Refresh what the lists holding an item store about it after its content changed"""
+    try:
+        # The search index holds every item with its list, so no table scan is needed
+        holders = [
+            holder for holder in list(get_knowledge_search_index(dynamodb).items.values())
+            if holder['id'] != item['id'] and any(entry['id'] == item['id'] for entry in holder.get('related') or [])
+        ]
+        for holder in holders:
+            update_neighbour_related(dynamodb, holder, lambda entries: refresh_related(entries, item))
+    
+    except Exception as e:
+        print(f"Error refreshing related knowledge previews: {str(e)}")
+
+def rebuild_related_knowledge(dynamodb, top_n=RELATED_TOP_N):
+    """Recompute the related list of every item from the in-memory indexes"""
+    index = get_knowledge_search_index(dynamodb)
+    vector_index = get_knowledge_vector_index(dynamodb)
+    items = dict(index.items)
+    
+    # Embedding neighbours for all embedded items in a few matrix products
+    centroids = {item_id: item_centroid(item) for item_id, item in items.items()}
+    embedded = [item_id for item_id, centroid in centroids.items() if centroid is not None]
+    hits = vector_index.top_k_many(
+        [centroids[item_id] for item_id in embedded],
+        (top_n + 1) * PASSAGES_PER_NEIGHBOUR,
+        MIN_RELATED_SIMILARITY
+    ) if embedded else []
+    neighbours = {item_id: best_per_item(item_hits, item_id, top_n) for item_id, item_hits in zip(embedded, hits)}
+    
+    updated = 0
+    for item_id, item in items.items():
+        item_neighbours = neighbours.get(item_id)
+        if item_neighbours is None:
+            item_neighbours = lexical_neighbours(index, item_id, top_n)
+        related = [related_entry(items[neighbour_id], score) for neighbour_id, score in item_neighbours if neighbour_id in items]
+        store_related(dynamodb, item, related)
+        updated += 1
+        if updated % 500 == 0:
+            print(f"Updated {updated}/{len(items)} items")
+    
+    print(f"Rebuilt related knowledge for {updated} items ({len(embedded)} from embeddings)")
+    return updated
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain related-knowledge recommendations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute the related list of every item")
+    rebuild_parser.add_argument("--top-n", type=int, default=RELATED_TOP_N, help="Neighbours kept per item")
+    
+    args = parser.parse_args(argv)
+    
+    from database import initialize_db
+    
+    dynamodb = initialize_db()
+    if args.command == "rebuild":
+        rebuild_related_knowledge(dynamodb, args.top_n)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from arabic_analyzer import analyze_query, analyze_with_offsets, normalize_field
+from chunker import item_passages
+from query_parser import parse_query
+from shared_index import SharedIndex
+
+# Character n-gram size of the index
+GRAM_SIZE = 3
+
+# The in-memory index is rebuilt in the background after this many seconds so
+# writes made by other app processes are eventually picked up
+INDEX_MAX_AGE = 600
+
+# Target length of a result snippet in characters
+SNIPPET_CHARS = 240
+
+# Markdown emphasis put around matched words in snippets
+HIGHLIGHT_MARKER = "**"
+
+def char_grams(text):
+    """Set of character trigrams of a string"""
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+def score_passage(tokens, query_terms, query_phrase):
+    """Content relevance of one analyzed passage for the analyzed query (0 means no match)"""
+    score = 0
+    
+    # Check for term matches in content
+    for term in query_terms:
+        if term in tokens:
+            # Count occurrences for content weighting
+            occurences = tokens.count(term)
+            score += min(occurences * 2, 10)  # Cap to avoid overwhelming results
+        
+    # Exact phrase match is a strong signal
+    if query_phrase in tokens:
+        score += 15
+    
+    return score
+
+def score_meta(meta, query_terms):
+    """Relevance of an item's department and employee name for the analyzed query"""
+    department, employee = meta
+    score = 0
+    
+    # Check exact match in department or employee name (higher weight)
+    for term in query_terms:
+        if term in department:
+            score += 5
+        
+        if term in employee:
+            score += 5
+    
+    return score
+
+def token_positions(content):
+    """Analyzed tokens of a document as (stems, start offsets, end offsets)"""
+    tokens = analyze_with_offsets(content)
+    return (
+        tuple(stem for stem, _, _ in tokens),
+        array('l', (start for _, start, _ in tokens)),
+        array('l', (end for _, _, end in tokens))
+    )
+
+def highlight(content, start, end, highlights, marker=HIGHLIGHT_MARKER):
+    """content[start:end] with marker around each (start, end) highlight, and ellipses where cut"""
+    parts = ["..."] if start > 0 else []
+    position = start
+    for highlight_start, highlight_end in highlights:
+        parts.append(content[position:highlight_start])
+        parts.append(f"{marker}{content[highlight_start:highlight_end]}{marker}")
+        position = highlight_end
+    parts.append(content[position:end])
+    if end < len(content):
+        parts.append("...")
+    return "".join(parts)
+
+def build_snippet(content, positions, query_terms, span=None, max_chars=SNIPPET_CHARS):
+    """
+    Highlighted snippet of a document for an analyzed query, from its token positions
+    
+    The window is the stretch of at most max_chars inside span (the best passage)
+    that covers the most distinct query terms, padded with context on both sides
+    on word boundaries. Only the passage's tokens are looked at, never the whole
+    content, so a snippet costs a few microseconds.
+    """
+    stems, starts, ends = positions
+    span_start, span_end = span or (0, len(content))
+    first_token, end_token = bisect_left(starts, span_start), bisect_left(starts, span_end)
+    
+    # Same infix matching as the search itself
+    matched = [i for i in range(first_token, end_token) if any(term in stems[i] for term in query_terms)]
+    if not matched:
+        # Vector-only or meta-only hits: the start of the passage
+        last = first_token
+        while last + 1 < end_token and ends[last + 1] - span_start <= max_chars:
+            last += 1
+        end = ends[last] if last < end_token else min(span_end, span_start + max_chars)
+        return {'text': highlight(content, span_start, end, []), 'start': span_start, 'end': end, 'highlights': []}
+    
+    # Densest run of matches: most distinct terms, then most matches
+    best_key, best_run = None, None
+    last = 0
+    for first in range(len(matched)):
+        last = max(last, first)
+        while last + 1 < len(matched) and ends[matched[last + 1]] - starts[matched[first]] <= max_chars:
+            last += 1
+        run = matched[first:last + 1]
+        key = (len({term for i in run for term in query_terms if term in stems[i]}), len(run))
+        if best_key is None or key > best_key:
+            best_key, best_run = key, run
+    
+    # Pad with context, about half before the run and the rest after it
+    left, right = best_run[0], best_run[-1]
+    half = (max_chars - (ends[right] - starts[left])) // 2
+    while left > first_token and ends[right] - starts[left - 1] <= max_chars and starts[best_run[0]] - starts[left - 1] <= half:
+        left -= 1
+    while right + 1 < end_token and ends[right + 1] - starts[left] <= max_chars:
+        right += 1
+    while left > first_token and ends[right] - starts[left - 1] <= max_chars:
+        left -= 1
+    
+    start, end = starts[left], ends[right]
+    highlights = [(starts[i], ends[i]) for i in matched if left <= i <= right]
+    return {'text': highlight(content, start, end, highlights), 'start': start, 'end': end, 'highlights': highlights}
+
+class KnowledgeSearchIndex:
+    """
+    Character-trigram index over the passages of knowledge items
+    
+    Each passage (see chunker.chunk_passages) is indexed on its own, and the
+    department and employee name of each item once. A query term can only occur
+    in a passage that contains all of the term's trigrams, so intersecting the
+    trigram postings gives a small candidate set. Candidates are then verified
+    with a plain substring check, which keeps the infix matching of the original
+    scan (a stem also matches inside words with attached prefixes and suffixes).
+    An item scores with its best passage, which is also returned as its snippet.
+    
+    The token positions of each item are kept as well, so highlighted snippets
+    are built from offsets without re-analyzing the content (see build_snippet).
+    
+    Department, author and date lookups back the field filters of structured
+    queries (see query_parser.compile_plan).
+    """
+    
+    # Candidate sets up to this size are filtered and scored item by item
+    # instead of through the postings
+    LOCAL_FILTER_LIMIT = 200
+    
+    def __init__(self):
+        self.items = {}     # item id -> knowledge item
+        self.meta = {}      # item id -> (department, employee)
+        self.passages = {}  # item id -> [(start, end, analyzed tokens), ...]
+        self.positions = {}  # item id -> (stems, start offsets, end offsets)
+        self.postings = defaultdict(set)       # trigram -> (item id, passage number)
+        self.meta_postings = defaultdict(set)  # trigram -> item ids
+        self.by_department = defaultdict(set)  # normalized department -> item ids
+        self.by_author = defaultdict(set)      # normalized employee name -> item ids
+        self.timeline = []                     # sorted (timestamp, item id)
+        self.timestamps = {}                   # item id -> timestamp
+        self.document_frequency = Counter()    # stem -> number of items containing it
+        self._lock = threading.RLock()
+    
+    def add(self, item):
+        """Index a new item, or re-index an item whose content changed"""
+        with self._lock:
+            item_id = item['id']
+            if item_id in self.items:
+                self.remove(item_id)
+            
+            content = item.get('content', '')
+            positions = token_positions(content)
+            stems, starts, _ = positions
+            passages = [
+                (start, end, " ".join(stems[bisect_left(starts, start):bisect_left(starts, end)]))
+                for start, end in item_passages(item)
+            ]
+            meta = (normalize_field(item.get('department', '')), normalize_field(item.get('employee_name', '')))
+            
+            self.items[item_id] = item
+            self.meta[item_id] = meta
+            self.passages[item_id] = passages
+            self.positions[item_id] = positions
+            self.document_frequency.update(set(stems))
+            for number, (_, _, tokens) in enumerate(passages):
+                for gram in char_grams(tokens):
+                    self.postings[gram].add((item_id, number))
+            for gram in char_grams(meta[0]) | char_grams(meta[1]):
+                self.meta_postings[gram].add(item_id)
+    
+            self.by_department[meta[0].strip()].add(item_id)
+            self.by_author[meta[1].strip()].add(item_id)
+            timestamp = int(item.get('timestamp', 0))
+            self.timestamps[item_id] = timestamp
+            insort(self.timeline, (timestamp, item_id))
+    
+    def remove(self, item_id):
+        with self._lock:
+            if item_id not in self.items:
+                return
+            del self.items[item_id]
+            self.document_frequency.subtract(set(self.positions.pop(item_id)[0]))
+            
+            for number, (_, _, tokens) in enumerate(self.passages.pop(item_id)):
+                for gram in char_grams(tokens):
+                    self._discard(self.postings, gram, (item_id, number))
+            department, employee = self.meta.pop(item_id)
+            for gram in char_grams(department) | char_grams(employee):
+                self._discard(self.meta_postings, gram, item_id)
+            
+            self._discard(self.by_department, department.strip(), item_id)
+            self._discard(self.by_author, employee.strip(), item_id)
+            timestamp = self.timestamps.pop(item_id)
+            del self.timeline[bisect_left(self.timeline, (timestamp, item_id))]
+    
+    @staticmethod
+    def _discard(postings, gram, key):
+        keys = postings.get(gram)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del postings[gram]
+    
+    @staticmethod
+    def _intersect(postings, grams):
+        lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        result = set(lists[0])
+        for keys in lists[1:]:
+            if not result:
+                break
+            result &= keys
+        return result
+    
+    def candidates(self, term):
+        """Passages and items (by meta fields) that may contain term (a superset, to be verified)"""
+        grams = char_grams(term)
+        if not grams:
+            # Terms shorter than a trigram cannot use the index
+            passages = {(item_id, number) for item_id, spans in self.passages.items()
+                        for number in range(len(spans))}
+            return passages, set(self.items)
+        return self._intersect(self.postings, grams), self._intersect(self.meta_postings, grams)
+    
+    @staticmethod
+    def _lookup_field(values, value):
+        """Ids with exactly this field value, or else with values containing it"""
+        key = normalize_field(value.strip())
+        if key in values:
+            return set(values[key])
+        return set().union(*(ids for field, ids in values.items() if key in field))
+    
+    def ids_by_department(self, department):
+        with self._lock:
+            return self._lookup_field(self.by_department, department)
+    
+    def ids_by_author(self, author):
+        with self._lock:
+            return self._lookup_field(self.by_author, author)
+    
+    def _time_range(self, after=None, before=None):
+        low = bisect_left(self.timeline, (after,)) if after is not None else 0
+        high = bisect_left(self.timeline, (before,)) if before is not None else len(self.timeline)
+        return low, max(low, high)
+    
+    def count_in_time_range(self, after=None, before=None):
+        """Number of items with after <= timestamp < before, in O(log n)"""
+        with self._lock:
+            low, high = self._time_range(after, before)
+            return high - low
+    
+    def ids_in_time_range(self, after=None, before=None, candidates=None):
+        """Ids of items with after <= timestamp < before, optionally among candidates"""
+        with self._lock:
+            if candidates is not None and len(candidates) <= self.LOCAL_FILTER_LIMIT:
+                return {
+                    item_id for item_id in candidates
+                    if item_id in self.timestamps
+                    and (after is None or self.timestamps[item_id] >= after)
+                    and (before is None or self.timestamps[item_id] < before)
+                }
+            low, high = self._time_range(after, before)
+            ids = {item_id for _, item_id in self.timeline[low:high]}
+        return ids if candidates is None else candidates & ids
+    
+    def filter_by_tag(self, candidates, tag):
+        """Candidates whose indexed item carries tag"""
+        key = normalize_field(tag.strip())
+        with self._lock:
+            return {
+                item_id for item_id in candidates
+                if item_id in self.items
+                and any(normalize_field(item_tag.strip()) == key for item_tag in self.items[item_id].get('tags') or [])
+            }
+    
+    def key_terms(self, item_id, count=10):
+        """The item's stems with the highest TF-IDF weight, best first"""
+        with self._lock:
+            if item_id not in self.positions:
+                return []
+            frequencies = Counter(self.positions[item_id][0])
+            # Smoothed IDF, so terms stay usable in a small corpus
+            weights = {
+                stem: frequency * math.log(1 + len(self.items) / self.document_frequency[stem])
+                for stem, frequency in frequencies.items()
+                if self.document_frequency[stem]
+            }
+        return sorted(weights, key=weights.get, reverse=True)[:count]
+    
+    def newest(self, allowed_ids):
+        """(item, 0, first passage) for the allowed items, newest first; for filter-only queries"""
+        with self._lock:
+            results = [
+                (self.items[item_id], 0, self.passages[item_id][0][:2])
+                for item_id in allowed_ids if item_id in self.items
+            ]
+        results.sort(key=lambda x: x[0].get('timestamp', 0), reverse=True)
+        return results
+    
+    def search(self, query_terms, allowed_ids=None, phrases=()):
+        """
+        Return (item, score, (start, end) of the best passage) for matching items, best first
+        
+        phrases are analyzed phrases (tuples of terms) that must each occur in
+        one passage of an item. Without query terms, allowed_ids are listed
+        newest first.
+        """
+        if not query_terms:
+            return self.newest(allowed_ids) if allowed_ids is not None else []
+        query_phrase = " ".join(query_terms)
+        required = [" ".join(phrase) for phrase in phrases]
+        
+        with self._lock:
+            if allowed_ids is not None and len(allowed_ids) <= self.LOCAL_FILTER_LIMIT:
+                # Few candidates left by the filters: score them directly
+                meta_ids = {item_id for item_id in allowed_ids if item_id in self.items}
+                passage_keys = {(item_id, number) for item_id in meta_ids for number in range(len(self.passages[item_id]))}
+            else:
+                passage_keys, meta_ids = set(), set()
+                for term in query_terms:
+                    passages, items = self.candidates(term)
+                    passage_keys |= passages
+                    meta_ids |= items
+            
+            # Best passage per item
+            best = {}
+            for item_id, number in passage_keys:
+                if allowed_ids is not None and item_id not in allowed_ids:
+                    continue
+                start, end, tokens = self.passages[item_id][number]
+                score = score_passage(tokens, query_terms, query_phrase)
+                if score > 0 and score > best.get(item_id, (0,))[0]:
+                    best[item_id] = (score, start, end)
+            
+            scored_items = []
+            for item_id in set(best) | meta_ids:
+                if allowed_ids is not None and item_id not in allowed_ids:
+                    continue
+                if required and not all(
+                    any(phrase in tokens for _, _, tokens in self.passages[item_id]) for phrase in required
+                ):
+                    continue
+                score, start, end = best.get(item_id, (0,) + self.passages[item_id][0][:2])
+                score += score_meta(self.meta[item_id], query_terms)
+                if score > 0:
+                    scored_items.append((self.items[item_id], score, (start, end)))
+        
+        # Sort by score (descending), newest first among equal scores
+        scored_items.sort(key=lambda x: (x[1], x[0].get('timestamp', 0)), reverse=True)
+        return scored_items
+    
+    def snippet(self, item, query_terms, max_chars=SNIPPET_CHARS):
+        """Highlighted snippet of a search result from its best passage"""
+        with self._lock:
+            indexed = self.items.get(item['id'])
+            positions = self.positions.get(item['id'])
+        
+        content = item.get('content', '')
+        if indexed is None or indexed.get('content') != content:
+            # Not indexed (yet), or indexed with other content: analyze it now
+            positions = token_positions(content)
+        
+        best_passage = item.get('best_passage')
+        span = (best_passage['start'], best_passage['end']) if best_passage else None
+        return build_snippet(content, positions, query_terms, span, max_chars)
+    
+    def __len__(self):
+        return len(self.items)
+
+def build_knowledge_search_index(dynamodb):
+    """Build a search index from one scan of the knowledge table"""
+    from database import scan_knowledge_pages
+    
+    index = KnowledgeSearchIndex()
+    for items, _ in scan_knowledge_pages(dynamodb):
+        for item in items:
+            index.add(item)
+    return index
+
+_knowledge_index = SharedIndex(build_knowledge_search_index, INDEX_MAX_AGE)
+
+def get_knowledge_search_index(dynamodb):
+    """Return the shared search index, building it from one scan on first use and refreshing it when too old"""
+    return _knowledge_index.get(dynamodb)
+
+def knowledge_snippet(dynamodb, item, query, max_chars=SNIPPET_CHARS):
+    """Highlighted snippet of a search result for the query it was found with"""
+    # Field filters are not highlighted, only the words and phrases
+    query_terms = analyze_query(parse_query(query).text)
+    return get_knowledge_search_index(dynamodb).snippet(item, query_terms, max_chars)
+
+def index_knowledge_item(item):
+    """Add or refresh a written item in the shared index if it has been built"""
+    _knowledge_index.apply(lambda index: index.add(item))
@@ -0,0 +1,80 @@
+import threading
+import time
+
+class SharedIndex:
+    """
+    A process-wide in-memory index built from the tables, refreshed in the background
+    
+    The first request builds the index and waits for it. Once it is older than
+    max_age, the current index keeps being served while a background thread
+    builds a new one (stale-while-revalidate, like DashboardCache), so writes
+    from other processes show up without any request paying for the rebuild.
+    
+    Writes of this process are applied to the current index right away. Those
+    made while a rebuild is running are replayed on the new index before it is
+    swapped in, since the rebuild's scan may have passed them already.
+    """
+    
+    def __init__(self, build, max_age):
+        self._build = build  # dynamodb -> new index
+        self.max_age = max_age
+        self.current = None
+        self.built_at = None
+        self._pending = None  # updates made during a rebuild, or None when idle
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+    
+    def get(self, dynamodb):
+        """Return the index, building it on first use and refreshing it when stale"""
+        if self.current is None:
+            with self._build_lock:
+                if self.current is None:
+                    self._rebuild(dynamodb)
+        elif time.monotonic() - self.built_at > self.max_age:
+            with self._lock:
+                start = self._pending is None
+                if start:
+                    self._pending = []
+            if start:
+                threading.Thread(target=self._refresh, args=(dynamodb,), daemon=True).start()
+        return self.current
+    
+    def _refresh(self, dynamodb):
+        try:
+            with self._build_lock:
+                self._rebuild(dynamodb)
+        except Exception as e:
+            # The old index stays in place and the next request retries
+            print(f"Error rebuilding index: {str(e)}")
+    
+    def _rebuild(self, dynamodb):
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+        built_at = time.monotonic()
+        try:
+            index = self._build(dynamodb)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        self.replace(index, built_at)
+    
+    def replace(self, index, built_at=None):
+        """Swap in a new index, replaying the updates made while it was being built"""
+        with self._lock:
+            for update in self._pending or ():
+                update(index)
+            self.current = index
+            self.built_at = time.monotonic() if built_at is None else built_at
+            self._pending = None
+    
+    def apply(self, update, replay=True):
+        """Apply a write to the index if it has been built (and to one being built, if replay)"""
+        # An index that has not been built yet will pick the write up from its scan
+        with self._lock:
+            index = self.current
+            if replay and self._pending is not None:
+                self._pending.append(update)
+        if index is not None:
+            update(index)
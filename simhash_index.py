@@ -0,0 +1,139 @@
+import hashlib
+import threading
+from collections import Counter, defaultdict
+
+from arabic_analyzer import analyze
+from shared_index import SharedIndex
+
+# 64-bit fingerprints split into 8 bands of 8 bits for LSH lookups.
+# Two fingerprints within 7 bits of each other always share at least one
+# identical band (pigeonhole), so band buckets find every such near-duplicate.
+# A one-word edit of a short submission typically moves 3-8 bits, while
+# unrelated texts are 15+ bits apart.
+FINGERPRINT_BITS = 64
+BANDS = 8
+BAND_BITS = FINGERPRINT_BITS // BANDS
+MAX_DISTANCE = BANDS - 1
+
+# Very short texts have too few features for a meaningful fingerprint
+MIN_TOKENS = 5
+
+# The in-memory index is rebuilt in the background after this many seconds so
+# knowledge saved by other app processes is eventually found as a duplicate
+INDEX_MAX_AGE = 600
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+def text_features(tokens):
+    """Weighted features of analyzed tokens: the words and adjacent word pairs"""
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+def simhash(text):
+    """64-bit SimHash of a text, or None when the text is too short to fingerprint"""
+    tokens = analyze(text)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    features = text_features(tokens)
+    
+    weights = [0] * FINGERPRINT_BITS
+    for feature, weight in features.items():
+        h = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += weight if h >> bit & 1 else -weight
+    
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def fingerprint_to_str(fingerprint):
+    """Fingerprints are stored on knowledge items as fixed-width hex strings"""
+    return f"{fingerprint:016x}"
+
+def fingerprint_from_str(value):
+    return int(value, 16)
+
+class SimHashIndex:
+    """LSH index over SimHash fingerprints for sublinear near-duplicate lookups"""
+    
+    def __init__(self):
+        self.buckets = [defaultdict(set) for _ in range(BANDS)]
+        self.fingerprints = defaultdict(set)  # item id -> fingerprints
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _bands(fingerprint):
+        mask = (1 << BAND_BITS) - 1
+        return [fingerprint >> (band * BAND_BITS) & mask for band in range(BANDS)]
+    
+    def add(self, item_id, fingerprint):
+        """Index one fingerprint for an item (an item may have several)"""
+        with self._lock:
+            self.fingerprints[item_id].add(fingerprint)
+            for band, value in enumerate(self._bands(fingerprint)):
+                self.buckets[band][value].add((item_id, fingerprint))
+    
+    def find(self, fingerprint, max_distance=MAX_DISTANCE):
+        """Return (item_id, distance) pairs within max_distance bits, closest first"""
+        with self._lock:
+            candidates = set()
+            for band, value in enumerate(self._bands(fingerprint)):
+                candidates |= self.buckets[band].get(value, set())
+        
+        best = {}
+        for item_id, candidate in candidates:
+            distance = hamming_distance(fingerprint, candidate)
+            if distance <= max_distance and distance < best.get(item_id, max_distance + 1):
+                best[item_id] = distance
+        
+        return sorted(best.items(), key=lambda x: x[1])
+    
+    def __len__(self):
+        return len(self.fingerprints)
+
+def item_fingerprints(item):
+    """Stored fingerprints of a knowledge item, computed from content for older items"""
+    stored = item.get("fingerprints")
+    if stored:
+        return [fingerprint_from_str(value) for value in stored]
+    fingerprint = simhash(item.get("content", ""))
+    return [fingerprint] if fingerprint is not None else []
+
+def build_knowledge_fingerprint_index(dynamodb):
+    """Build a fingerprint index from one scan of the knowledge table"""
+    from database import scan_knowledge_pages
+    
+    index = SimHashIndex()
+    for items, _ in scan_knowledge_pages(dynamodb):
+        for item in items:
+            for fingerprint in item_fingerprints(item):
+                index.add(item["id"], fingerprint)
+    return index
+
+_knowledge_index = SharedIndex(build_knowledge_fingerprint_index, INDEX_MAX_AGE)
+
+def get_knowledge_fingerprint_index(dynamodb):
+    """Return the shared fingerprint index, building it on first use and refreshing it when too old"""
+    return _knowledge_index.get(dynamodb)
+
+def index_knowledge_fingerprints(item_id, fingerprints):
+    """Add a saved item's fingerprints to the shared index if it has been built"""
+    fingerprints = list(fingerprints)
+    def add(index):
+        for fingerprint in fingerprints:
+            index.add(item_id, fingerprint)
+    _knowledge_index.apply(add)
+
+def find_duplicate_knowledge(dynamodb, text, max_distance=MAX_DISTANCE):
+    """Return (fingerprint, [(item_id, distance), ...]) for a new knowledge text"""
+    fingerprint = simhash(text)
+    if fingerprint is None:
+        return None, []
+    return fingerprint, get_knowledge_fingerprint_index(dynamodb).find(fingerprint, max_distance)
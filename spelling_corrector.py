@@ -0,0 +1,146 @@
+import re
+import threading
+from collections import Counter, defaultdict
+
+from arabic_analyzer import normalize_arabic, STOP_WORDS
+from shared_index import SharedIndex
+
+# Words shorter than this are neither learned nor corrected
+MIN_WORD_LENGTH = 3
+
+# Maximum edit distance of a suggestion (short words only allow one edit)
+MAX_EDIT_DISTANCE = 2
+SHORT_WORD_LENGTH = 5
+
+# Deletes are generated from this many leading characters only (SymSpell prefix
+# trick); it bounds index size for long words while keeping lookups exact
+PREFIX_LENGTH = 7
+
+# The shared corrector is rebuilt in the background after this many seconds so
+# words saved by other app processes are eventually learned
+INDEX_MAX_AGE = 600
+
+_WORD = re.compile(r"\w+")
+
+def _deletes(word, max_distance):
+    """All strings reachable from word by deleting up to max_distance characters"""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - results
+        results |= frontier
+    return results
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 when it is larger"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+class SpellingCorrector:
+    """Symmetric-delete spelling suggestions learned from the knowledge corpus"""
+    
+    def __init__(self, max_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.frequencies = Counter()  # word -> corpus frequency
+        self.deletes = defaultdict(set)  # delete variant -> vocabulary words
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def words(text):
+        return [
+            word for word in _WORD.findall(normalize_arabic(text))
+            if len(word) >= MIN_WORD_LENGTH and not word.isdigit() and word not in STOP_WORDS
+        ]
+    
+    def add_text(self, text):
+        """Learn the vocabulary of a text; only words not seen before touch the delete index"""
+        with self._lock:
+            for word in self.words(text):
+                if word not in self.frequencies:
+                    for variant in _deletes(word[:self.prefix_length], self.max_distance):
+                        self.deletes[variant].add(word)
+                self.frequencies[word] += 1
+    
+    def suggest(self, word):
+        """Best known word within the allowed edit distance, or None"""
+        max_distance = 1 if len(word) < SHORT_WORD_LENGTH else self.max_distance
+        variants = _deletes(word[:self.prefix_length], max_distance)
+        
+        # add_text may be growing the sets on another thread, so candidates and
+        # their frequencies are copied under the lock and scored outside it
+        with self._lock:
+            if word in self.frequencies:
+                return word
+            candidates = {}
+            for variant in variants:
+                for candidate in self.deletes.get(variant, ()):
+                    candidates[candidate] = self.frequencies[candidate]
+        
+        best, best_key = None, None
+        for candidate, frequency in candidates.items():
+            distance = edit_distance(word, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            # Closest first, then the most frequent word in the corpus
+            key = (distance, -frequency)
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+        return best
+    
+    def correct_query(self, query):
+        """Return the query with unknown words replaced by suggestions, or None when nothing changed"""
+        changed = False
+        corrected = []
+        for token in query.split():
+            # Words that need no correction are kept as the user typed them
+            word = token
+            normalized = normalize_arabic(token)
+            if len(normalized) >= MIN_WORD_LENGTH and not normalized.isdigit() and normalized not in STOP_WORDS and _WORD.fullmatch(normalized):
+                suggestion = self.suggest(normalized)
+                if suggestion and suggestion != normalized:
+                    word, changed = suggestion, True
+            corrected.append(word)
+        return " ".join(corrected) if changed else None
+    
+    def __len__(self):
+        return len(self.frequencies)
+
+def build_corpus_spelling_corrector(dynamodb):
+    """Build a corrector from the vocabulary of one scan of the knowledge table"""
+    from database import scan_knowledge_pages
+    
+    corrector = SpellingCorrector()
+    for items, _ in scan_knowledge_pages(dynamodb):
+        for item in items:
+            corrector.add_text(item.get('content', ''))
+    return corrector
+
+_corpus_corrector = SharedIndex(build_corpus_spelling_corrector, INDEX_MAX_AGE)
+
+def get_corpus_spelling_corrector(dynamodb):
+    """Return the shared corrector, learning the corpus vocabulary from one scan on first use and refreshing it when too old"""
+    return _corpus_corrector.get(dynamodb)
+
+def learn_knowledge_vocabulary(text):
+    """Add newly saved text to the shared corrector if it has been built"""
+    _corpus_corrector.apply(lambda corrector: corrector.add_text(text))
+
+def suggest_query_correction(dynamodb, query):
+    """Suggest a "did you mean" rewrite of a search query from the corpus vocabulary"""
+    return get_corpus_spelling_corrector(dynamodb).correct_query(query)
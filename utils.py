@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import hashlib
 import time
 
 def format_timestamp(timestamp):
@@ -38,6 +39,11 @@ def truncate_text(text, max_length=100):
         return text
     return text[:max_length] + "..."
 
+def submission_key(session_id, form, *fields):
+    """Idempotency key of a form submission: the same session and content always give the same key"""
+    digest = hashlib.blake2b("\x1f".join(str(field) for field in fields).encode("utf-8"), digest_size=16).hexdigest()
+    return f"{form}#{session_id}#{digest}"
+
 def get_sample_departments():
     """Return a list of sample department names for the organization"""
     return [
@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+
+from shared_index import SharedIndex
+
+# The in-memory index is rebuilt in the background after this many seconds so
+# embeddings saved by other app processes are eventually searchable
+INDEX_MAX_AGE = 600
+
+
+def embedding_to_binary(embedding):
+    """Pack an embedding as float32 bytes for a DynamoDB binary attribute"""
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def embedding_from_binary(value):
+    """Unpack an embedding stored with embedding_to_binary"""
+    # boto3 returns binary attributes wrapped in a Binary object
+    raw = value.value if hasattr(value, "value") else value
+    return np.frombuffer(bytes(raw), dtype=np.float32)
+
+def item_passage_embeddings(item):
+    """(passage number, embedding) pairs stored on a knowledge item"""
+    if item.get("passage_embeddings"):
+        # One binary value per passage, in passage order
+        return [(number, embedding_from_binary(value)) for number, value in enumerate(item["passage_embeddings"])]
+    if item.get("embedding") is not None:
+        # Items embedded before passages existed have one whole-document vector
+        return [(0, embedding_from_binary(item["embedding"]))]
+    return []
+
+def item_centroid(item):
+    """Normalized mean of an item's passage embeddings, or None when it has none"""
+    embeddings = [embedding for _, embedding in item_passage_embeddings(item)]
+    if not embeddings or len({embedding.shape for embedding in embeddings}) > 1:
+        return None
+    vectors = np.vstack(embeddings)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    centroid = vectors.mean(axis=0)
+    norm = np.linalg.norm(centroid)
+    return centroid / norm if norm else None
+
+class VectorIndex:
+    """
+    In-memory cosine-similarity index over embeddings
+    
+    Keys are (item id, passage number) pairs, so every passage is a separate
+    vector and a search hit points at the passage that matched.
+    """
+    
+    def __init__(self):
+        self.ids = []
+        self.positions = {}  # (item id, passage number) -> row
+        self._rows = []
+        self._matrix = None
+        self._lock = threading.Lock()
+    
+    def add(self, key, embedding):
+        """Add or replace the embedding stored under key"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        vector = vector / norm
+        
+        with self._lock:
+            # Embeddings from a different model (dimension) cannot be compared
+            if self._rows and vector.shape != self._rows[0].shape:
+                return
+            if key in self.positions:
+                self._rows[self.positions[key]] = vector
+            else:
+                self.positions[key] = len(self.ids)
+                self.ids.append(key)
+                self._rows.append(vector)
+            self._matrix = None
+    
+    def replace_item(self, item_id, embeddings):
+        """Replace all passage embeddings of an item with (passage number, embedding) pairs"""
+        numbers = {number for number, _ in embeddings}
+        with self._lock:
+            # Rows can't be removed cheaply, so stale passages are zeroed (similarity 0)
+            for key, position in self.positions.items():
+                if key[0] == item_id and key[1] not in numbers:
+                    self._rows[position] = np.zeros_like(self._rows[position])
+            self._matrix = None
+        for number, embedding in embeddings:
+            self.add((item_id, number), embedding)
+    
+    def top_k(self, query_embedding, k=20, min_similarity=0.0, allowed_ids=None):
+        """Return up to k (key, similarity) pairs, most similar first; allowed_ids filters by item id"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        
+        with self._lock:
+            if not self._rows or not norm or query.shape != self._rows[0].shape:
+                return []
+            if self._matrix is None:
+                self._matrix = np.vstack(self._rows)
+            matrix, ids = self._matrix, list(self.ids)
+        
+        similarities = matrix @ (query / norm)
+        if allowed_ids is not None:
+            allowed = np.fromiter((key[0] in allowed_ids for key in ids), dtype=bool, count=len(ids))
+            similarities = np.where(allowed, similarities, -np.inf)
+        
+        k = min(k, len(ids))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(ids[i], float(similarities[i])) for i in top if similarities[i] >= min_similarity]
+    
+    def top_k_many(self, query_embeddings, k=20, min_similarity=0.0, block_size=256):
+        """top_k for many queries at once, one matrix product per block of queries"""
+        with self._lock:
+            if not self._rows:
+                return [[] for _ in query_embeddings]
+            if self._matrix is None:
+                self._matrix = np.vstack(self._rows)
+            matrix, ids = self._matrix, list(self.ids)
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if not len(queries) or queries.shape[1] != matrix.shape[1]:
+            return [[] for _ in query_embeddings]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        
+        k = min(k, len(ids))
+        results = []
+        for start in range(0, len(queries), block_size):
+            similarities = queries[start:start + block_size] @ matrix.T
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            for row, candidates in zip(similarities, top):
+                candidates = candidates[np.argsort(-row[candidates])]
+                results.append([(ids[i], float(row[i])) for i in candidates if row[i] >= min_similarity])
+        return results
+    
+    def __len__(self):
+        return len(self.ids)
+
+def build_knowledge_vector_index(dynamodb):
+    """Build a vector index from the embeddings stored on the knowledge items"""
+    from database import scan_knowledge_pages
+    
+    index = VectorIndex()
+    for items, _ in scan_knowledge_pages(dynamodb):
+        for item in items:
+            for number, embedding in item_passage_embeddings(item):
+                index.add((item["id"], number), embedding)
+    return index
+
+_knowledge_index = SharedIndex(build_knowledge_vector_index, INDEX_MAX_AGE)
+
+def get_knowledge_vector_index(dynamodb):
+    """Return the shared vector index, loading stored embeddings on first use and refreshing them when too old"""
+    return _knowledge_index.get(dynamodb)
+
+def index_knowledge_embeddings(item):
+    """Add or refresh a written item's passage embeddings in the shared index if it has been built"""
+    embeddings = item_passage_embeddings(item)
+    _knowledge_index.apply(lambda index: index.replace_item(item["id"], embeddings))